@@ -0,0 +1,440 @@
+import asyncio
+import hashlib
+import hmac
+import itertools
+import os
+import platform
+import random
+import subprocess
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlencode
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# Percentiles de latence rapportés
+PERCENTILES = (50, 90, 95, 99)
+# Mot de passe des comptes créés pour le banc d'essai
+BENCHMARK_PASSWORD = "Bench-Passw0rd!"
+BENCHMARK_IPN_SECRET = "benchmark-ipn-secret"
+BENCHMARK_GATEWAY_SECRET = "benchmark-gateway-secret"
+# Comparaison ASGI / WSGI : latence de la passerelle simulée et paiements simultanés
+CONCURRENCY_GATEWAY_LATENCY = 0.2
+CONCURRENCY_REQUESTS = 50
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def measure(func, iterations, warmup=0, setup=None):
+    """
+    Exécute func() iterations fois (après warmup exécutions non mesurées) et
+    renvoie latences (ms), débit et nombre de requêtes SQL. setup() est appelé
+    avant chaque exécution, hors chronométrage. func() renvoie False en cas d'échec.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+
+    durations, query_counts, sql_times = [], [], []
+    errors = 0
+    for _ in range(iterations):
+        if setup:
+            setup()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            ok = func()
+            durations.append(time.perf_counter() - started)
+        errors += ok is False
+        query_counts.append(len(queries.captured_queries))
+        sql_times.append(sum(float(query["time"]) for query in queries.captured_queries))
+
+    total = sum(durations)
+    durations_ms = sorted(duration * 1000 for duration in durations)
+    result = {
+        "iterations": iterations,
+        "errors": errors,
+        "mean_ms": round(total * 1000 / iterations, 3) if iterations else None,
+        "max_ms": round(durations_ms[-1], 3) if durations_ms else None,
+        "throughput_per_second": round(iterations / total, 1) if total else None,
+        "queries_mean": round(sum(query_counts) / iterations, 2) if iterations else None,
+        "queries_max": max(query_counts, default=None),
+        "sql_ms_mean": round(sum(sql_times) * 1000 / iterations, 3) if iterations else None,
+    }
+    for p in PERCENTILES:
+        value = percentile(durations_ms, p)
+        result[f"p{p}_ms"] = round(value, 3) if value is not None else None
+    return result
+
+
+class BenchmarkData:
+    """Identifiants du jeu de données créé par seed_dataset()."""
+
+    def __init__(self, **values):
+        self.__dict__.update(values)
+
+
+def seed_dataset(users=20, vehicles_per_user=50, documents=20, stations=10, seed=0):
+    """
+    Crée un jeu de données déterministe (même graine : mêmes données) :
+    propriétaires et véhicules (dont une part arrivant à échéance dans les
+    30 jours), documents, stations et comptes péage.
+    """
+    from users.models import TollStation, Vehicle as TollVehicle
+    from vehicles.compliance import compute_compliance
+    from vehicles.models import Brand, Document, Vehicle, VehicleCompliance, VehicleModel
+    from vehicles.search import build_search_fields
+
+    rng = random.Random(seed)
+    User = get_user_model()
+    today = date.today()
+
+    brands = Brand.objects.bulk_create([Brand(name=f"Marque {index}") for index in range(10)])
+    models = VehicleModel.objects.bulk_create([
+        VehicleModel(brand=brand, name=f"Modèle {brand.pk}-{index}") for brand in brands for index in range(5)
+    ])
+    owners = [
+        User.objects.create_user(
+            username=f"bench-owner-{index}", email=f"owner{index}@example.com", password=BENCHMARK_PASSWORD
+        )
+        for index in range(users)
+    ]
+
+    vehicles = []
+    for owner_index, owner in enumerate(owners):
+        for index in range(vehicles_per_user):
+            number = owner_index * vehicles_per_user + index
+            model = rng.choice(models)
+            # Environ 10 % des échéances tombent dans les 30 prochains jours
+            insurance_days = rng.randint(1, 30) if rng.random() < 0.1 else rng.randint(31, 365)
+            vehicle = Vehicle(
+                user=owner, brand_id=model.brand_id, model=model,
+                year=rng.randint(2005, 2025),
+                license_plate=f"{chr(65 + number % 26)}{chr(65 + number // 26 % 26)}-{number % 1000:03d}-"
+                              f"{chr(65 + number // 676 % 26)}{chr(65 + number // 17576 % 26)}",
+                color=rng.choice(["Rouge", "Bleu", "Noir", "Blanc", "Gris"]),
+                vin_number=f"VF1{number:014d}",
+                purchase_date=today - timedelta(days=rng.randint(30, 3000)),
+                mileage=rng.randint(0, 300000),
+                fuel_type=rng.choice(["Essence", "Diesel", "Électrique"]),
+                insurance_company="Assur", insurance_policy_number=f"POL{number}",
+                insurance_expiry_date=today + timedelta(days=insurance_days),
+                last_technical_check=today - timedelta(days=rng.randint(30, 700)),
+                next_technical_check=today + timedelta(days=rng.randint(1, 730)),
+            )
+            build_search_fields(vehicle)
+            vehicles.append(vehicle)
+    vehicles = Vehicle.objects.bulk_create(vehicles, batch_size=1000)
+    VehicleCompliance.objects.bulk_create([compute_compliance(vehicle) for vehicle in vehicles], batch_size=1000)
+
+    owner = owners[0]
+    owner_vehicles = [vehicle for vehicle in vehicles if vehicle.user_id == owner.pk]
+    document_ids = []
+    payload = rng.randbytes(256 * 1024)
+    for index, vehicle in enumerate(owner_vehicles[:documents]):
+        document = Document(document_type="registration")
+        document.file.save(f"bench-{index}.pdf", ContentFile(payload), save=True)
+        vehicle.documents.add(document)
+        document_ids.append(document.pk)
+
+    toll_stations = TollStation.objects.bulk_create([
+        TollStation(name=f"Station {index}", location="Autoroute", fee=Decimal("2.50"), route=f"A{index}")
+        for index in range(stations)
+    ])
+    toll_vehicle = TollVehicle.objects.create(
+        owner=owner, registration_number="BENCH-001", model="Clio", brand="Renault", year=2020,
+        color="Rouge", serial_number="BENCH-SN-001", toll_balance=Decimal("99999999.00"),
+    )
+
+    return BenchmarkData(
+        owner=owner,
+        vehicle_ids=[vehicle.pk for vehicle in owner_vehicles],
+        document_ids=document_ids,
+        station_ids=[station.pk for station in toll_stations],
+        toll_vehicle_id=toll_vehicle.pk,
+        vehicles=len(vehicles),
+        seed=seed,
+    )
+
+
+def _logged_in_client(user):
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def _ok(response, expected=(200,)):
+    if hasattr(response, "streaming_content"):
+        for _ in response.streaming_content:
+            pass
+        response.close()
+    return response.status_code in expected
+
+
+def scenario_vehicle_list(data, iterations, warmup):
+    client = _logged_in_client(data.owner)
+    url = reverse("vehicle_list")
+    return {
+        "vehicle_list": measure(lambda: _ok(client.get(url, secure=True)), iterations, warmup),
+        "vehicle_list_cold_cache": measure(lambda: _ok(client.get(url, secure=True)), iterations, warmup,
+                                           setup=cache.clear),
+    }
+
+
+def scenario_vehicle_detail(data, iterations, warmup):
+    client = _logged_in_client(data.owner)
+    ids = itertools.cycle(data.vehicle_ids)
+    return {"vehicle_detail": measure(
+        lambda: _ok(client.get(reverse("vehicle_detail", args=[next(ids)]), secure=True)), iterations, warmup,
+    )}
+
+
+def scenario_document_download(data, iterations, warmup):
+    client = _logged_in_client(data.owner)
+    ids = itertools.cycle(data.document_ids)
+    return {"document_download": measure(
+        lambda: _ok(client.get(reverse("download_document", args=[next(ids)]), secure=True)), iterations, warmup,
+    )}
+
+
+def scenario_signup(data, iterations, warmup):
+    client = Client()
+    counter = itertools.count()
+
+    def signup():
+        number = next(counter)
+        response = client.post(reverse("signup"), {
+            "username": f"bench-signup-{number}",
+            "email": f"signup{number}@example.com",
+            "password1": BENCHMARK_PASSWORD,
+            "password2": BENCHMARK_PASSWORD,
+        }, secure=True)
+        return _ok(response, (302,))
+
+    return {"signup": measure(signup, iterations, warmup)}
+
+
+def scenario_process_toll_payment(data, iterations, warmup):
+    client = Client()
+    stations = itertools.cycle(data.station_ids)
+    # Paiement carte simulé : seul le coût de l'application est mesuré
+    with mock.patch("stripe.Charge.create"):
+        return {"process_toll_payment": measure(
+            lambda: _ok(client.post(
+                reverse("process_toll_payment", args=[data.toll_vehicle_id, next(stations)]),
+                {"stripeToken": "tok_benchmark"}, secure=True,
+            )),
+            iterations, warmup,
+        )}
+
+
+def scenario_pay_toll(data, iterations, warmup):
+    from payments import gateway
+    from payments.fake_gateway import start_fake_server
+
+    server = start_fake_server(api_secret=BENCHMARK_GATEWAY_SECRET, latency=0.0)
+    client = gateway.CoinPaymentsClient(api_url=server.url, api_key="benchmark", api_secret=BENCHMARK_GATEWAY_SECRET)
+    http = _logged_in_client(data.owner)
+    vehicles = itertools.cycle(data.vehicle_ids)
+    try:
+        with mock.patch.object(gateway, "_client", client):
+            result = measure(
+                lambda: _ok(http.get(reverse("pay_toll", args=[next(vehicles)]), secure=True), (302,)),
+                iterations, warmup,
+            )
+    finally:
+        server.shutdown()
+    result["gateway"] = client.stats.snapshot()
+    return {"pay_toll": result}
+
+
+def _concurrency_result(durations, elapsed, errors):
+    durations_ms = sorted(duration * 1000 for duration in durations)
+    result = {
+        "iterations": len(durations),
+        "errors": errors,
+        "wall_seconds": round(elapsed, 3),
+        "mean_ms": round(sum(durations_ms) / len(durations_ms), 3) if durations_ms else None,
+        "max_ms": round(durations_ms[-1], 3) if durations_ms else None,
+        "throughput_per_second": round(len(durations) / elapsed, 1) if elapsed else None,
+        "queries_mean": None,
+    }
+    for p in PERCENTILES:
+        value = percentile(durations_ms, p)
+        result[f"p{p}_ms"] = round(value, 3) if value is not None else None
+    return result
+
+
+def scenario_pay_toll_concurrency(data, iterations, warmup):
+    """
+    Paiements initiés en même temps face à une passerelle lente : un worker
+    WSGI synchrone les traite l'un après l'autre, un worker ASGI (une boucle
+    asyncio) les sert tous pendant les allers-retours vers la passerelle.
+    """
+    from payments import gateway
+    from payments.fake_gateway import start_fake_server
+
+    count = max(1, min(iterations, CONCURRENCY_REQUESTS))
+    server = start_fake_server(api_secret=BENCHMARK_GATEWAY_SECRET, latency=CONCURRENCY_GATEWAY_LATENCY)
+    client = gateway.CoinPaymentsClient(
+        api_url=server.url, api_key="benchmark", api_secret=BENCHMARK_GATEWAY_SECRET, pool_size=count,
+    )
+    urls = [reverse("pay_toll", args=[vehicle_id])
+            for vehicle_id in itertools.islice(itertools.cycle(data.vehicle_ids), count)]
+
+    def run_wsgi():
+        http = _logged_in_client(data.owner)
+        durations, errors = [], 0
+        started = time.perf_counter()
+        for url in urls:
+            request_started = time.perf_counter()
+            errors += not _ok(http.get(url, secure=True), (302,))
+            durations.append(time.perf_counter() - request_started)
+        return _concurrency_result(durations, time.perf_counter() - started, errors)
+
+    async def run_asgi():
+        http = AsyncClient()
+        await http.aforce_login(data.owner)
+
+        async def pay(url):
+            request_started = time.perf_counter()
+            response = await http.get(url, secure=True)
+            return time.perf_counter() - request_started, response.status_code == 302
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(pay(url) for url in urls))
+        elapsed = time.perf_counter() - started
+        return _concurrency_result(
+            [duration for duration, _ in results], elapsed, sum(not ok for _, ok in results),
+        )
+
+    try:
+        with mock.patch.object(gateway, "_client", client):
+            wsgi = run_wsgi()
+            asgi = asyncio.run(run_asgi())
+    finally:
+        server.shutdown()
+    for result in (wsgi, asgi):
+        result["gateway_latency_ms"] = CONCURRENCY_GATEWAY_LATENCY * 1000
+        result["concurrency"] = 1 if result is wsgi else count
+    return {"pay_toll_wsgi_sequential": wsgi, "pay_toll_asgi_concurrent": asgi}
+
+
+def scenario_ipn(data, iterations, warmup):
+    from payments.ipn import process_batch
+
+    client = Client()
+    counter = itertools.count()
+
+    def ipn():
+        body = urlencode({"txn_id": f"BENCH{next(counter):010d}", "status": 100})
+        signature = hmac.new(BENCHMARK_IPN_SECRET.encode(), body.encode(), hashlib.sha512).hexdigest()
+        return _ok(client.post(
+            reverse("coinpayments_ipn"), body, content_type="application/x-www-form-urlencoded",
+            HTTP_HMAC=signature, secure=True,
+        ))
+
+    # Le consommateur n'est pas planifié pendant la mesure de l'endpoint : il est mesuré à part
+    with mock.patch("payments.ipn.IPN_SECRET", BENCHMARK_IPN_SECRET), \
+            mock.patch("payments.tasks.process_ipn_notifications.delay"):
+        results = {"ipn_endpoint": measure(ipn, iterations, warmup)}
+    results["ipn_consumer_batch"] = measure(lambda: process_batch() >= 0, 1)
+    return results
+
+
+def scenario_vehicle_reminders(data, iterations, warmup):
+    from vehicles.task import (
+        _iter_reminder_chunks, _reminder_queryset, send_vehicle_reminder_chunk, summarize_vehicle_reminders,
+    )
+
+    def campaign():
+        # Lots exécutés en séquence dans le processus (le chord Celery les répartit entre workers)
+        today = date.today()
+        started = time.time()
+        results = [
+            send_vehicle_reminder_chunk(first_pk, last_pk, today.isoformat())
+            for first_pk, last_pk in _iter_reminder_chunks(
+                _reminder_queryset(today), getattr(settings, "VEHICLE_REMINDER_CHUNK_SIZE", 1000)
+            )
+        ]
+        summary = summarize_vehicle_reminders(results, started)
+        return summary["failed"] == 0
+
+    return {"send_vehicle_reminders": measure(campaign, max(1, min(iterations, 5)))}
+
+
+SCENARIOS = {
+    "vehicle_list": scenario_vehicle_list,
+    "vehicle_detail": scenario_vehicle_detail,
+    "document_download": scenario_document_download,
+    "signup": scenario_signup,
+    "process_toll_payment": scenario_process_toll_payment,
+    "pay_toll": scenario_pay_toll,
+    "pay_toll_concurrency": scenario_pay_toll_concurrency,
+    "ipn": scenario_ipn,
+    "vehicle_reminders": scenario_vehicle_reminders,
+}
+
+
+def environment_info():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_benchmark(data, names=None, iterations=200, warmup=20):
+    results = {}
+    for name in names or SCENARIOS:
+        results.update(SCENARIOS[name](data, iterations, warmup))
+    return results
+
+
+def compare_results(previous, current, threshold=10.0):
+    """
+    Compare deux rapports (p50, p95, requêtes par scénario).
+    Renvoie des lignes de texte ; les écarts au-delà de threshold % sont marqués.
+    """
+    lines = []
+    for name, result in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name)
+        if not before:
+            lines.append(f"{name} : nouveau scénario")
+            continue
+        parts = []
+        for metric in ("p50_ms", "p95_ms", "queries_mean"):
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            flag = " REGRESSION" if change > threshold else ""
+            parts.append(f"{metric} {old} -> {new} ({change:+.1f} %){flag}")
+        lines.append(f"{name} : " + ", ".join(parts))
+    return lines
@@ -0,0 +1,120 @@
+import threading
+import time
+from django.core.cache import cache
+from django.db import transaction
+from .metrics import record_cache_access
+
+# Espaces de noms des données mises en cache par utilisateur
+VEHICLE_LIST = "vehicle_list"
+VEHICLE_DETAIL = "vehicle_detail"
+BALANCE = "balance"
+DASHBOARD = "dashboard"
+
+DEFAULT_TIMEOUT = 300  # secondes
+
+# Valeur stockée quand le résultat mis en cache est None
+_NONE = "__none__"
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _record(namespace, hit):
+    with _stats_lock:
+        counters = _stats.setdefault(namespace, {"hits": 0, "misses": 0})
+        counters["hits" if hit else "misses"] += 1
+    record_cache_access(hit)
+
+
+def cache_stats():
+    """Compteurs de hits/misses du processus courant, par espace de noms."""
+    with _stats_lock:
+        return {namespace: dict(counters) for namespace, counters in _stats.items()}
+
+
+def _version_key(user_id):
+    return f"user-version:{user_id}"
+
+
+def _new_version():
+    # Horodatage plutôt que 1 : si la clé de version est évincée, les anciennes
+    # entrées ne redeviennent pas valides
+    return int(time.time() * 1000)
+
+
+def user_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def _cache_key(namespace, user_id, version, parts):
+    suffix = ":".join(str(part) for part in parts)
+    return f"{namespace}:{user_id}:v{version}:{suffix}"
+
+
+def user_cache_key(namespace, user_id, *parts):
+    """Clé versionnée : {espace}:{utilisateur}:v{version}:{parties}."""
+    return _cache_key(namespace, user_id, user_version(user_id), parts)
+
+
+def get_or_set_for_user(namespace, user_id, parts, builder, timeout=DEFAULT_TIMEOUT):
+    """Renvoie la valeur en cache pour l'utilisateur, ou la calcule avec builder()."""
+    key = user_cache_key(namespace, user_id, *parts)
+    value = cache.get(key)
+    if value is not None:
+        _record(namespace, True)
+        return None if value == _NONE else value
+    _record(namespace, False)
+    value = builder()
+    cache.set(key, _NONE if value is None else value, timeout)
+    return value
+
+
+async def auser_version(user_id):
+    key = _version_key(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = _new_version()
+        if not await cache.aadd(key, version, None):
+            version = await cache.aget(key, version)
+    return version
+
+
+async def aget_or_set_for_user(namespace, user_id, parts, builder, timeout=DEFAULT_TIMEOUT):
+    """Variante asyncio de get_or_set_for_user : builder() renvoie une coroutine."""
+    key = _cache_key(namespace, user_id, await auser_version(user_id), parts)
+    value = await cache.aget(key)
+    if value is not None:
+        _record(namespace, True)
+        return None if value == _NONE else value
+    _record(namespace, False)
+    value = await builder()
+    await cache.aset(key, _NONE if value is None else value, timeout)
+    return value
+
+
+def invalidate_user(user_id):
+    """Invalide toutes les entrées d'un utilisateur en changeant sa version."""
+    if user_id is None:
+        return
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
+
+
+def invalidate_user_on_commit(*user_ids):
+    """
+    Invalide après validation de la transaction : invalider avant permettrait
+    à un lecteur concurrent de remettre en cache les lignes d'avant la
+    modification sous la nouvelle version.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        transaction.on_commit(lambda: [invalidate_user(user_id) for user_id in user_ids])
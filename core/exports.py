@@ -0,0 +1,120 @@
+import csv
+import zlib
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Lignes lues par aller-retour du curseur serveur
+EXPORT_CHUNK_SIZE = 2000
+# Taille (octets) à partir de laquelle un bloc est envoyé au client
+EXPORT_FLUSH_SIZE = 64 * 1024
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+}
+
+# Jeux de données exportables : modèle, colonnes (chemins ORM), tri
+DATASETS = {
+    "vehicles": (
+        "vehicles.Vehicle",
+        ["id", "user_id", "brand__name", "model__name", "year", "license_plate", "vin_number",
+         "color", "fuel_type", "mileage", "purchase_date", "insurance_company",
+         "insurance_policy_number", "insurance_expiry_date", "last_technical_check",
+         "next_technical_check"],
+        "id",
+    ),
+    "toll_transactions": (
+        "users.TollTransaction",
+        ["id", "user_id", "vehicle_id", "vehicle__registration_number", "toll_station_id",
+         "toll_station__name", "transaction_date", "amount", "paid", "payment_method"],
+        "id",
+    ),
+    "vehicle_toll_transactions": (
+        "vehicles.TollTransaction",
+        ["id", "user_id", "vehicle_id", "vehicle__license_plate", "amount", "date"],
+        "id",
+    ),
+    "payments": (
+        "payments.TollTransaction",
+        ["id", "user_id", "vehicle_id", "amount", "currency", "status", "transaction_id", "created_at"],
+        "id",
+    ),
+    "balances": (
+        "users.UserProfile",
+        ["user_id", "user__username", "user__email", "toll_balance"],
+        "id",
+    ),
+}
+
+
+class _Echo:
+    """Pseudo-fichier pour csv.writer : renvoie la ligne au lieu de l'écrire."""
+
+    def write(self, value):
+        return value
+
+
+def _rows(dataset):
+    model_label, columns, ordering = DATASETS[dataset]
+    model = apps.get_model(model_label)
+    # iterator() : curseur côté serveur sous PostgreSQL, mémoire constante
+    return model.objects.order_by(ordering).values_list(*columns).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def _csv_lines(dataset):
+    _, columns, _ = DATASETS[dataset]
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in _rows(dataset):
+        yield writer.writerow(row)
+
+
+def _jsonl_lines(dataset):
+    _, columns, _ = DATASETS[dataset]
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    for row in _rows(dataset):
+        yield encoder.encode(dict(zip(columns, row))) + "\n"
+
+
+def _buffered(lines):
+    """Regroupe les lignes en blocs d'environ EXPORT_FLUSH_SIZE octets."""
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode("utf-8")
+        buffer.append(data)
+        size += len(data)
+        if size >= EXPORT_FLUSH_SIZE:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 : en-tête gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(dataset, fmt="csv", compress=False):
+    """Génère l'export d'un jeu de données sous forme de blocs d'octets."""
+    if dataset not in DATASETS:
+        raise ValueError(f"Jeu de données inconnu : {dataset}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu : {fmt}")
+    lines = _csv_lines(dataset) if fmt == "csv" else _jsonl_lines(dataset)
+    chunks = _buffered(lines)
+    return _gzipped(chunks) if compress else chunks
+
+
+def export_filename(dataset, fmt, compress):
+    extension = FORMATS[fmt][1]
+    return f"{dataset}.{extension}{'.gz' if compress else ''}"
+
+
+def export_content_type(fmt, compress):
+    return "application/gzip" if compress else FORMATS[fmt][0]
@@ -0,0 +1,145 @@
+import mimetypes
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(size, modified):
+    return f'"{size:x}-{int(modified):x}"'
+
+
+def etag_matches(header, etag):
+    """Compare l'en-tête If-None-Match à l'ETag (comparaison faible)."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [value.strip().removeprefix("W/") for value in header.split(",")]
+    return etag in candidates
+
+
+def if_range_matches(header, etag, modified):
+    """
+    If-Range (RFC 9110, 13.1.5) : comparaison forte. Un ETag faible (W/) ne
+    valide jamais une requête partielle ; une date doit être exactement
+    celle de Last-Modified.
+    """
+    header = header.strip()
+    if header.startswith('"'):
+        return not etag.startswith("W/") and header == etag
+    date = parse_http_date_safe(header)
+    return bool(modified) and date is not None and date == int(modified)
+
+
+def parse_range(header, size):
+    """
+    Analyse un en-tête Range à intervalle unique.
+    Renvoie None (pas de Range exploitable : réponse complète), (début, fin)
+    inclusifs, ou False si l'intervalle est hors du fichier (416).
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None  # Syntaxe non gérée (ex. plusieurs intervalles) : fichier complet
+    start, end = match.groups()
+    if start == "":
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(file, start, length):
+    try:
+        file.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = file.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _offload_response(field_file):
+    """
+    Délègue l'envoi au serveur frontal (nginx : X-Accel-Redirect, Apache/lighttpd : X-Sendfile).
+    Le serveur gère alors lui-même Range et l'envoi zéro-copie.
+    """
+    server = settings.PROTECTED_MEDIA_SERVER
+    response = HttpResponse()
+    if server == "nginx":
+        response["X-Accel-Redirect"] = quote(settings.PROTECTED_MEDIA_PREFIX + field_file.name)
+    else:
+        response["X-Sendfile"] = field_file.storage.path(field_file.name)
+    # Laisser le frontal déterminer le type du fichier
+    del response["Content-Type"]
+    return response
+
+
+def serve_file(request, field_file, filename=None, as_attachment=True, cache_control="private, max-age=0"):
+    """
+    Sert un fichier stocké (FileField) avec ETag / If-None-Match (304),
+    requêtes partielles (Range, If-Range) et délégation optionnelle au
+    serveur frontal. Sans délégation, les réponses complètes passent par
+    FileResponse (wsgi.file_wrapper / sendfile).
+    """
+    storage = field_file.storage
+    name = field_file.name
+    size = storage.size(name)
+    try:
+        modified = storage.get_modified_time(name).timestamp()
+    except NotImplementedError:
+        modified = 0
+    etag = file_etag(size, modified)
+    filename = filename or name.rsplit("/", 1)[-1]
+
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        response = HttpResponseNotModified()
+    elif settings.PROTECTED_MEDIA_SERVER:
+        response = _offload_response(field_file)
+    else:
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        byte_range = parse_range(request.headers.get("Range"), size)
+        if_range = request.headers.get("If-Range")
+        # Avant le 416 : si le fichier a changé, la version complète est renvoyée
+        if byte_range is not None and if_range and not if_range_matches(if_range, etag, modified):
+            byte_range = None
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+        elif byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _read_range(storage.open(name, "rb"), start, length),
+                status=206, content_type=content_type,
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = str(length)
+        else:
+            response = FileResponse(storage.open(name, "rb"), content_type=content_type)
+            response["Content-Length"] = str(size)
+        response["Accept-Ranges"] = "bytes"
+
+    if response.status_code != 304:
+        response["Content-Disposition"] = content_disposition_header(as_attachment, filename)
+    response["ETag"] = etag
+    if modified:
+        response["Last-Modified"] = http_date(modified)
+    response["Cache-Control"] = cache_control
+    return response
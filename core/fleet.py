@@ -0,0 +1,528 @@
+import datetime
+import functools
+import hashlib
+import io
+import logging
+import multiprocessing
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+from decimal import Decimal
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from .normalization import normalize_plate, normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Lignes générées (et insérées) par lot ; un lot = une transaction
+FLEET_BATCH_SIZE = 20000
+# Profondeur de l'historique des passages, en mois
+FLEET_MONTHS = 12
+
+# Plaques au format SIV "AB-123-CD" : ni I, ni O, ni U ; SS et WW sont réservés
+PLATE_LETTERS = "ABCDEFGHJKLMNPQRSTVWXYZ"
+PLATE_PAIRS = [a + b for a in PLATE_LETTERS for b in PLATE_LETTERS if a + b not in ("SS", "WW")]
+PLATE_SPACE = len(PLATE_PAIRS) * 999 * len(PLATE_PAIRS)
+# Multiplicateur premier avec PLATE_SPACE : numéro -> plaque bijective, d'apparence aléatoire
+PLATE_MULTIPLIER = 2654435761
+
+# VIN (ISO 3779) : 17 caractères, ni I, ni O, ni Q, 9e caractère = clé de contrôle
+VIN_ALPHABET = "0123456789ABCDEFGHJKLMNPRSTUVWXYZ"
+VIN_VALUES = {
+    **{str(digit): digit for digit in range(10)},
+    **dict(zip("ABCDEFGH", range(1, 9))),
+    **dict(zip("JKLMN", range(1, 6))),
+    "P": 7, "R": 9,
+    **dict(zip("STUVWXYZ", range(2, 10))),
+}
+VIN_WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+VIN_YEAR_CODES = "ABCDEFGHJKLMNPRSTVWXY123456789"  # 1980, 1981, ... (cycle de 30 ans)
+VIN_MULTIPLIER = 1000000007  # Premier avec 33
+
+# Marques (code constructeur du VIN) et modèles du catalogue généré
+FLEET_CATALOG = {
+    "Renault": ("VF1", ("Clio", "Mégane", "Captur", "Kangoo", "Trafic", "Zoé")),
+    "Peugeot": ("VF3", ("208", "308", "2008", "3008", "Partner", "Expert")),
+    "Citroën": ("VF7", ("C3", "C4", "Berlingo", "Jumpy", "C5 Aircross")),
+    "Dacia": ("UU1", ("Sandero", "Duster", "Logan", "Jogger")),
+    "Volkswagen": ("WVW", ("Polo", "Golf", "Tiguan", "Passat")),
+    "Toyota": ("JTD", ("Yaris", "Corolla", "C-HR", "RAV4")),
+    "Ford": ("WF0", ("Fiesta", "Focus", "Puma", "Transit")),
+    "BMW": ("WBA", ("Série 1", "Série 3", "X1")),
+    "Mercedes-Benz": ("WDD", ("Classe A", "Classe C", "Sprinter")),
+    "Fiat": ("ZFA", ("500", "Panda", "Ducato")),
+}
+FLEET_COLORS = ("Blanc", "Gris", "Noir", "Bleu", "Rouge", "Argent", "Vert", "Beige")
+FLEET_FUEL_TYPES = (("Diesel", 40), ("Essence", 35), ("Hybride", 14), ("Électrique", 8), ("GPL", 3))
+FLEET_INSURERS = ("AXA", "Allianz", "MAIF", "MACIF", "Groupama", "Matmut", "GMF", "Generali")
+FLEET_DOCUMENT_TYPES = ("registration", "insurance", "technical_check", "purchase")
+FLEET_FIRST_NAMES = ("Camille", "Louis", "Léa", "Hugo", "Chloé", "Lucas", "Manon", "Jules", "Inès", "Adam",
+                     "Sarah", "Nathan", "Emma", "Gabriel", "Jade", "Raphaël", "Louise", "Arthur")
+FLEET_LAST_NAMES = ("Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy",
+                    "Moreau", "Simon", "Laurent", "Lefebvre", "Michel", "Garcia", "David", "Bertrand")
+FLEET_ROUTES = ("A1", "A4", "A6", "A7", "A8", "A9", "A10", "A13", "A26", "A31", "A36", "A43", "A61", "A63")
+FLEET_PAYMENT_METHODS = ("Solde", "Portique", "Carte")
+
+
+def _unit(seed, *key):
+    """Nombre dans [0, 1) dérivé de (graine, clé) : même résultat quel que soit le processus."""
+    digest = hashlib.blake2b(":".join(map(str, (seed,) + key)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+def user_uuid(seed, index):
+    digest = hashlib.blake2b(f"fleet:{seed}:user:{index}".encode(), digest_size=16).digest()
+    return uuid.UUID(bytes=digest, version=4)
+
+
+def owner_index(seed, number, users):
+    """
+    Propriétaire du véhicule n° number. Distribution asymétrique : la plupart
+    des comptes ont un ou deux véhicules, les premiers comptes (flottes
+    d'entreprise) en ont beaucoup.
+    """
+    return min(users - 1, int(users * _unit(seed, "owner", number) ** 2))
+
+
+@functools.lru_cache(maxsize=1)
+def _owner_ids(seed, users, vehicles):
+    # Calculé une fois par processus : utilisé par chaque lot de passages
+    return [user_uuid(seed, owner_index(seed, number, users)) for number in range(vehicles)]
+
+
+def plate_number(seed, number):
+    return (number * PLATE_MULTIPLIER + seed * 7919) % PLATE_SPACE
+
+
+def make_plate(value):
+    """
+    Plaque SIV correspondant à un entier de [0, PLATE_SPACE), sans tirets
+    (AB123CD) : forme acceptée par VehicleForm.clean_license_plate.
+    """
+    value, right = divmod(value, len(PLATE_PAIRS))
+    left, digits = divmod(value, 999)
+    return f"{PLATE_PAIRS[left]}{digits + 1:03d}{PLATE_PAIRS[right]}"
+
+
+def vin_check_digit(vin):
+    total = sum(VIN_VALUES[char] * weight for char, weight in zip(vin, VIN_WEIGHTS))
+    remainder = total % 11
+    return "X" if remainder == 10 else str(remainder)
+
+
+def make_vin(wmi, value, year, plant):
+    """VIN valide : code constructeur, 11 caractères tirés de value (unique), clé, année et usine."""
+    # Bijection sur 33^11 : les 11 caractères varient tous d'un véhicule à l'autre
+    value = value * VIN_MULTIPLIER % len(VIN_ALPHABET) ** 11
+    chars = []
+    for _ in range(11):
+        value, digit = divmod(value, len(VIN_ALPHABET))
+        chars.append(VIN_ALPHABET[digit])
+    vin = f"{wmi}{''.join(chars[:5])}0{VIN_YEAR_CODES[(year - 1980) % 30]}{plant}{''.join(chars[5:])}"
+    return vin[:8] + vin_check_digit(vin) + vin[9:]
+
+
+@dataclass
+class FleetConfig:
+    """Paramètres d'une génération, transmis tels quels aux processus de travail."""
+    seed: int = 0
+    users: int = 1000
+    vehicles: int = 2000
+    documents_per_vehicle: int = 2
+    stations: int = 50
+    toll_vehicles: int = 2000
+    transactions: int = 100000
+    months: int = FLEET_MONTHS
+    batch_size: int = FLEET_BATCH_SIZE
+    password_hash: str = ""
+    today: datetime.date = None
+    now: datetime.datetime = None
+    use_copy: bool = False
+    # Premiers identifiants libres et données de référence, fixés avant la génération
+    vehicle_base: int = 1
+    document_base: int = 1
+    toll_vehicle_base: int = 1
+    transaction_base: int = 1
+    catalog: list = field(default_factory=list)  # [(brand_id, model_id, brand, model, wmi)]
+    station_fees: list = field(default_factory=list)  # [(station_id, fee)]
+
+
+@dataclass
+class FleetReport:
+    counts: dict = field(default_factory=dict)
+    timings: dict = field(default_factory=dict)
+
+    def add(self, phase, counts, elapsed):
+        for name, count in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+        self.timings[phase] = round(elapsed, 2)
+
+
+# ---------------------------------------------------------------------------
+# Écriture en base
+# ---------------------------------------------------------------------------
+
+def _copy_value(value):
+    if value is None:
+        return r"\N"
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    text = str(value)
+    if "\\" in text or "\t" in text or "\n" in text or "\r" in text:
+        text = text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+    return text
+
+
+def copy_rows(model, columns, rows):
+    """COPY ... FROM STDIN (PostgreSQL, psycopg 2 ou 3) : le mode d'insertion le plus rapide."""
+    quote = connection.ops.quote_name
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(map(_copy_value, row)))
+        buffer.write("\n")
+    sql = (
+        f"COPY {quote(model._meta.db_table)} ({', '.join(quote(column) for column in columns)}) FROM STDIN"
+    )
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, "copy_expert"):  # psycopg2
+            buffer.seek(0)
+            raw.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def insert_objects(model, objs, config):
+    """Insère des instances : COPY sous PostgreSQL si activé, bulk_create sinon."""
+    if not objs:
+        return 0
+    if not config.use_copy:
+        model.objects.bulk_create(objs, batch_size=min(config.batch_size, 5000))
+        return len(objs)
+    fields = [
+        f for f in model._meta.concrete_fields
+        if not (f.primary_key and getattr(objs[0], f.attname) is None)  # Clé attribuée par la base
+    ]
+    rows = []
+    for obj in objs:
+        rows.append([f.get_db_prep_save(f.pre_save(obj, True), connection) for f in fields])
+    copy_rows(model, [f.column for f in fields], rows)
+    return len(objs)
+
+
+# ---------------------------------------------------------------------------
+# Génération par lots (exécutée dans le processus principal ou un worker)
+# ---------------------------------------------------------------------------
+
+def _generate_users(config, start, count, rng):
+    from django.contrib.auth import get_user_model
+    from users.models import UserProfile
+
+    User = get_user_model()
+    users, profiles = [], []
+    for index in range(start, start + count):
+        first_name, last_name = rng.choice(FLEET_FIRST_NAMES), rng.choice(FLEET_LAST_NAMES)
+        joined = config.now - datetime.timedelta(days=rng.randint(0, 3 * 365), seconds=rng.randint(0, 86399))
+        user = User(
+            id=user_uuid(config.seed, index),
+            username=f"fleet{config.seed}_{index:08d}",
+            email=f"fleet{config.seed}_{index:08d}@example.com",
+            first_name=first_name,
+            last_name=last_name,
+            password=config.password_hash,
+            is_active=True,
+            is_verified=rng.random() < 0.8,
+            date_joined=joined,
+            created_at=joined,
+        )
+        users.append(user)
+        profiles.append(UserProfile(user_id=user.id, toll_balance=Decimal(rng.randint(0, 50000)) / 100))
+    insert_objects(User, users, config)
+    insert_objects(UserProfile, profiles, config)
+    return {"users": len(users), "profiles": len(profiles)}
+
+
+def _expiry_offset(rng, period_days, expired_share):
+    """
+    Jours restants avant une échéance renouvelée tous les period_days jours :
+    uniforme sur la période (≈ 30/period_days des véhicules dans la fenêtre de
+    rappel de 30 jours), plus une part de véhicules en retard.
+    """
+    if rng.random() < expired_share:
+        return -rng.randint(1, 90)
+    return rng.randrange(period_days)
+
+
+def _generate_vehicles(config, start, count, rng):
+    from users.models import Vehicle as TollVehicle
+    from vehicles.compliance import compute_compliance
+    from vehicles.models import Document, Vehicle, VehicleCompliance
+
+    Through = Vehicle.documents.through
+    fuel_types = [name for name, _ in FLEET_FUEL_TYPES]
+    fuel_weights = [weight for _, weight in FLEET_FUEL_TYPES]
+    today = config.today
+    vehicles, toll_vehicles, documents, links = [], [], [], []
+    for number in range(start, start + count):
+        brand_id, model_id, brand, model, wmi = rng.choice(config.catalog)
+        year = min(today.year, 2005 + int(rng.random() ** 0.7 * (today.year - 2004)))
+        plate_value = plate_number(config.seed, number)
+        plate = make_plate(plate_value)
+        vin = make_vin(wmi, plate_value, year, rng.choice(VIN_ALPHABET[:20]))
+        color = rng.choice(FLEET_COLORS)
+        owner_id = user_uuid(config.seed, owner_index(config.seed, number, config.users))
+        purchase_date = max(datetime.date(year, 1, 1), today - datetime.timedelta(days=rng.randint(30, 6000)))
+        technical_days = _expiry_offset(rng, 730, 0.05)
+        vehicle = Vehicle(
+            id=config.vehicle_base + number,
+            user_id=owner_id,
+            brand_id=brand_id,
+            model_id=model_id,
+            year=year,
+            license_plate=plate,
+            color=color,
+            vin_number=vin,
+            purchase_date=purchase_date,
+            mileage=int(max(0, (today - purchase_date).days) * rng.uniform(20, 60)),
+            fuel_type=rng.choices(fuel_types, fuel_weights)[0],
+            insurance_company=rng.choice(FLEET_INSURERS),
+            insurance_policy_number=f"POL-{config.seed}-{number:09d}",
+            insurance_expiry_date=today + datetime.timedelta(days=_expiry_offset(rng, 365, 0.03)),
+            last_technical_check=today + datetime.timedelta(days=technical_days - 730),
+            next_technical_check=today + datetime.timedelta(days=technical_days),
+            search_plate=normalize_plate(plate),
+            search_vin=vin,
+        )
+        vehicle.search_text = normalize_text(f"{brand} {model} {color}")[:255]
+        vehicles.append(vehicle)
+
+        for position in range(config.documents_per_vehicle):
+            document_id = config.document_base + number * config.documents_per_vehicle + position
+            document_type = FLEET_DOCUMENT_TYPES[position % len(FLEET_DOCUMENT_TYPES)]
+            documents.append(Document(
+                id=document_id,
+                document_type=document_type,
+                file=f"documents/fleet/{config.seed}/{number}-{document_type}.pdf",
+            ))
+            links.append(Through(vehicle_id=vehicle.id, document_id=document_id))
+
+        if number < config.toll_vehicles:
+            toll_vehicles.append(TollVehicle(
+                id=config.toll_vehicle_base + number,
+                owner_id=owner_id,
+                registration_number=plate,
+                plate_key=vehicle.search_plate,
+                model=model,
+                brand=brand,
+                year=year,
+                color=color,
+                serial_number=vin,
+                toll_balance=Decimal(rng.randint(0, 30000)) / 100,
+            ))
+
+    insert_objects(Vehicle, vehicles, config)
+    insert_objects(VehicleCompliance, [compute_compliance(vehicle, today) for vehicle in vehicles], config)
+    insert_objects(Document, documents, config)
+    insert_objects(Through, links, config)
+    insert_objects(TollVehicle, toll_vehicles, config)
+    return {"vehicles": len(vehicles), "documents": len(documents), "toll_vehicles": len(toll_vehicles)}
+
+
+def _generate_transactions(config, start, count, rng):
+    from users.models import TollTransaction
+    from users.partitions import add_months, month_start
+
+    owners = _owner_ids(config.seed, config.users, config.toll_vehicles)
+    first_day = add_months(month_start(config.now), -(config.months - 1))
+    window_start = timezone.make_aware(datetime.datetime.combine(first_day, datetime.time()))
+    span = (config.now - window_start).total_seconds()
+    stations = config.station_fees
+    columns = ["id", "user_id", "vehicle_id", "toll_station_id", "transaction_date", "amount", "paid",
+               "payment_method"]
+    rows = []
+    random_value = rng.random
+    for number in range(start, start + count):
+        # Quelques véhicules (poids lourds, navetteurs) totalisent la plupart des passages
+        vehicle = int(config.toll_vehicles * random_value() ** 2)
+        station_id, fee = stations[int(len(stations) * random_value())]
+        rows.append((
+            config.transaction_base + number,
+            owners[vehicle],
+            config.toll_vehicle_base + vehicle,
+            station_id,
+            # Microsecondes tirées du numéro : (véhicule, station, horodatage) reste unique
+            # (contrainte users_toll_passage_unique) même pour les véhicules les plus actifs
+            window_start + datetime.timedelta(seconds=int(span * random_value()), microseconds=number % 1000000),
+            fee,
+            True,
+            FLEET_PAYMENT_METHODS[int(3 * random_value())],
+        ))
+    if config.use_copy:
+        copy_rows(TollTransaction, columns, rows)
+    else:
+        TollTransaction.objects.bulk_create(
+            [TollTransaction(**dict(zip(columns, row))) for row in rows], batch_size=min(config.batch_size, 5000)
+        )
+    return {"transactions": len(rows)}
+
+
+PHASES = {
+    "users": _generate_users,
+    "vehicles": _generate_vehicles,
+    "transactions": _generate_transactions,
+}
+
+
+def _run_chunk(task):
+    """Génère et insère un lot dans sa propre transaction. Graine propre au lot : résultat reproductible."""
+    phase, start, count, config = task
+    rng = random.Random(f"{config.seed}:{phase}:{start}")
+    with transaction.atomic():
+        return PHASES[phase](config, start, count, rng)
+
+
+def _run_phase(phase, total, config, workers, report, progress=None):
+    started = time.monotonic()
+    tasks = [
+        (phase, start, min(config.batch_size, total - start), config)
+        for start in range(0, total, config.batch_size)
+    ]
+    counts = {}
+
+    def collect(result):
+        for name, count in result.items():
+            counts[name] = counts.get(name, 0) + count
+        if progress:
+            progress(phase, counts, time.monotonic() - started)
+
+    if workers > 1 and len(tasks) > 1:
+        # Les workers (fork) ouvrent chacun leur propre connexion
+        connections.close_all()
+        with multiprocessing.get_context("fork").Pool(workers) as pool:
+            for result in pool.imap_unordered(_run_chunk, tasks):
+                collect(result)
+    else:
+        for task in tasks:
+            collect(_run_chunk(task))
+    report.add(phase, counts, time.monotonic() - started)
+
+
+# ---------------------------------------------------------------------------
+# Préparation et finalisation (processus principal)
+# ---------------------------------------------------------------------------
+
+def _next_id(model):
+    return (model.objects.aggregate(value=Max("pk"))["value"] or 0) + 1
+
+
+def _prepare_catalog():
+    from vehicles.models import Brand, VehicleModel
+
+    Brand.objects.bulk_create([Brand(name=name) for name in FLEET_CATALOG], ignore_conflicts=True)
+    brands = dict(Brand.objects.filter(name__in=FLEET_CATALOG).values_list("name", "pk"))
+    existing = set(VehicleModel.objects.filter(brand_id__in=brands.values()).values_list("brand_id", "name"))
+    VehicleModel.objects.bulk_create([
+        VehicleModel(brand_id=brands[brand], name=model)
+        for brand, (_, models) in FLEET_CATALOG.items()
+        for model in models
+        if (brands[brand], model) not in existing
+    ])
+    catalog = []
+    rows = VehicleModel.objects.filter(brand_id__in=brands.values()).values_list("brand_id", "pk", "name")
+    brand_names = {pk: name for name, pk in brands.items()}
+    for brand_id, model_id, model in rows.order_by("brand__name", "name"):
+        brand = brand_names[brand_id]
+        if model in FLEET_CATALOG[brand][1]:
+            catalog.append((brand_id, model_id, brand, model, FLEET_CATALOG[brand][0]))
+    return catalog
+
+
+def _prepare_stations(config):
+    from users.models import TollStation
+
+    rng = random.Random(f"{config.seed}:stations")
+    stations = []
+    for index in range(config.stations):
+        route = rng.choice(FLEET_ROUTES)
+        stations.append(TollStation(
+            name=f"Barrière {route} n° {index + 1}",
+            location=f"{route}, PK {rng.randint(1, 900)}",
+            fee=Decimal(rng.randint(150, 2500)) / 100,
+            route=route,
+        ))
+    stations = TollStation.objects.bulk_create(stations)
+    return [(station.pk, station.fee) for station in stations]
+
+
+def _reset_sequences(models):
+    from django.core.management.color import no_style
+
+    # Identifiants fixés explicitement : la séquence doit repartir après le plus grand
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def generate_fleet(config, workers=1, progress=None):
+    """
+    Génère une flotte synthétique reproductible : comptes et profils, catalogue
+    de marques et modèles, véhicules (plaques SIV et VIN valides, échéances
+    d'assurance et de contrôle technique réparties sur l'année, dont une part
+    dans la fenêtre de rappel), documents, statuts de conformité, stations,
+    comptes péage et historique de passages sur config.months mois.
+
+    Les identifiants sont attribués à partir du premier id libre, et chaque lot
+    tire ses valeurs d'une graine dérivée de (seed, phase, début du lot) : à
+    graine et taille de lot identiques, sur une base vide, le résultat est le
+    même quel que soit le nombre de workers. Sous PostgreSQL, les lots sont
+    insérés par COPY et peuvent être répartis entre plusieurs processus.
+    """
+    from django.contrib.auth.hashers import make_password
+    from core.plate_index import invalidate_plate_indexes
+    from users.models import TollTransaction, Vehicle as TollVehicle
+    from users.partitions import PARTITION_MONTHS_AHEAD, add_months, ensure_partitions, month_start
+    from users.rollups import rebuild_rollups
+    from vehicles.models import Document, Vehicle
+
+    postgresql = connection.vendor == "postgresql"
+    if not postgresql:
+        workers = 1  # SQLite : un seul écrivain à la fois
+    config.use_copy = config.use_copy and postgresql
+    config.today = config.today or datetime.date.today()
+    config.now = config.now or timezone.now()
+    config.toll_vehicles = min(config.toll_vehicles, config.vehicles)
+    if not config.password_hash:
+        # Un seul hachage pour tous les comptes : PBKDF2 par compte coûterait des heures
+        config.password_hash = make_password(f"Fleet-{config.seed}!")
+
+    report = FleetReport()
+    started = time.monotonic()
+    config.catalog = _prepare_catalog()
+    config.station_fees = _prepare_stations(config)
+    config.vehicle_base = _next_id(Vehicle)
+    config.document_base = _next_id(Document)
+    config.toll_vehicle_base = _next_id(TollVehicle)
+    config.transaction_base = _next_id(TollTransaction)
+    if config.transactions:
+        # Partitions mensuelles de tout l'historique, avant l'insertion
+        first_month = add_months(month_start(config.now), -(config.months - 1))
+        ensure_partitions(config.months - 1 + PARTITION_MONTHS_AHEAD, start=first_month)
+    report.add("reference", {"stations": len(config.station_fees)}, time.monotonic() - started)
+
+    _run_phase("users", config.users, config, workers, report, progress)
+    _run_phase("vehicles", config.vehicles, config, workers, report, progress)
+    if config.toll_vehicles and config.station_fees:
+        _run_phase("transactions", config.transactions, config, workers, report, progress)
+
+    started = time.monotonic()
+    _reset_sequences([Vehicle, Document, TollVehicle, TollTransaction])
+    report.add("rollups", {"rollups": rebuild_rollups()}, time.monotonic() - started)
+    invalidate_plate_indexes()
+    return report
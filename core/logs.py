@@ -0,0 +1,169 @@
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import threading
+import uuid
+import zlib
+from contextvars import ContextVar
+
+# Enregistrements en attente d'écriture ; au-delà, ils sont abandonnés plutôt que de bloquer
+LOG_QUEUE_SIZE = 10000
+# Identifiant reçu dans X-Request-ID accepté tel quel s'il a cette forme
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+NO_REQUEST_ID = "-"
+
+_request_id = ContextVar("request_id", default=None)
+
+# Attributs standard d'un LogRecord : le reste provient de extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def bind_request_id(value=None):
+    """Associe un identifiant (fourni s'il est valide, sinon généré) au contexte courant ; renvoie (id, jeton)."""
+    if not value or not REQUEST_ID_PATTERN.match(value):
+        value = uuid.uuid4().hex
+    return value, _request_id.set(value)
+
+
+def unbind_request_id(token):
+    _request_id.reset(token)
+
+
+class RequestIdFilter(logging.Filter):
+    """Ajoute record.request_id (requête HTTP ou tâche Celery en cours)."""
+
+    def filter(self, record):
+        record.request_id = _request_id.get() or NO_REQUEST_ID
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Ne garde qu'une fraction rate des enregistrements de niveau inférieur ou
+    égal à max_level ; les niveaux supérieurs passent toujours. Le tirage se
+    fait par identifiant de requête : une requête échantillonnée garde toutes
+    ses lignes.
+    """
+
+    def __init__(self, rate=1.0, max_level="INFO"):
+        super().__init__()
+        self.rate = float(rate)
+        self.max_level = max_level if isinstance(max_level, int) else logging.getLevelName(max_level.upper())
+
+    def filter(self, record):
+        if record.levelno > self.max_level or self.rate >= 1:
+            return True
+        if self.rate <= 0:
+            return False
+        request_id = _request_id.get()
+        if request_id is None:
+            return random.random() < self.rate
+        return zlib.crc32(request_id.encode()) / 2 ** 32 < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par enregistrement, champs extra={...} compris."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+            .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", NO_REQUEST_ID),
+            "process": record.process,
+            "thread": record.threadName,
+            "module": record.module,
+            "line": record.lineno,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _handler_by_name(name):
+    getter = getattr(logging, "getHandlerByName", None)  # Python 3.12+
+    return getter(name) if getter else logging._handlers.get(name)
+
+
+class QueuedHandler(logging.handlers.QueueHandler):
+    """
+    Handler non bloquant : l'appelant ne fait que mettre l'enregistrement dans
+    une file bornée ; un thread d'écriture (QueueListener) le transmet aux
+    handlers nommés dans targets (fichier, console), qui formatent et écrivent
+    hors du chemin de la requête. File pleine : l'enregistrement est abandonné
+    et compté dans dropped. Les filtres de ce handler (identifiant de requête,
+    échantillonnage) s'exécutent dans le thread appelant.
+    """
+
+    def __init__(self, targets=(), queue_size=LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(queue_size))
+        self.targets = list(targets)
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Processus issu d'un fork : le thread d'écriture du parent n'existe pas ici
+                self.queue = queue.Queue(self.queue_size)
+            handlers = [handler for handler in map(_handler_by_name, self.targets) if handler is not None]
+            self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+            self.listener.start()
+            self._pid = os.getpid()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Vide la file et arrête le thread d'écriture (appelé à la sortie du processus)."""
+        listener, self.listener = self.listener, None
+        if listener is not None and self._pid == os.getpid():
+            try:
+                listener.stop()
+            except queue.Full:  # Marqueur de fin refusé : le thread (démon) s'arrêtera avec le processus
+                pass
+        self._pid = None
+
+    def prepare(self, record):
+        # File interne au processus : pas de copie ni de formatage ici, seulement le
+        # message figé (ses arguments peuvent changer après l'appel)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        super().emit(record)
+
+    def close(self):
+        self.stop()
+        super().close()
@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from core.benchmark import SCENARIOS, compare_results, environment_info, run_benchmark, seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai des principaux parcours (liste/détail véhicule, téléchargement, inscription, "
+        "paiements, IPN, rappels) sur une base de test dédiée. Résultats en JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), dest="scenarios",
+                            help="Scénario à exécuter (répétable ; tous par défaut)")
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument("--vehicles-per-user", type=int, default=50)
+        parser.add_argument("--documents", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", "-o", help="Fichier JSON de résultats (benchmarks/<commit>.json par défaut)")
+        parser.add_argument("--compare", help="Rapport JSON précédent à comparer")
+        parser.add_argument("--threshold", type=float, default=10.0, help="Seuil de régression (%%)")
+        parser.add_argument("--keepdb", action="store_true", help="Conserver la base de test entre deux exécutions")
+
+    def handle(self, *args, **options):
+        previous = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as file:
+                    previous = json.load(file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Rapport de comparaison illisible : {e}")
+
+        setup_test_environment()
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root, PROTECTED_MEDIA_SERVER="",
+            ):
+                data = seed_dataset(
+                    users=options["users"], vehicles_per_user=options["vehicles_per_user"],
+                    documents=options["documents"], seed=options["seed"],
+                )
+                scenarios = run_benchmark(data, options["scenarios"], options["iterations"], options["warmup"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+            teardown_test_environment()
+
+        report = {
+            "meta": {
+                **environment_info(),
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "iterations": options["iterations"],
+                "warmup": options["warmup"],
+                "dataset": {"users": options["users"], "vehicles": data.vehicles,
+                            "documents": len(data.document_ids), "seed": options["seed"]},
+            },
+            "scenarios": scenarios,
+        }
+        output = options["output"] or os.path.join("benchmarks", f"{report['meta']['commit'] or 'local'}.json")
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+
+        for name, result in scenarios.items():
+            self.stdout.write(
+                f"{name:28} p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  "
+                f"{result['throughput_per_second']}/s  {result['queries_mean']} requêtes"
+            )
+        if previous:
+            for line in compare_results(previous, report, options["threshold"]):
+                self.stdout.write(self.style.ERROR(line) if "REGRESSION" in line else line)
+        self.stdout.write(self.style.SUCCESS(f"Résultats écrits dans {output}"))
@@ -0,0 +1,27 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from core.exports import DATASETS, FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    help = "Exporte un jeu de données comptable en flux (CSV ou JSON Lines, gzip optionnel)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--gzip", action="store_true", help="Compresser la sortie (gzip)")
+        parser.add_argument("--output", "-o", help="Fichier de sortie (sortie standard par défaut)")
+
+    def handle(self, *args, **options):
+        chunks = iter_export(options["dataset"], options["format"], options["gzip"])
+        try:
+            if options["output"]:
+                with open(options["output"], "wb") as output:
+                    for chunk in chunks:
+                        output.write(chunk)
+            else:
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+                sys.stdout.buffer.flush()
+        except OSError as e:
+            raise CommandError(str(e))
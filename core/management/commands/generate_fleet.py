@@ -0,0 +1,67 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from core.fleet import FLEET_BATCH_SIZE, FLEET_MONTHS, FleetConfig, generate_fleet
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère une flotte synthétique reproductible (comptes, véhicules, documents, "
+        "stations, passages de péage) pour les tests de montée en charge."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="Même graine : mêmes données")
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--vehicles", type=int, default=2000)
+        parser.add_argument("--documents-per-vehicle", type=int, default=2)
+        parser.add_argument("--stations", type=int, default=50)
+        parser.add_argument("--toll-vehicles", type=int, default=None,
+                            help="Véhicules inscrits au télépéage (par défaut : tous)")
+        parser.add_argument("--transactions", type=int, default=100000)
+        parser.add_argument("--months", type=int, default=FLEET_MONTHS, help="Profondeur de l'historique des passages")
+        parser.add_argument("--batch-size", type=int, default=FLEET_BATCH_SIZE)
+        parser.add_argument("--workers", type=int, default=1,
+                            help="Processus d'insertion en parallèle (PostgreSQL uniquement)")
+        parser.add_argument("--no-copy", action="store_true", help="bulk_create au lieu de COPY sous PostgreSQL")
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        if options["users"] < 1 or options["vehicles"] < 0 or options["transactions"] < 0:
+            raise CommandError("Il faut au moins un utilisateur et des volumes positifs.")
+        if options["batch_size"] < 1 or options["months"] < 1:
+            raise CommandError("--batch-size et --months doivent être positifs.")
+        workers = max(1, min(options["workers"], os.cpu_count() or 1))
+        if workers > 1 and connection.vendor != "postgresql":
+            self.stderr.write("Base autre que PostgreSQL : insertion dans un seul processus.")
+
+        config = FleetConfig(
+            seed=options["seed"],
+            users=options["users"],
+            vehicles=options["vehicles"],
+            documents_per_vehicle=options["documents_per_vehicle"],
+            stations=options["stations"],
+            toll_vehicles=options["vehicles"] if options["toll_vehicles"] is None else options["toll_vehicles"],
+            transactions=options["transactions"],
+            months=options["months"],
+            batch_size=options["batch_size"],
+            use_copy=not options["no_copy"],
+        )
+        started = time.monotonic()
+        report = generate_fleet(config, workers=workers, progress=self._progress)
+
+        elapsed = time.monotonic() - started
+        for phase, seconds in report.timings.items():
+            self.stdout.write(f"  {phase:<13} {seconds:>8.1f} s")
+        counts = ", ".join(f"{count} {name}" for name, count in report.counts.items())
+        rate = report.counts.get("transactions", 0) / report.timings["transactions"] \
+            if report.timings.get("transactions") else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Flotte générée en {elapsed:.1f}s (graine {config.seed}) : {counts} ({rate:.0f} passages/s)."
+        ))
+
+    def _progress(self, phase, counts, elapsed):
+        if self.verbosity >= 2:
+            counts = ", ".join(f"{count} {name}" for name, count in counts.items())
+            self.stdout.write(f"[{phase}] {counts} ({elapsed:.1f} s)")
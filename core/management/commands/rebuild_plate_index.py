@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.plate_index import PLATE_INDEXES, get_plate_index, invalidate_plate_indexes
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les index de plaques en mémoire (tous les workers les rechargent)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help="Index à reconstruire (tous par défaut)")
+
+    def handle(self, *args, **options):
+        names = options["names"] or list(PLATE_INDEXES)
+        unknown = set(names) - set(PLATE_INDEXES)
+        if unknown:
+            raise CommandError(f"Index inconnu : {', '.join(sorted(unknown))}")
+        invalidate_plate_indexes(*names)
+        for name in names:
+            count = get_plate_index(name).build()
+            self.stdout.write(self.style.SUCCESS(f"Index {name} : {count} plaques."))
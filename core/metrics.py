@@ -0,0 +1,202 @@
+import heapq
+import threading
+import time
+from contextvars import ContextVar
+
+# Bornes des histogrammes (format Prometheus : compteurs cumulés "le")
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+RESPONSE_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Requêtes SQL les plus lentes conservées pour le journal des requêtes HTTP lentes
+SLOW_QUERIES_KEPT = 5
+SLOW_QUERY_SQL_LENGTH = 500
+
+_current = ContextVar("request_metrics", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_number(value)}"
+
+
+class Histogram:
+    """Histogramme à bornes fixes, par combinaison d'étiquettes (processus courant)."""
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.labels = tuple(labels)
+        self._series = {}  # étiquettes -> [compteurs par borne..., somme, nombre]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, labels=()):
+        series = self._series.get(labels)
+        return series[-1] if series else 0
+
+    def render(self):
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                bucket_labels = _format_labels(self.labels, labels, [("le", _format_number(bound))])
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_number(values[-2])}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels)} {values[-1]}"
+
+
+VIEW_LABELS = ("view", "method")
+
+REQUESTS = Counter("gv_http_requests_total", "Requêtes HTTP traitées.", ("view", "method", "status"))
+REQUEST_DURATION = Histogram(
+    "gv_http_request_duration_seconds", "Durée de traitement des requêtes HTTP.", DURATION_BUCKETS, VIEW_LABELS
+)
+REQUEST_QUERIES = Histogram(
+    "gv_http_request_db_queries", "Requêtes SQL par requête HTTP.", QUERY_COUNT_BUCKETS, VIEW_LABELS
+)
+REQUEST_SQL_DURATION = Histogram(
+    "gv_http_request_db_duration_seconds", "Temps SQL cumulé par requête HTTP.", DURATION_BUCKETS, VIEW_LABELS
+)
+RESPONSE_SIZE = Histogram(
+    "gv_http_response_size_bytes", "Taille des réponses HTTP (hors réponses en flux).",
+    RESPONSE_SIZE_BUCKETS, VIEW_LABELS,
+)
+CACHE_HITS = Counter("gv_cache_hits_total", "Lectures du cache applicatif réussies.", ("view",))
+CACHE_MISSES = Counter("gv_cache_misses_total", "Lectures du cache applicatif manquées.", ("view",))
+
+REGISTRY = [REQUESTS, REQUEST_DURATION, REQUEST_QUERIES, REQUEST_SQL_DURATION, RESPONSE_SIZE,
+            CACHE_HITS, CACHE_MISSES]
+
+
+class RequestMetrics:
+    """
+    Mesures d'une requête HTTP : appelé par record_query pour chaque requête
+    SQL, compte les requêtes et leur durée, et garde les plus lentes.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.slowest = []  # tas (durée, sql) des SLOW_QUERIES_KEPT requêtes les plus lentes
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.sql_time += elapsed
+            entry = (elapsed, sql[:SLOW_QUERY_SQL_LENGTH])
+            if len(self.slowest) < SLOW_QUERIES_KEPT:
+                heapq.heappush(self.slowest, entry)
+            elif elapsed > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def top_queries(self):
+        return sorted(self.slowest, reverse=True)
+
+    def activate(self):
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    execute_wrapper installé sur chaque connexion (core/signals.py) : la requête
+    SQL est comptée pour la requête HTTP en cours, y compris depuis les threads
+    de sync_to_async des vues asynchrones (le contexte y est recopié).
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def record_cache_access(hit):
+    """Compte une lecture du cache pour la requête HTTP en cours (sans effet hors requête)."""
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+
+def observe_request(view, method, status, metrics, elapsed, size=None):
+    labels = (view, method)
+    REQUESTS.inc((view, method, str(status)))
+    REQUEST_DURATION.observe(labels, elapsed)
+    REQUEST_QUERIES.observe(labels, metrics.queries)
+    REQUEST_SQL_DURATION.observe(labels, metrics.sql_time)
+    if size is not None:
+        RESPONSE_SIZE.observe(labels, size)
+    if metrics.cache_hits:
+        CACHE_HITS.inc((view,), metrics.cache_hits)
+    if metrics.cache_misses:
+        CACHE_MISSES.inc((view,), metrics.cache_misses)
+
+
+def render_metrics():
+    """Toutes les métriques du processus courant, au format texte Prometheus."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,110 @@
+import logging
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from .logs import bind_request_id, unbind_request_id
+from .metrics import RequestMetrics, observe_request
+
+logger = logging.getLogger("core.slow_requests")
+
+UNRESOLVED_VIEW = "<unresolved>"
+REQUEST_ID_HEADER = "X-Request-ID"
+
+
+class HybridMiddleware:
+    """
+    Base des middlewares utilisables en WSGI comme en ASGI : sous ASGI,
+    __call__ renvoie la coroutine __acall__ (pas de passage par un thread),
+    et les variables de contexte sont posées dans la coroutine elle-même.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+
+class RequestIdMiddleware(HybridMiddleware):
+    """
+    Identifiant de requête (repris de l'en-tête X-Request-ID du proxy s'il est
+    valide, sinon généré) : ajouté à chaque ligne de journal émise pendant la
+    requête et renvoyé dans la réponse.
+    """
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request.id, token = bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+        try:
+            response = self.get_response(request)
+        finally:
+            unbind_request_id(token)
+        response[REQUEST_ID_HEADER] = request.id
+        return response
+
+    async def __acall__(self, request):
+        request.id, token = bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+        try:
+            response = await self.get_response(request)
+        finally:
+            unbind_request_id(token)
+        response[REQUEST_ID_HEADER] = request.id
+        return response
+
+
+class RequestMetricsMiddleware(HybridMiddleware):
+    """
+    Mesure chaque requête : durée, nombre et temps des requêtes SQL, lectures
+    du cache et taille de la réponse, agrégés en histogrammes par vue
+    (core/metrics.py, exposés sur /metrics). Les requêtes plus lentes que
+    SLOW_REQUEST_THRESHOLD secondes sont journalisées avec leurs requêtes SQL
+    les plus lentes. À placer en tête de MIDDLEWARE.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.slow_threshold = getattr(settings, "SLOW_REQUEST_THRESHOLD", 1.0)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = metrics.activate()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.deactivate(token)
+        self.observe(request, response, metrics)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = metrics.activate()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.deactivate(token)
+        self.observe(request, response, metrics)
+        return response
+
+    def observe(self, request, response, metrics):
+        elapsed = time.perf_counter() - metrics.started
+        match = request.resolver_match
+        view = match.view_name if match and match.view_name else UNRESOLVED_VIEW
+        # Réponse en flux : taille inconnue sans la consommer
+        size = None if response.streaming else len(response.content)
+        observe_request(view, request.method, response.status_code, metrics, elapsed, size)
+
+        if self.slow_threshold and elapsed >= self.slow_threshold:
+            top_queries = "".join(
+                f"\n  {duration * 1000:.1f} ms : {sql}" for duration, sql in metrics.top_queries()
+            )
+            logger.warning(
+                "Requête lente : %s %s (%s) %.3f s, %s requêtes SQL en %.3f s, cache %s/%s%s",
+                request.method, request.path, view, elapsed, metrics.queries, metrics.sql_time,
+                metrics.cache_hits, metrics.cache_hits + metrics.cache_misses, top_queries,
+            )
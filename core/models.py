@@ -1,3 +1,19 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class Blob(models.Model):
+    """
+    Fichier stocké sous son empreinte SHA-256 (core/storage.py) et partagé par
+    tous les champs qui le référencent. ref_count est tenu à jour par signaux ;
+    un blob qui n'est plus référencé est supprimé par collect_unreferenced_blobs.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    # Dernier envoi ou dernière référence : le ramasse-miettes laisse un délai de grâce
+    referenced_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} réf.)"
@@ -0,0 +1,34 @@
+import re
+import unicodedata
+
+_NON_ALNUM = re.compile(r"[^0-9A-Z]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_plate(value):
+    """
+    Forme canonique d'une plaque : majuscules, sans espaces, tirets ni points.
+    "ab-123 cd" -> "AB123CD"
+    """
+    if not value:
+        return ""
+    return _NON_ALNUM.sub("", strip_accents(value).upper())
+
+
+def normalize_vin(value):
+    """Forme canonique d'un numéro de série (VIN) : majuscules alphanumériques."""
+    return normalize_plate(value)
+
+
+def normalize_text(value):
+    """Texte libre en minuscules, sans accents, espaces simples."""
+    if not value:
+        return ""
+    return _SPACES.sub(" ", strip_accents(value).lower()).strip()
+
+
+def strip_accents(value):
+    return "".join(
+        char for char in unicodedata.normalize("NFKD", value)
+        if not unicodedata.combining(char)
+    )
@@ -0,0 +1,147 @@
+import base64
+import datetime
+import json
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+# Taille de page par défaut
+DEFAULT_PAGE_SIZE = 50
+
+
+class KeysetPage:
+    """Page obtenue par pagination par curseur (keyset)."""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _normalize_ordering(ordering):
+    """Ajoute la clé primaire en dernier critère pour garantir un ordre total."""
+    ordering = list(ordering)
+    if not any(field.lstrip("-") in ("pk", "id") for field in ordering):
+        descending = ordering and ordering[-1].startswith("-")
+        ordering.append("-pk" if descending else "pk")
+    return ordering
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """
+    Dates et heures à la microseconde : DjangoJSONEncoder tronque à la
+    milliseconde, et la page suivante sauterait les lignes de même horodatage.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, cls=_CursorEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, size):
+    """Renvoie la liste des valeurs du curseur, ou None s'il est absent ou invalide."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or len(values) != size:
+        return None
+    return values
+
+
+def _ordering_field(model, path):
+    """Champ de modèle désigné par un chemin de tri (relations comprises)."""
+    field = None
+    for name in path.split("__"):
+        field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+        model = field.related_model or model
+    return field
+
+
+def _coerce_cursor(model, ordering, values):
+    """
+    Convertit les valeurs du curseur dans le type de chaque colonne de tri ;
+    None si l'une d'elles est invalide (curseur modifié) : première page.
+    """
+    coerced = []
+    for field, value in zip(ordering, values):
+        if value is None or isinstance(value, (list, dict)):
+            return None
+        try:
+            coerced.append(_ordering_field(model, field.lstrip("-")).to_python(value))
+        except (ValidationError, TypeError, ValueError):
+            return None
+    return coerced
+
+
+def _after(ordering, values):
+    """
+    Condition "strictement après" pour un tri multi-colonnes :
+    (a > x) OR (a = x AND b > y) OR ...
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def _page_queryset(queryset, cursor, ordering):
+    ordering = _normalize_ordering(ordering)
+    queryset = queryset.order_by(*ordering)
+    values = decode_cursor(cursor, len(ordering))
+    if values is not None:
+        values = _coerce_cursor(queryset.model, ordering, values)
+    if values is not None:
+        queryset = queryset.filter(_after(ordering, values))
+    return queryset, ordering
+
+
+def _make_page(objects, per_page, ordering):
+    next_cursor = None
+    if len(objects) > per_page:
+        objects = objects[:per_page]
+        last = objects[-1]
+        next_cursor = encode_cursor([_value(last, field.lstrip("-")) for field in ordering])
+    return KeysetPage(objects, next_cursor)
+
+
+def keyset_paginate(queryset, cursor=None, per_page=DEFAULT_PAGE_SIZE, ordering=("pk",)):
+    """
+    Pagine un queryset par curseur sur les colonnes de tri (sans OFFSET) :
+    le coût d'une page ne dépend pas de sa position dans la liste.
+    """
+    queryset, ordering = _page_queryset(queryset, cursor, ordering)
+    return _make_page(list(queryset[:per_page + 1]), per_page, ordering)
+
+
+async def akeyset_paginate(queryset, cursor=None, per_page=DEFAULT_PAGE_SIZE, ordering=("pk",)):
+    """Variante asyncio de keyset_paginate (interface async de l'ORM)."""
+    queryset, ordering = _page_queryset(queryset, cursor, ordering)
+    return _make_page([obj async for obj in queryset[:per_page + 1]], per_page, ordering)
+
+
+def _value(obj, path):
+    for attribute in path.split("__"):
+        obj = getattr(obj, attribute)
+    return obj
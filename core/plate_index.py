@@ -0,0 +1,260 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from django.apps import apps
+from django.core.cache import cache
+from .normalization import normalize_plate
+
+logger = logging.getLogger(__name__)
+
+# Index disponibles : modèle, colonne contenant la plaque normalisée
+# (la recherche de vehicles s'appuie sur la colonne indexée search_plate, en base)
+PLATE_INDEXES = {
+    "tolls": ("users.Vehicle", "plate_key"),
+}
+
+# Taux de faux positifs visé par le filtre de Bloom
+BLOOM_ERROR_RATE = 0.01
+# Capacité minimale du filtre (marge pour les véhicules ajoutés après la construction)
+BLOOM_MIN_CAPACITY = 10000
+# Lignes lues par aller-retour lors de la construction
+BUILD_CHUNK_SIZE = 5000
+# Intervalle (secondes) entre deux vérifications de la version partagée
+VERSION_CHECK_INTERVAL = 5
+# Modifications publiées dans le cache (une par version) : durée de conservation (secondes)
+# et retard maximal rattrapé par les autres processus sans reconstruction complète
+DELTA_TIMEOUT = 3600
+MAX_PENDING_DELTAS = 1000
+
+
+class BloomFilter:
+    """
+    Filtre de Bloom : "absent" est certain, "présent" peut être un faux positif.
+    Les k positions sont dérivées d'un seul hachage blake2b (double hachage).
+    """
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.count = 0
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, value):
+        self.count += 1
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class PlateIndex:
+    """
+    Index en mémoire (par processus) plaque normalisée -> id de véhicule,
+    précédé d'un filtre de Bloom qui écarte les plaques inconnues sans
+    consulter le dictionnaire ni la base. Construit par une requête en flux,
+    tenu à jour par les signaux du processus. Chaque modification est publiée
+    dans le cache (version partagée + modification de cette version) : les
+    autres processus l'appliquent à leur index, vérifié au plus toutes les
+    VERSION_CHECK_INTERVAL secondes, et ne reconstruisent depuis la base que
+    si des modifications manquent. Le filtre de Bloom est recalculé en mémoire
+    quand les ajouts dépassent sa capacité.
+    """
+
+    def __init__(self, name, model_label, field):
+        self.name = name
+        self.model_label = model_label
+        self.field = field
+        self._lock = threading.Lock()
+        self._plates = None
+        self._ids = None
+        self._bloom = None
+        self._version = None
+        self._checked_at = 0.0
+        self.rejected = 0
+
+    @property
+    def _version_key(self):
+        return f"plate-index-version:{self.name}"
+
+    def _delta_key(self, version):
+        return f"plate-index-delta:{self.name}:{version}"
+
+    def _shared_version(self):
+        version = cache.get(self._version_key)
+        if version is None:
+            # Horodatage : une clé évincée puis recréée ne reprend pas une ancienne valeur
+            version = int(time.time() * 1000)
+            if not cache.add(self._version_key, version, None):
+                version = cache.get(self._version_key, version)
+        return version
+
+    def build(self):
+        """Reconstruit l'index depuis la base (lecture en flux, mémoire bornée par le résultat)."""
+        started = time.monotonic()
+        version = self._shared_version()
+        model = apps.get_model(self.model_label)
+        plates, ids = {}, {}
+        rows = model.objects.exclude(**{self.field: ""}).values_list(self.field, "pk")
+        for plate, pk in rows.order_by("pk").iterator(chunk_size=BUILD_CHUNK_SIZE):
+            plates[plate] = pk  # Plaque en double : le véhicule le plus récent l'emporte
+            ids[pk] = plate
+        bloom = self._new_bloom(plates)
+        with self._lock:
+            self._plates, self._ids, self._bloom = plates, ids, bloom
+            self._version = version
+            self._checked_at = time.monotonic()
+        logger.info("Index de plaques %s : %s plaques en %.2f s", self.name, len(plates), time.monotonic() - started)
+        return len(plates)
+
+    @staticmethod
+    def _new_bloom(plates):
+        bloom = BloomFilter(max(len(plates) * 2, BLOOM_MIN_CAPACITY))
+        for plate in plates:
+            bloom.add(plate)
+        return bloom
+
+    def _ensure_current(self):
+        if self._plates is None:
+            self.build()
+            return
+        now = time.monotonic()
+        if now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        shared = self._shared_version()
+        if shared != self._version and not self._catch_up(shared):
+            self.build()
+
+    def _catch_up(self, shared):
+        """Applique les modifications publiées par les autres processus ; False s'il en manque."""
+        missing = shared - self._version if self._version is not None else 0
+        if not 0 < missing <= MAX_PENDING_DELTAS:
+            return False
+        keys = [self._delta_key(version) for version in range(self._version + 1, shared + 1)]
+        deltas = cache.get_many(keys)
+        if len(deltas) != len(keys):
+            return False
+        with self._lock:
+            for key in keys:
+                self._apply(*deltas[key])
+            self._version = shared
+        return True
+
+    def _apply(self, pk, key):
+        """Remplace la plaque du véhicule pk (key vide : véhicule supprimé). Appelé sous verrou."""
+        previous = self._ids.pop(pk, None)
+        if previous and self._plates.get(previous) == pk:
+            del self._plates[previous]
+        if key:
+            self._plates[key] = pk
+            self._ids[pk] = key
+            if key != previous:
+                self._bloom.add(key)
+        if self._bloom.count > self._bloom.capacity:
+            # Plaques remplacées ou supprimées encore présentes : filtre recalculé sans la base
+            self._bloom = self._new_bloom(self._plates)
+
+    def lookup(self, plate):
+        """Id du véhicule portant cette plaque (forme libre), ou None."""
+        key = normalize_plate(plate)
+        self._ensure_current()
+        if not key or key not in self._bloom:
+            self.rejected += 1
+            return None
+        return self._plates.get(key)
+
+    def lookup_many(self, plates):
+        """Dictionnaire plaque normalisée -> id, pour les plaques connues uniquement."""
+        self._ensure_current()
+        bloom, index = self._bloom, self._plates
+        found = {}
+        for plate in plates:
+            key = normalize_plate(plate)
+            if key and key in bloom:
+                pk = index.get(key)
+                if pk is not None:
+                    found[key] = pk
+                continue
+            self.rejected += 1
+        return found
+
+    def _publish(self, pk, key):
+        """Publie la modification pour les autres processus ; l'index local est déjà à jour."""
+        try:
+            version = cache.incr(self._version_key)
+        except ValueError:
+            self._shared_version()
+            return
+        cache.set(self._delta_key(version), (pk, key), DELTA_TIMEOUT)
+        # Si un autre processus a aussi modifié les véhicules, ses modifications seront rattrapées
+        with self._lock:
+            if self._version is not None and version == self._version + 1:
+                self._version = version
+
+    def update(self, pk, plate):
+        key = normalize_plate(plate)
+        if self._plates is not None:
+            with self._lock:
+                self._apply(pk, key)
+        self._publish(pk, key)
+
+    def remove(self, pk):
+        if self._plates is not None:
+            with self._lock:
+                self._apply(pk, "")
+        self._publish(pk, "")
+
+    def stats(self):
+        return {
+            "plates": len(self._plates or ()),
+            "bloom_bits": self._bloom.size if self._bloom else 0,
+            "bloom_entries": self._bloom.count if self._bloom else 0,
+            "rejected": self.rejected,
+            "version": self._version,
+        }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_plate_index(name):
+    index = _indexes.get(name)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(name)
+            if index is None:
+                model_label, field = PLATE_INDEXES[name]
+                index = _indexes[name] = PlateIndex(name, model_label, field)
+    return index
+
+
+def warm_plate_indexes():
+    """Construit tous les index au démarrage d'un worker (wsgi/asgi)."""
+    for name in PLATE_INDEXES:
+        try:
+            get_plate_index(name).build()
+        except Exception as e:  # Base indisponible au démarrage : construction au premier usage
+            logger.warning("Index de plaques %s non construit au démarrage : %s", name, e)
+
+
+def invalidate_plate_indexes(*names):
+    """Force la reconstruction des index (tous processus), par ex. après un import en masse."""
+    for name in names or PLATE_INDEXES:
+        index = get_plate_index(name)
+        try:
+            cache.incr(index._version_key)
+        except ValueError:
+            index._shared_version()
+        index._plates = None
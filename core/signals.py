@@ -0,0 +1,43 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .metrics import record_query
+from .storage import adjust_references, blob_names, stored_blob_names
+from .thumbnails import schedule_thumbnails
+
+
+@receiver(post_save, sender="users.CustomUser")
+@receiver(post_save, sender="vehicles.Vehicle")
+@receiver(post_save, sender="vehicles.Document")
+def schedule_missing_thumbnails(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    schedule_thumbnails(instance, update_fields)
+
+
+@receiver(pre_save, sender="vehicles.Vehicle")
+@receiver(pre_save, sender="vehicles.Document")
+def remember_blob_references(sender, instance, raw=False, **kwargs):
+    instance._previous_blob_names = [] if raw else stored_blob_names(instance)
+
+
+@receiver(post_save, sender="vehicles.Vehicle")
+@receiver(post_save, sender="vehicles.Document")
+def count_blob_references(sender, instance, raw=False, **kwargs):
+    """Compteurs de références des blobs remplacés ou ajoutés par la sauvegarde."""
+    if raw:
+        return
+    adjust_references(added=blob_names(instance), removed=getattr(instance, "_previous_blob_names", ()))
+
+
+@receiver(post_delete, sender="vehicles.Vehicle")
+@receiver(post_delete, sender="vehicles.Document")
+def release_blob_references(sender, instance, **kwargs):
+    adjust_references(removed=blob_names(instance))
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    """Requêtes SQL comptées pour la requête HTTP en cours, quel que soit le thread."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
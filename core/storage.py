@@ -0,0 +1,183 @@
+import datetime
+import hashlib
+import logging
+import os
+from collections import Counter
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Répertoire des fichiers adressés par contenu : blobs/ab/cd/abcd…ef.pdf
+BLOB_PREFIX = "blobs/"
+BLOB_EXTENSION_LENGTH = 10
+HASH_CHUNK_SIZE = 1024 * 1024
+# Champs dont les fichiers sont stockés en blobs et comptés dans Blob.ref_count
+BLOB_FIELDS = {
+    "vehicles.Document": ("file",),
+    "vehicles.Vehicle": ("purchase_document", "vignette_document", "registration_document"),
+}
+
+
+def file_digest(content):
+    """SHA-256 et taille d'un fichier, lu par morceaux puis rembobiné."""
+    digest = hashlib.sha256()
+    size = 0
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+    if hasattr(content, "seek"):
+        content.seek(0)
+    return digest.hexdigest(), size
+
+
+def blob_name(digest, filename=""):
+    extension = os.path.splitext(filename)[1].lower()
+    if len(extension) > BLOB_EXTENSION_LENGTH:
+        extension = ""
+    return f"{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stockage par empreinte : un fichier envoyé est enregistré sous son SHA-256,
+    quel que soit son nom ou son upload_to. Si le même contenu existe déjà,
+    rien n'est écrit et le blob existant est réutilisé. Les noms déjà placés
+    sous blobs/ sont enregistrés tels quels ; les fichiers dérivés passent par
+    save_derived.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("allow_overwrite", True)
+        super().__init__(**kwargs)
+
+    def save(self, name, content, max_length=None):
+        if is_blob(name):
+            return super().save(name, content, max_length)
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        digest, size = file_digest(content)
+        name = blob_name(digest, name)
+        Blob = apps.get_model("core", "Blob")
+        # Le verrou sur la ligne exclut le ramasse-miettes pendant l'écriture
+        with transaction.atomic():
+            blob, created = Blob.objects.select_for_update().get_or_create(
+                name=name, defaults={"sha256": digest, "size": size},
+            )
+            if not created:
+                Blob.objects.filter(pk=blob.pk).update(referenced_at=timezone.now())
+            if self.exists(name):
+                logger.debug("Blob %s déjà présent : écriture évitée", name)
+            else:
+                self._save(name, content)
+        return name
+
+    def save_derived(self, name, content):
+        """
+        Fichier dérivé d'un original (vignettes, core/thumbnails.py), enregistré
+        tel quel : son nom est calculé à partir de celui de l'original, y compris
+        pour les documents enregistrés avant les blobs. Jamais pour un envoi.
+        """
+        return super().save(name, content)
+
+
+blob_storage = ContentAddressedStorage()
+
+
+def get_blob_storage():
+    """Stockage des documents de véhicules (callable référencé par les FileField et leurs migrations)."""
+    return blob_storage
+
+
+def blob_names(instance):
+    """Noms de blobs référencés par une instance (un par champ renseigné)."""
+    fields = BLOB_FIELDS.get(instance._meta.label, ())
+    return [name for name in (getattr(instance, field).name for field in fields) if is_blob(name)]
+
+
+def stored_blob_names(instance):
+    """Noms de blobs enregistrés en base pour cette instance (avant modification)."""
+    fields = BLOB_FIELDS.get(instance._meta.label, ())
+    if instance.pk is None or not fields:
+        return []
+    row = type(instance)._default_manager.filter(pk=instance.pk).values_list(*fields).first()
+    return [name for name in row or () if is_blob(name)]
+
+
+def adjust_references(added=(), removed=()):
+    """Met à jour Blob.ref_count : +1 par occurrence de added, -1 par occurrence de removed."""
+    Blob = apps.get_model("core", "Blob")
+    deltas = Counter(added)
+    deltas.subtract(Counter(removed))
+    by_delta = {}
+    for name, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(name)
+    now = timezone.now()
+    for delta, names in by_delta.items():
+        Blob.objects.filter(name__in=names).update(ref_count=F("ref_count") + delta, referenced_at=now)
+
+
+def count_references(name):
+    """Références réelles d'un blob (vérification avant suppression)."""
+    total = 0
+    for label, fields in BLOB_FIELDS.items():
+        manager = apps.get_model(label)._default_manager
+        for field in fields:
+            total += manager.filter(**{field: name}).count()
+    return total
+
+
+def delete_blob_files(storage, name):
+    """Supprime le blob et ses fichiers dérivés (<nom>.<suffixe>, ex. vignettes)."""
+    directory, base = os.path.split(name)
+    try:
+        _, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        if filename == base or filename.startswith(base + "."):
+            storage.delete(f"{directory}/{filename}")
+
+
+def collect_unreferenced_blobs(grace=None):
+    """
+    Supprime les blobs sans référence depuis plus de grace (délai laissé entre
+    l'envoi d'un fichier et l'enregistrement du formulaire qui le référence).
+    Le compteur est revérifié sur les tables avant suppression et corrigé s'il
+    a dérivé. Renvoie (blobs supprimés, octets libérés).
+    """
+    Blob = apps.get_model("core", "Blob")
+    if grace is None:
+        grace = datetime.timedelta(hours=getattr(settings, "BLOB_GC_GRACE_HOURS", 24))
+    cutoff = timezone.now() - grace
+    deleted, freed = 0, 0
+    candidates = Blob.objects.filter(ref_count__lte=0, referenced_at__lt=cutoff).values_list("pk", flat=True)
+    for pk in list(candidates.iterator()):
+        with transaction.atomic():
+            blob = Blob.objects.select_for_update(skip_locked=True).filter(
+                pk=pk, ref_count__lte=0, referenced_at__lt=cutoff,
+            ).first()
+            if blob is None:
+                continue  # Réutilisé entre-temps, ou en cours d'écriture
+            references = count_references(blob.name)
+            if references:
+                logger.warning("Compteur du blob %s corrigé : %s références", blob.name, references)
+                Blob.objects.filter(pk=pk).update(ref_count=references)
+                continue
+            delete_blob_files(blob_storage, blob.name)
+            blob.delete()
+        deleted += 1
+        freed += blob.size
+    return deleted, freed
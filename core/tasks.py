@@ -0,0 +1,32 @@
+import logging
+from celery import shared_task
+from django.apps import apps
+from .storage import collect_unreferenced_blobs
+from .thumbnails import THUMBNAIL_SOURCES, ThumbnailError, generate_thumbnails
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def generate_thumbnails_task(source, pk, field):
+    """Vignettes WebP/JPEG (et aperçu de la première page des PDF) d'un fichier envoyé."""
+    model_label, fields = THUMBNAIL_SOURCES[source]
+    if field not in fields:
+        return
+    instance = apps.get_model(model_label).objects.filter(pk=pk).first()
+    field_file = getattr(instance, field, None)
+    if not field_file:
+        return
+    try:
+        generate_thumbnails(field_file)
+    except ThumbnailError as e:
+        logger.info("Pas de vignette pour %s : %s", field_file.name, e)
+
+
+@shared_task
+def collect_blobs():
+    """Supprime les documents stockés qui ne sont plus référencés (après le délai de grâce)."""
+    deleted, freed = collect_unreferenced_blobs()
+    if deleted:
+        logger.info("%s blobs supprimés, %s octets libérés", deleted, freed)
+    return deleted
@@ -0,0 +1,17 @@
+from django import template
+from django.urls import reverse
+from core.thumbnails import source_for, thumbnail_version
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail_url(field_file, size="small"):
+    """{{ profile.avatar|thumbnail_url:"medium" }} : URL versionnée de la vignette, vide si aucune."""
+    if not field_file or not field_file.name:
+        return ""
+    source = source_for(field_file)
+    if source is None:
+        return ""
+    url = reverse("thumbnail", args=[source, field_file.instance.pk, field_file.field.name, size])
+    return f"{url}?v={thumbnail_version(field_file.name)}"
@@ -1,3 +1,388 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import io
+import json
+import logging
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from users.models import TollStation, TollTransaction, UserProfile, Vehicle
+from vehicles.forms import VehicleForm
+from vehicles.models import Document
+from .benchmark import compare_results, measure, percentile
+from .exports import iter_export
+from .fleet import FleetConfig, generate_fleet, make_plate, make_vin, plate_number, vin_check_digit
+from .logs import JsonFormatter, RequestIdFilter, SamplingFilter, bind_request_id, unbind_request_id
+from .metrics import REQUEST_DURATION, REQUEST_QUERIES, Histogram
+from .models import Blob
+from .pagination import encode_cursor, keyset_paginate
+from .plate_index import BloomFilter, PlateIndex, get_plate_index, invalidate_plate_indexes
+from .storage import blob_storage, collect_unreferenced_blobs
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username="pages", password="Secret123!")
+        vehicle = Vehicle.objects.create(
+            owner=user, registration_number="AB123CD", model="Clio", brand="Renault",
+            year=2020, color="Rouge", serial_number="SN-AB123CD", toll_balance=Decimal("0"),
+        )
+        # Débit par lot : toutes les lignes partagent le même horodatage, à la microseconde
+        cls.shared = timezone.now().replace(microsecond=123456)
+        for index in range(7):
+            station = TollStation.objects.create(name=f"Gare {index}", location="A1", fee=Decimal("2.00"), route="A1")
+            date = cls.shared if index < 5 else cls.shared - datetime.timedelta(minutes=index)
+            TollTransaction.objects.create(
+                user=user, vehicle=vehicle, toll_station=station, amount=station.fee, transaction_date=date,
+            )
+        cls.queryset = TollTransaction.objects.all()
+        cls.expected = list(cls.queryset.order_by("-transaction_date", "-pk").values_list("pk", flat=True))
+
+    def paginate(self, cursor=None):
+        return keyset_paginate(self.queryset, cursor, 2, ("-transaction_date",))
+
+    def test_rows_sharing_a_timestamp_are_not_skipped(self):
+        seen, cursor = [], None
+        while True:
+            page = self.paginate(cursor)
+            seen.extend(row.pk for row in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.expected)
+
+    def test_tampered_cursor_falls_back_to_first_page(self):
+        first_page = [row.pk for row in self.paginate()]
+        for cursor in (
+            encode_cursor(["pas une date", 1]),
+            encode_cursor([self.shared.isoformat(), "x"]),
+            encode_cursor([None, 1]),
+            encode_cursor([[1], 2]),
+            encode_cursor([self.shared.isoformat()]),
+            "%%%",
+        ):
+            self.assertEqual([row.pk for row in self.paginate(cursor)], first_page, cursor)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.staff = User.objects.create_user(username="compta", password="Secret123!", is_active=True, is_staff=True)
+        cls.member = User.objects.create_user(username="membre", email="élodie@example.com", password="Secret123!", is_active=True)
+        UserProfile.objects.create(user=cls.staff, toll_balance=Decimal("0.00"))
+        UserProfile.objects.create(user=cls.member, toll_balance=Decimal("12.50"))
+
+    def export(self, fmt="csv", compress=False):
+        return b"".join(iter_export("balances", fmt, compress))
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.export().decode())))
+        self.assertEqual(rows[0], ["user_id", "user__username", "user__email", "toll_balance"])
+        self.assertEqual(rows[2][1:], ["membre", "élodie@example.com", "12.50"])
+
+    def test_jsonl(self):
+        records = [json.loads(line) for line in self.export("jsonl").decode().splitlines()]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[1]["toll_balance"], "12.50")
+        self.assertEqual(records[1]["user_id"], str(self.member.pk))
+
+    def test_gzip_matches_plain_output(self):
+        with mock.patch("core.exports.EXPORT_FLUSH_SIZE", 16):
+            chunks = list(iter_export("balances", "csv"))
+            compressed = self.export(compress=True)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(gzip.decompress(compressed), b"".join(chunks))
+
+    def test_view_is_staff_only(self):
+        url = reverse("export_data", args=["balances"])
+        self.assertEqual(self.client.get(url, secure=True).status_code, 302)
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get(url, secure=True).status_code, 302)
+
+        self.client.force_login(self.staff)
+        response = self.client.get(url, {"format": "jsonl", "gzip": "1"}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn('filename="balances.jsonl.gz"', response["Content-Disposition"])
+        self.assertEqual(len(gzip.decompress(b"".join(response.streaming_content)).splitlines()), 2)
+        self.assertEqual(self.client.get(reverse("export_data", args=["secrets"]), secure=True).status_code, 404)
+        self.assertEqual(self.client.get(url, {"format": "xml"}, secure=True).status_code, 404)
+
+
+class BloomFilterTests(TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000)
+        plates = [f"AB{index:03d}CD" for index in range(1000)]
+        for plate in plates:
+            bloom.add(plate)
+        self.assertTrue(all(plate in bloom for plate in plates))
+        false_positives = sum(f"ZZ{index:05d}" in bloom for index in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class PlateIndexTests(TestCase):
+    def setUp(self):
+        invalidate_plate_indexes()
+        self.user = get_user_model().objects.create_user(username="fleet", password="Secret123!")
+        self.vehicle = self.create_vehicle("AB-123-CD")
+        self.index = get_plate_index("tolls")
+
+    def create_vehicle(self, registration_number):
+        return Vehicle.objects.create(
+            owner=self.user, registration_number=registration_number, model="Clio", brand="Renault",
+            year=2020, color="Rouge", serial_number=f"SN-{registration_number}", toll_balance=Decimal("0"),
+        )
+
+    def test_lookup_normalizes_plates(self):
+        self.assertEqual(self.index.lookup("ab 123-cd"), self.vehicle.pk)
+
+    def test_unknown_plates_are_rejected_without_queries(self):
+        self.index.build()
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.index.lookup("XX-999-XX"))
+            self.assertEqual(self.index.lookup_many(["GB 12 ABC", "ab123cd"]), {"AB123CD": self.vehicle.pk})
+
+    def test_signals_keep_index_current(self):
+        self.index.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            other = self.create_vehicle("EF-456-GH")
+            self.vehicle.registration_number = "IJ-789-KL"
+            self.vehicle.save()
+        self.assertEqual(self.index.lookup("EF456GH"), other.pk)
+        self.assertEqual(self.index.lookup("IJ789KL"), self.vehicle.pk)
+        self.assertIsNone(self.index.lookup("AB123CD"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertIsNone(self.index.lookup("EF456GH"))
+
+    def test_other_workers_apply_changes_without_rebuilding(self):
+        self.index.build()
+        worker = PlateIndex("tolls", "users.Vehicle", "plate_key")  # Index d'un autre processus
+        worker.build()
+        with self.captureOnCommitCallbacks(execute=True):
+            other = self.create_vehicle("EF-456-GH")
+            self.vehicle.delete()
+        worker._checked_at = 0
+        with self.assertNumQueries(0):
+            self.assertEqual(worker.lookup("EF456GH"), other.pk)
+            self.assertIsNone(worker.lookup("AB123CD"))
+        self.assertEqual(worker.stats()["version"], self.index.stats()["version"])
+
+        # Modification manquante (évincée du cache) : reconstruction depuis la base
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vehicle = self.create_vehicle("IJ-789-KL")
+        cache.delete(worker._delta_key(worker.stats()["version"] + 1))
+        worker._checked_at = 0
+        with self.assertNumQueries(1):
+            self.assertEqual(worker.lookup("IJ789KL"), self.vehicle.pk)
+
+    def test_bloom_filter_is_recomputed_when_full(self):
+        self.index.build()
+        capacity = self.index._bloom.capacity
+        for pk in range(capacity):
+            self.index.update(pk + 1000000, f"ZZ{pk:07d}")
+            self.index.remove(pk + 1000000)
+        self.assertLessEqual(self.index.stats()["bloom_entries"], capacity)
+        self.assertIsNone(self.index.lookup("ZZ0000001"))
+        self.assertEqual(self.index.lookup("AB123CD"), self.vehicle.pk)
+
+
+class BenchmarkHelpersTests(TestCase):
+    def test_percentile_interpolates(self):
+        values = [10, 20, 30, 40]
+        self.assertEqual(percentile(values, 50), 25)
+        self.assertEqual(percentile(values, 100), 40)
+        self.assertIsNone(percentile([], 50))
+
+    def test_measure_counts_queries_and_errors(self):
+        results = iter([True, False, True])
+        result = measure(lambda: get_user_model().objects.exists() and next(results), 3)
+        self.assertEqual(result["iterations"], 3)
+        self.assertEqual(result["queries_mean"], 1)
+
+    def test_compare_flags_regressions(self):
+        previous = {"scenarios": {"vehicle_list": {"p50_ms": 10.0, "p95_ms": 20.0, "queries_mean": 2}}}
+        current = {"scenarios": {"vehicle_list": {"p50_ms": 15.0, "p95_ms": 20.0, "queries_mean": 2}}}
+        lines = compare_results(previous, current)
+        self.assertIn("REGRESSION", lines[0])
+
+
+class FleetGeneratorTests(TestCase):
+    def test_plates_and_vins_are_valid_and_unique(self):
+        self.assertEqual(vin_check_digit("1M8GDM9AXKP042788"), "X")
+        plates, vins = set(), set()
+        for number in range(2000):
+            value = plate_number(7, number)
+            plate, vin = make_plate(value), make_vin("VF1", value, 2020, "A")
+            self.assertRegex(plate, r"^[A-HJ-NP-TV-Z]{2}\d{3}[A-HJ-NP-TV-Z]{2}$")
+            self.assertRegex(vin, r"^[A-HJ-NPR-Z0-9]{17}$")
+            self.assertEqual(vin[8], vin_check_digit(vin))
+            plates.add(plate)
+            vins.add(vin)
+        self.assertEqual((len(plates), len(vins)), (2000, 2000))
+        # Plaques acceptées telles quelles par le formulaire de saisie
+        for plate in list(plates)[:20]:
+            form = VehicleForm(data={"license_plate": plate})
+            form.is_valid()
+            self.assertNotIn("license_plate", form.errors, plate)
+
+    def test_generate_fleet(self):
+        from users.models import TollMonthlyRollup, TollTransaction
+        from vehicles.models import Vehicle as FleetVehicle, VehicleCompliance
+
+        config = FleetConfig(seed=3, users=5, vehicles=30, stations=4, transactions=500, batch_size=64)
+        report = generate_fleet(config)
+
+        self.assertEqual(report.counts["transactions"], 500)
+        self.assertEqual(FleetVehicle.objects.count(), 30)
+        self.assertEqual(VehicleCompliance.objects.count(), 30)
+        self.assertEqual(Vehicle.objects.count(), 30)
+        self.assertEqual(TollTransaction.objects.count(), 500)
+        self.assertEqual(sum(TollMonthlyRollup.objects.values_list("transaction_count", flat=True)), 500)
+        # Chaque passage appartient au propriétaire du compte péage
+        self.assertFalse(TollTransaction.objects.exclude(user_id=F("vehicle__owner_id")).exists())
+        self.assertEqual(
+            list(FleetVehicle.objects.order_by("pk").values_list("license_plate", flat=True)[:3]),
+            [make_plate(plate_number(3, number)) for number in range(3)],
+        )
+
+
+class MetricsTests(TestCase):
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = Histogram("test_duration_seconds", "Durée.", (0.1, 1.0), ("view",))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(("home",), value)
+        lines = list(histogram.render())
+        self.assertIn('test_duration_seconds_bucket{view="home",le="0.1"} 1', lines)
+        self.assertIn('test_duration_seconds_bucket{view="home",le="1.0"} 2', lines)
+        self.assertIn('test_duration_seconds_bucket{view="home",le="+Inf"} 3', lines)
+        self.assertIn('test_duration_seconds_count{view="home"} 3', lines)
+
+    @override_settings(METRICS_TOKENS=["scrape-token"])
+    def test_middleware_records_requests_and_endpoint_requires_token(self):
+        before = REQUEST_DURATION.count(("home", "GET"))
+        self.client.get("/", secure=True)
+        self.assertEqual(REQUEST_DURATION.count(("home", "GET")), before + 1)
+        self.assertGreaterEqual(REQUEST_QUERIES.count(("home", "GET")), 1)
+
+        self.assertEqual(self.client.get("/metrics", secure=True).status_code, 403)
+        self.assertEqual(self.client.get("/metrics", secure=True, HTTP_AUTHORIZATION="Bearer jeton-é").status_code, 403)
+        response = self.client.get("/metrics", secure=True, HTTP_AUTHORIZATION="Bearer scrape-token")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn('gv_http_request_duration_seconds_count{view="home",method="GET"}', response.content.decode())
+
+
+class StructuredLoggingTests(TestCase):
+    def make_record(self, level=logging.INFO, message="Passage %s"):
+        record = logging.LogRecord("vehicles", level, __file__, 1, message, ("AB-123-CD",), None)
+        RequestIdFilter().filter(record)
+        return record
+
+    def test_json_records_carry_request_id_and_extra_fields(self):
+        request_id, token = bind_request_id("proxy-id-42")
+        try:
+            record = self.make_record()
+            record.station = 7
+            entry = json.loads(JsonFormatter().format(record))
+        finally:
+            unbind_request_id(token)
+        self.assertEqual(request_id, "proxy-id-42")
+        self.assertEqual(entry["request_id"], "proxy-id-42")
+        self.assertEqual(entry["message"], "Passage AB-123-CD")
+        self.assertEqual(entry["station"], 7)
+
+    def test_sampling_keeps_warnings_and_whole_requests(self):
+        sampling = SamplingFilter(rate=0.5)
+        self.assertTrue(sampling.filter(self.make_record(logging.WARNING)))
+        self.assertFalse(SamplingFilter(rate=0).filter(self.make_record()))
+        _, token = bind_request_id("request-1")
+        try:
+            decisions = {sampling.filter(self.make_record()) for _ in range(20)}
+        finally:
+            unbind_request_id(token)
+        self.assertEqual(len(decisions), 1)
+
+    def test_request_id_header(self):
+        response = self.client.get("/", secure=True, HTTP_X_REQUEST_ID="edge-123")
+        self.assertEqual(response["X-Request-ID"], "edge-123")
+        response = self.client.get("/", secure=True, HTTP_X_REQUEST_ID="not valid!")
+        self.assertRegex(response["X-Request-ID"], r"^[0-9a-f]{32}$")
+
+    async def test_middlewares_run_natively_under_asgi(self):
+        user = await get_user_model().objects.acreate(username="asgi", is_active=True, is_staff=True)
+        await self.async_client.aforce_login(user)
+        with mock.patch("core.middleware.observe_request") as observe:
+            response = await self.async_client.get("/metrics", secure=True, headers={"X-Request-ID": "edge-456"})
+        self.assertEqual(response["X-Request-ID"], "edge-456")
+        view, method, status, metrics = observe.call_args.args[:4]
+        self.assertEqual((view, method, status), ("metrics", "GET", 200))
+        # Requêtes SQL exécutées dans les threads de sync_to_async : comptées quand même
+        self.assertGreaterEqual(metrics.queries, 1)
+
+
+class BlobStorageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, filename, content=b"%PDF-1.4 attestation"):
+        document = Document(document_type="insurance")
+        document.file.save(filename, ContentFile(content))
+        return document
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.upload("assurance_v1.pdf")
+        second = self.upload("assurance_v2.PDF")
+        other = self.upload("carte_grise.pdf", b"%PDF-1.4 autre")
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertTrue(first.file.name.startswith("blobs/"))
+        self.assertNotEqual(first.file.name, other.file.name)
+        self.assertEqual(Blob.objects.get(name=first.file.name).ref_count, 2)
+
+        second.delete()
+        self.assertEqual(Blob.objects.get(name=first.file.name).ref_count, 1)
+
+    def test_unreferenced_blobs_are_collected_after_grace(self):
+        kept = self.upload("garde.pdf", b"garde")
+        dropped = self.upload("jete.pdf", b"jete")
+        name = dropped.file.name
+        dropped.delete()
+        self.assertEqual(collect_unreferenced_blobs(), (0, 0))  # Encore dans le délai de grâce
+
+        Blob.objects.update(referenced_at=F("referenced_at") - datetime.timedelta(days=2))
+        self.assertEqual(collect_unreferenced_blobs(), (1, len(b"jete")))
+        self.assertFalse(blob_storage.exists(name))
+        self.assertFalse(Blob.objects.filter(name=name).exists())
+        self.assertTrue(blob_storage.exists(kept.file.name))
+
+    def test_thumbnails_of_legacy_files_keep_their_derived_name(self):
+        name = "documents/ancien_scan.pdf.small.webp"
+        self.assertEqual(blob_storage.save_derived(name, ContentFile(b"vignette")), name)
+        self.assertTrue(blob_storage.exists(name))
+        self.assertFalse(Blob.objects.exists())
+
+    def test_uploads_named_like_thumbnails_are_content_addressed(self):
+        first = self.upload("carte.small.jpeg", b"premiere")
+        second = self.upload("carte.small.jpeg", b"seconde")
+        self.assertTrue(first.file.name.startswith("blobs/"))
+        self.assertNotEqual(first.file.name, second.file.name)
+        with first.file.open("rb") as f:
+            self.assertEqual(f.read(), b"premiere")
+        self.assertEqual(Blob.objects.count(), 2)
 
-# Create your tests here.
@@ -0,0 +1,173 @@
+import hashlib
+import io
+import logging
+import os
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.db.models.fields.files import FieldFile
+
+logger = logging.getLogger(__name__)
+
+# Côté le plus long des vignettes, en pixels
+THUMBNAIL_SIZES = {"small": 128, "medium": 480}
+# Format -> (format Pillow, type MIME) ; WebP servi aux navigateurs qui l'acceptent, JPEG sinon
+THUMBNAIL_FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+THUMBNAIL_QUALITY = 80
+# Le nom d'une vignette dérive de celui de l'original (qui change à chaque envoi) et
+# l'URL porte une version : la réponse peut être gardée un an par le navigateur
+THUMBNAIL_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".tif", ".tiff"}
+PDF_EXTENSIONS = {".pdf"}
+
+# Fichiers qui ont des vignettes : source -> (modèle, champs)
+THUMBNAIL_SOURCES = {
+    "avatar": ("users.CustomUser", ("avatar",)),
+    "vehicle": ("vehicles.Vehicle", ("purchase_document", "vignette_document", "registration_document")),
+    "document": ("vehicles.Document", ("file",)),
+}
+
+
+class ThumbnailError(Exception):
+    """Fichier sans aperçu possible (format non géré, fichier illisible ou absent)."""
+
+
+def thumbnail_name(name, size, fmt):
+    """Vignette stockée à côté de l'original : documents/scan.pdf -> documents/scan.pdf.small.webp"""
+    return f"{name}.{size}.{fmt}"
+
+
+def thumbnail_version(name):
+    return hashlib.sha1(name.encode()).hexdigest()[:10]
+
+
+def has_preview(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS | PDF_EXTENSIONS
+
+
+def source_for(field_file):
+    """Source (clé de THUMBNAIL_SOURCES) d'un fichier de modèle, ou None."""
+    label = field_file.instance._meta.label
+    for source, (model_label, fields) in THUMBNAIL_SOURCES.items():
+        if model_label == label and field_file.field.name in fields:
+            return source
+    return None
+
+
+def _open_image(field_file):
+    from PIL import Image
+
+    extension = os.path.splitext(field_file.name)[1].lower()
+    if extension in PDF_EXTENSIONS:
+        try:
+            from pdf2image import convert_from_bytes
+            from pdf2image.exceptions import PDFInfoNotInstalledError, PDFPageCountError, PDFSyntaxError
+        except ImportError:
+            raise ThumbnailError("Les aperçus de PDF nécessitent pdf2image.")
+        field_file.open("rb")
+        try:
+            # Première page seulement, rastérisée directement à la taille de la plus grande vignette
+            pages = convert_from_bytes(
+                field_file.read(), first_page=1, last_page=1, size=max(THUMBNAIL_SIZES.values()),
+            )
+        except PDFInfoNotInstalledError as e:
+            raise ThumbnailError("Les aperçus de PDF nécessitent poppler.") from e
+        except (PDFPageCountError, PDFSyntaxError) as e:
+            raise ThumbnailError(f"PDF illisible : {e}") from e
+        finally:
+            field_file.close()
+        if not pages:
+            raise ThumbnailError("Le PDF ne contient aucune page.")
+        return pages[0]
+    if extension not in IMAGE_EXTENSIONS:
+        raise ThumbnailError(f"Pas d'aperçu pour les fichiers {extension or 'sans extension'}.")
+    field_file.open("rb")
+    try:
+        image = Image.open(field_file)
+        # Réduction au décodage (JPEG) : l'image pleine taille n'est jamais décodée
+        image.draft("RGB", (max(THUMBNAIL_SIZES.values()),) * 2)
+        image.load()
+    finally:
+        field_file.close()
+    return image
+
+
+def generate_thumbnails(field_file):
+    """
+    Génère toutes les vignettes (tailles x formats) d'un fichier stocké, à
+    partir d'un seul décodage de l'original. Renvoie les noms écrits ; lève
+    ThumbnailError si le fichier n'a pas d'aperçu possible.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    if not field_file or not field_file.name:
+        raise ThumbnailError("Aucun fichier.")
+    try:
+        image = ImageOps.exif_transpose(_open_image(field_file))
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise ThumbnailError(f"Fichier illisible : {e}") from e
+
+    storage = field_file.storage
+    # Stockage par empreinte : la vignette garde le nom dérivé de l'original
+    save = getattr(storage, "save_derived", storage.save)
+    names = []
+    # Des plus grandes aux plus petites : chaque réduction part de la précédente
+    for size, pixels in sorted(THUMBNAIL_SIZES.items(), key=lambda item: -item[1]):
+        image.thumbnail((pixels, pixels), Image.LANCZOS)
+        for fmt, (pillow_format, _) in THUMBNAIL_FORMATS.items():
+            converted = image
+            if pillow_format == "JPEG" and image.mode not in ("RGB", "L"):
+                converted = image.convert("RGB")
+            buffer = io.BytesIO()
+            converted.save(buffer, pillow_format, quality=THUMBNAIL_QUALITY, optimize=True)
+            name = thumbnail_name(field_file.name, size, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            names.append(save(name, ContentFile(buffer.getvalue())))
+    return names
+
+
+def thumbnails_exist(field_file):
+    storage = field_file.storage
+    return all(
+        storage.exists(thumbnail_name(field_file.name, size, fmt))
+        for size in THUMBNAIL_SIZES for fmt in THUMBNAIL_FORMATS
+    )
+
+
+def thumbnail_file(field_file, size, fmt):
+    """FieldFile de la vignette, générée à la demande si elle manque (ThumbnailError sinon)."""
+    name = thumbnail_name(field_file.name, size, fmt)
+    if not field_file.storage.exists(name):
+        logger.info("Vignettes manquantes pour %s : génération à la demande", field_file.name)
+        generate_thumbnails(field_file)
+    return FieldFile(field_file.instance, field_file.field, name)
+
+
+def schedule_thumbnails(instance, update_fields=None):
+    """Planifie (après validation de la transaction) la génération des vignettes manquantes."""
+    from django.db import transaction
+    from .tasks import generate_thumbnails_task
+
+    for source, (model_label, fields) in THUMBNAIL_SOURCES.items():
+        if instance._meta.label != model_label:
+            continue
+        for field in fields:
+            if update_fields is not None and field not in update_fields:
+                continue
+            field_file = getattr(instance, field)
+            if not field_file or not has_preview(field_file.name) or thumbnails_exist(field_file):
+                continue
+            args = (source, str(instance.pk), field)
+            transaction.on_commit(lambda args=args: generate_thumbnails_task.delay(*args))
+
+
+def accessible_objects(source, user):
+    """Objets dont l'utilisateur peut voir les vignettes."""
+    model_label, _ = THUMBNAIL_SOURCES[source]
+    model = apps.get_model(model_label)
+    if source == "avatar":
+        return model.objects.filter(is_active=True)
+    if source == "vehicle":
+        return model.objects.filter(user=user)
+    return model.objects.filter(vehicles__user=user).distinct()
@@ -0,0 +1,264 @@
+import logging
+import os
+import tempfile
+from pathlib import Path
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+logger = logging.getLogger(__name__)
+
+# Octets lus au début d'un fichier pour reconnaître son format
+SNIFF_LENGTH = 16
+STREAM_CHUNK_SIZE = 64 * 1024
+# Signatures ("magic bytes") des formats acceptés
+FILE_SIGNATURES = (
+    (b"%PDF-", "pdf"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+EXTENSION_KINDS = {"pdf": "pdf", "jpg": "jpeg", "jpeg": "jpeg", "png": "png", "gif": "gif", "webp": "webp"}
+DOCUMENT_KINDS = ("pdf", "jpeg", "png")
+IMAGE_KINDS = ("jpeg", "png", "gif", "webp")
+KIND_LABELS = {"pdf": "PDF", "jpeg": "JPG/JPEG", "png": "PNG", "gif": "GIF", "webp": "WebP"}
+
+VEHICLE_DOCUMENT_RULES = {
+    "purchase_document": DOCUMENT_KINDS,
+    "vignette_document": DOCUMENT_KINDS,
+    "registration_document": DOCUMENT_KINDS,
+}
+ACCOUNT_RULES = {"avatar": IMAGE_KINDS, "identity_document": DOCUMENT_KINDS}
+# Formats acceptés par nom de vue puis par champ, contrôlés pendant la réception
+UPLOAD_RULES = {
+    "add_document_to_vehicle": {"file": DOCUMENT_KINDS},
+    "vehicle_create": VEHICLE_DOCUMENT_RULES,
+    "vehicle_update": VEHICLE_DOCUMENT_RULES,
+    "signup": ACCOUNT_RULES,
+    "profile_update": ACCOUNT_RULES,
+}
+
+
+def upload_max_size():
+    return getattr(settings, "UPLOAD_MAX_SIZE", 5 * 1024 * 1024)
+
+
+def sniff_kind(head):
+    """Format reconnu d'après les premiers octets d'un fichier, ou None."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for signature, kind in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    return None
+
+
+def extension_kind(filename):
+    return EXTENSION_KINDS.get(os.path.splitext(filename or "")[1].lstrip(".").lower())
+
+
+def formats_label(kinds):
+    return ", ".join(KIND_LABELS[kind] for kind in kinds)
+
+
+def check_extension(filename, kinds):
+    """Message d'erreur si l'extension ne correspond à aucun format accepté, sinon None."""
+    if extension_kind(filename) not in kinds:
+        return f"Les formats autorisés sont {formats_label(kinds)}."
+    return None
+
+
+def check_content(filename, head, kinds):
+    """Message d'erreur si le contenu ne correspond pas à l'extension annoncée, sinon None."""
+    kind = sniff_kind(head)
+    if kind is None or kind not in kinds or kind != extension_kind(filename):
+        return "Le contenu du fichier ne correspond pas à son format."
+    return None
+
+
+def check_size(size, max_size=None):
+    max_size = max_size or upload_max_size()
+    if size > max_size:
+        return f"Le fichier ne doit pas dépasser {max_size // (1024 * 1024)} Mo."
+    return None
+
+
+def validate_upload(file, kinds=DOCUMENT_KINDS, max_size=None):
+    """
+    Contrôle d'un fichier déjà reçu (extension, taille, signature) : filet de
+    sécurité des formulaires, ValidatingUploadHandler ayant normalement écarté
+    les fichiers invalides pendant la réception.
+    """
+    error = check_extension(file.name, kinds) or check_size(file.size, max_size)
+    # Fichier déjà enregistré (validation du modèle) : contenu contrôlé à son envoi
+    if error is None and not getattr(file, "_committed", False):
+        file.seek(0)
+        head = file.read(SNIFF_LENGTH)
+        file.seek(0)
+        error = check_content(file.name, head, kinds)
+    if error:
+        raise ValidationError(error)
+
+
+class ValidatingUploadHandler(FileUploadHandler):
+    """
+    Premier gestionnaire de FILE_UPLOAD_HANDLERS : pour les champs de
+    UPLOAD_RULES, vérifie l'extension à l'annonce du fichier, la signature
+    sur le premier morceau reçu et la taille au fil de la réception. Un
+    fichier invalide est abandonné dès la faute constatée (SkipFile : ni
+    mémoire ni fichier temporaire pour le reste) et l'erreur est conservée
+    dans request.upload_errors pour le formulaire (apply_upload_errors).
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        match = getattr(request, "resolver_match", None)
+        self.rules = UPLOAD_RULES.get(match.url_name, {}) if match else {}
+        self.kinds = None
+        self.received = 0
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.kinds = self.rules.get(field_name)
+        self.received = 0
+        if self.kinds:
+            self._check(check_extension(file_name, self.kinds))
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.kinds:
+            if start == 0:
+                self._check(check_content(self.file_name, raw_data[:SNIFF_LENGTH], self.kinds))
+            self.received += len(raw_data)
+            self._check(check_size(self.received))
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def _check(self, error):
+        if error is None:
+            return
+        errors = self.request.__dict__.setdefault("upload_errors", {})
+        errors[self.field_name] = error
+        logger.info("Envoi refusé (%s, %s) : %s", self.field_name, self.file_name, error)
+        raise SkipFile(error)
+
+
+def apply_upload_errors(form, request):
+    """
+    Reporte sur le formulaire les fichiers refusés pendant la réception, à la
+    place de l'erreur « obligatoire » levée par le champ resté vide.
+    """
+    for field, error in getattr(request, "upload_errors", {}).items():
+        if field in form.fields:
+            form.errors.pop(field, None)
+            form.add_error(field, error)
+    return form
+
+
+class UploadErrorsMixin:
+    """Vues génériques à formulaire : affiche les fichiers refusés pendant la réception."""
+
+    def get_form(self, form_class=None):
+        return apply_upload_errors(super().get_form(form_class), self.request)
+
+
+# Envois fractionnés et reprenables : chaque morceau est une requête courte,
+# ajoutée à un fichier partiel jusqu'à ce que la taille annoncée soit atteinte
+
+class ChunkError(Exception):
+    """Morceau refusé ; status est le code HTTP à renvoyer."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def chunk_size_limit():
+    return getattr(settings, "CHUNKED_UPLOAD_CHUNK_SIZE", 1024 * 1024)
+
+
+def chunked_upload_max_size():
+    return getattr(settings, "CHUNKED_UPLOAD_MAX_SIZE", 50 * 1024 * 1024)
+
+
+def part_path(upload_id):
+    """Fichier partiel d'un envoi (répertoire partagé par tous les processus web)."""
+    directory = Path(getattr(settings, "CHUNKED_UPLOAD_DIR", Path(settings.MEDIA_ROOT) / "uploads"))
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / f"{upload_id}.part"
+
+
+def check_chunk(offset, length, size):
+    if length > chunk_size_limit():
+        raise ChunkError(f"Un morceau ne doit pas dépasser {chunk_size_limit()} octets.", status=413)
+    if offset + length > size:
+        raise ChunkError("Le morceau dépasse la taille annoncée du fichier.", status=413)
+
+
+def receive_chunk(stream, offset, length, filename, kinds, size):
+    """
+    Lit le morceau (length octets) dans un fichier temporaire, rembobiné,
+    avant toute transaction : un client lent ne garde aucun verrou pendant
+    l'envoi. Le premier morceau doit porter la signature du format annoncé.
+    Lève ChunkError.
+    """
+    check_chunk(offset, length, size)
+    chunk = tempfile.SpooledTemporaryFile(max_size=STREAM_CHUNK_SIZE)
+    try:
+        received = 0
+        while received < length:
+            data = stream.read(min(STREAM_CHUNK_SIZE, length - received))
+            if not data:
+                raise ChunkError("Morceau incomplet.")
+            if offset == 0 and received == 0:
+                error = check_content(filename, data[:SNIFF_LENGTH], kinds)
+                if error:
+                    raise ChunkError(error, status=415)
+            chunk.write(data)
+            received += len(data)
+    except BaseException:
+        chunk.close()
+        raise
+    chunk.seek(0)
+    return chunk
+
+
+def append_chunk(path, offset, stream, length, filename, kinds, size):
+    """
+    Écrit length octets lus dans stream à la position offset du fichier
+    partiel (ce qui dépasserait d'un morceau interrompu est écrasé) et
+    renvoie la nouvelle position. Le premier morceau doit porter la
+    signature du format annoncé. Lève ChunkError.
+    """
+    check_chunk(offset, length, size)
+
+    if offset and not os.path.exists(path):
+        raise ChunkError("Fichier partiel introuvable : reprendre l'envoi depuis le début.", status=409)
+    with open(path, "r+b" if offset else "wb") as part:
+        part.seek(offset)
+        part.truncate()
+        written = 0
+        while written < length:
+            data = stream.read(min(STREAM_CHUNK_SIZE, length - written))
+            if not data:
+                break
+            if offset == 0 and written == 0:
+                error = check_content(filename, data[:SNIFF_LENGTH], kinds)
+                if error:
+                    raise ChunkError(error, status=415)
+            part.write(data)
+            written += len(data)
+        if written != length:
+            # Connexion interrompue : le client reprendra à la dernière position confirmée
+            part.truncate(offset)
+            raise ChunkError("Morceau incomplet.")
+    return offset + written
+
+
+def discard_part(upload_id):
+    try:
+        part_path(upload_id).unlink()
+    except FileNotFoundError:
+        pass
@@ -1,6 +1,10 @@
 from django.urls import path
-from .views import home
+from .views import cache_stats, export_data, home, metrics, thumbnail
 
 urlpatterns = [
     path("", home, name="home"),
+    path("exports/<str:dataset>/", export_data, name="export_data"),
+    path("cache-stats/", cache_stats, name="cache_stats"),
+    path("metrics", metrics, name="metrics"),
+    path("thumbnails/<str:source>/<str:pk>/<str:field>/<str:size>/", thumbnail, name="thumbnail"),
 ]
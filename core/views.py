@@ -1,5 +1,96 @@
+import hmac
+from django.conf import settings
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.utils.cache import patch_vary_headers
+from django.utils.http import content_disposition_header
+from .cache import cache_stats as get_cache_stats
+from .exports import DATASETS, FORMATS, export_content_type, export_filename, iter_export
+from .files import serve_file
+from .metrics import render_metrics
+from .thumbnails import (
+    THUMBNAIL_CACHE_CONTROL, THUMBNAIL_FORMATS, THUMBNAIL_SIZES, THUMBNAIL_SOURCES, ThumbnailError,
+    accessible_objects, thumbnail_file,
+)
 
 def home(request):
     return render(request, "core/home.html")
 
+
+@user_passes_test(lambda user: user.is_staff)
+def export_data(request, dataset):
+    """Export comptable en flux (CSV ou JSON Lines, gzip optionnel), mémoire constante."""
+    fmt = request.GET.get("format", "csv")
+    compress = request.GET.get("gzip") == "1"
+    if dataset not in DATASETS or fmt not in FORMATS:
+        raise Http404("Export inconnu.")
+
+    response = StreamingHttpResponse(
+        iter_export(dataset, fmt, compress),
+        content_type=export_content_type(fmt, compress),
+    )
+    response["Content-Disposition"] = content_disposition_header(True, export_filename(dataset, fmt, compress))
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+@user_passes_test(lambda user: user.is_staff)
+def cache_stats(request):
+    """Taux de succès du cache par espace de noms (processus courant)."""
+    stats = get_cache_stats()
+    for counters in stats.values():
+        total = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / total, 3) if total else None
+    return JsonResponse(stats)
+
+
+def _metrics_authorized(request):
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme != "Bearer" or not token:
+        return False
+    # Comparaison d'octets : compare_digest refuse les chaînes non ASCII
+    token = token.encode()
+    return any(hmac.compare_digest(token, expected.encode()) for expected in settings.METRICS_TOKENS)
+
+
+def metrics(request):
+    """
+    Métriques du processus courant au format texte Prometheus
+    (jeton "Authorization: Bearer <jeton>" ou compte staff).
+    """
+    if not _metrics_authorized(request):
+        return HttpResponse("Accès refusé.\n", status=403, content_type="text/plain; charset=utf-8")
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@login_required
+def thumbnail(request, source, pk, field, size):
+    """
+    Vignette d'un fichier envoyé (WebP si le navigateur l'accepte, JPEG sinon),
+    régénérée à la demande si elle manque. L'URL est versionnée
+    (filtre thumbnail_url) : la réponse est mise en cache un an.
+    """
+    if source not in THUMBNAIL_SOURCES or field not in THUMBNAIL_SOURCES[source][1] or size not in THUMBNAIL_SIZES:
+        raise Http404("Vignette inconnue.")
+    try:
+        instance = accessible_objects(source, request.user).filter(pk=pk).first()
+    except (ValueError, ValidationError):
+        instance = None
+    field_file = getattr(instance, field, None)
+    if not field_file:
+        raise Http404("Fichier introuvable.")
+
+    fmt = "webp" if "image/webp" in request.headers.get("Accept", "") else "jpeg"
+    try:
+        thumb = thumbnail_file(field_file, size, fmt)
+    except ThumbnailError:
+        raise Http404("Aucun aperçu pour ce fichier.")
+    response = serve_file(request, thumb, as_attachment=False, cache_control=THUMBNAIL_CACHE_CONTROL)
+    if not settings.PROTECTED_MEDIA_SERVER and response.status_code == 200:
+        response["Content-Type"] = THUMBNAIL_FORMATS[fmt][1]
+    patch_vary_headers(response, ["Accept"])
+    return response
@@ -1,6 +1,8 @@
 import os
 from datetime import timedelta
 from celery import Celery
+from celery.schedules import crontab
+from celery.signals import task_postrun, task_prerun
 
 # Définir le module de configuration par défaut pour Celery
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "gestion_vehicules.settings")
@@ -12,6 +14,27 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 
 # Auto-discovery des tâches Celery dans les applications Django
 app.autodiscover_tasks()
+app.autodiscover_tasks(related_name="task")  # vehicles/task.py
+
+# Identifiant de journalisation des tâches : l'id de la tâche (voir core/logs.py)
+_task_log_tokens = {}
+
+
+@task_prerun.connect
+def bind_task_request_id(task_id=None, **kwargs):
+    from core.logs import bind_request_id
+
+    _task_log_tokens[task_id] = bind_request_id(task_id)[1]
+
+
+@task_postrun.connect
+def unbind_task_request_id(task_id=None, **kwargs):
+    from core.logs import unbind_request_id
+
+    token = _task_log_tokens.pop(task_id, None)
+    if token is not None:
+        unbind_request_id(token)
+
 
 # Configuration du fuseau horaire de Celery (important pour la planification des tâches)
 app.conf.timezone = 'UTC'  # Ou 'Europe/Paris' si tu veux utiliser l'heure locale
@@ -19,7 +42,27 @@ app.conf.timezone = 'UTC'  # Ou 'Europe/Paris' si tu veux utiliser l'heure local
 # Planification des tâches périodiques avec Celery Beat
 app.conf.beat_schedule = {
     "send-vehicle-reminders-every-day": {
-        "task": "vehicles.tasks.send_vehicle_reminders",  # Assurez-vous que cette tâche existe
+        "task": "vehicles.task.send_vehicle_reminders",
         "schedule": timedelta(days=1),  # Exécuter tous les jours
     },
+    "refresh-vehicle-compliance-every-night": {
+        "task": "vehicles.task.refresh_vehicle_compliance",
+        "schedule": crontab(hour=0, minute=5),  # Juste après minuit (UTC)
+    },
+    "ensure-toll-partitions-every-day": {
+        "task": "users.tasks.ensure_toll_partitions",
+        "schedule": crontab(hour=1, minute=0),
+    },
+    "collect-unreferenced-blobs-every-night": {
+        "task": "core.tasks.collect_blobs",
+        "schedule": crontab(hour=2, minute=0),
+    },
+    "purge-stale-document-uploads-every-hour": {
+        "task": "vehicles.task.purge_stale_document_uploads",
+        "schedule": timedelta(hours=1),
+    },
+    "process-ipn-notifications": {
+        "task": "payments.tasks.process_ipn_notifications",
+        "schedule": timedelta(seconds=10),  # Filet de sécurité si un déclenchement est perdu
+    },
 }
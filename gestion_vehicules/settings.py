@@ -33,26 +33,93 @@ ALLOWED_HOSTS = env.list('DJANGO_ALLOWED_HOSTS', default=['*'])
 AUTH_USER_MODEL = "users.CustomUser"
 
 # Caching configuration
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+# Cache partagé (Redis) entre tous les workers dès que REDIS_CACHE_URL est défini ;
+# LocMemCache (propre à chaque processus) ne sert qu'en développement.
+REDIS_CACHE_URL = env('REDIS_CACHE_URL', default='')
+if REDIS_CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'KEY_PREFIX': 'gv',
+            'TIMEOUT': 300,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+        }
     }
-}
 
-# Session engine
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Session engine : lecture dans le cache, écriture en base
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
 
 # Celery configuration
 CELERY_BROKER_URL = env('CELERY_BROKER_URL', default="redis://localhost:6379/0")
 CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
+CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND', default="redis://localhost:6379/1")  # Requis par les chords
+
+# Rappels véhicules (taille des lots traités en parallèle)
+VEHICLE_REMINDER_CHUNK_SIZE = env.int('VEHICLE_REMINDER_CHUNK_SIZE', default=1000)
+
+# Vérification KYC (OCR des documents d'identité en tâche de fond)
+KYC_OCR_WORKERS = env.int('KYC_OCR_WORKERS', default=2)
+KYC_OCR_TIMEOUT = env.int('KYC_OCR_TIMEOUT', default=60)  # secondes
+KYC_OCR_MAX_RETRIES = env.int('KYC_OCR_MAX_RETRIES', default=5)  # erreurs passagères : nouvel essai, délai croissant
 
 # Media files configuration
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Envoi des documents protégés : '' (Django, Range + sendfile), 'nginx' (X-Accel-Redirect)
+# ou 'sendfile' (X-Sendfile, Apache/lighttpd). Pour nginx, PROTECTED_MEDIA_PREFIX doit
+# correspondre à une location "internal" pointant sur MEDIA_ROOT.
+PROTECTED_MEDIA_SERVER = env('PROTECTED_MEDIA_SERVER', default='')
+PROTECTED_MEDIA_PREFIX = env('PROTECTED_MEDIA_PREFIX', default='/protected-media/')
+
+# Documents de véhicules stockés par empreinte SHA-256 (core/storage.py) : délai (heures) avant
+# suppression d'un blob sans référence, le temps que le formulaire qui l'a envoyé soit enregistré
+BLOB_GC_GRACE_HOURS = env.int('BLOB_GC_GRACE_HOURS', default=24)
+
+# Fichiers envoyés : extension, signature et taille contrôlées pendant la réception (core/uploads.py)
+FILE_UPLOAD_HANDLERS = [
+    'core.uploads.ValidatingUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+UPLOAD_MAX_SIZE = env.int('UPLOAD_MAX_SIZE', default=5 * 1024 * 1024)
+# Envois fractionnés et reprenables : taille maximale d'un morceau et du fichier, fichiers
+# partiels (répertoire partagé entre les processus web), abandon après CHUNKED_UPLOAD_EXPIRY_HOURS
+CHUNKED_UPLOAD_CHUNK_SIZE = env.int('CHUNKED_UPLOAD_CHUNK_SIZE', default=1024 * 1024)
+CHUNKED_UPLOAD_MAX_SIZE = env.int('CHUNKED_UPLOAD_MAX_SIZE', default=50 * 1024 * 1024)
+CHUNKED_UPLOAD_DIR = env('CHUNKED_UPLOAD_DIR', default=str(BASE_DIR / 'var' / 'uploads'))
+CHUNKED_UPLOAD_EXPIRY_HOURS = env.int('CHUNKED_UPLOAD_EXPIRY_HOURS', default=24)
+
+# Client CoinPayments (payments/gateway.py) : délais (secondes), nouvelles tentatives, disjoncteur
+COINPAYMENTS_CONNECT_TIMEOUT = env.float('COINPAYMENTS_CONNECT_TIMEOUT', default=3.05)
+COINPAYMENTS_READ_TIMEOUT = env.float('COINPAYMENTS_READ_TIMEOUT', default=10)
+COINPAYMENTS_RETRIES = env.int('COINPAYMENTS_RETRIES', default=2)
+COINPAYMENTS_BACKOFF = env.float('COINPAYMENTS_BACKOFF', default=0.3)
+COINPAYMENTS_POOL_SIZE = env.int('COINPAYMENTS_POOL_SIZE', default=10)
+COINPAYMENTS_BREAKER_FAILURES = env.int('COINPAYMENTS_BREAKER_FAILURES', default=5)
+COINPAYMENTS_BREAKER_SLOW_CALL = env.float('COINPAYMENTS_BREAKER_SLOW_CALL', default=5.0)
+COINPAYMENTS_BREAKER_RESET = env.float('COINPAYMENTS_BREAKER_RESET', default=30.0)
+
+# Jetons d'API des portiques de péage (en-tête "Authorization: Token <jeton>")
+GANTRY_API_TOKENS = env.list('GANTRY_API_TOKENS', default=[])
+
+# Jetons du collecteur Prometheus pour /metrics (en-tête "Authorization: Bearer <jeton>")
+METRICS_TOKENS = env.list('METRICS_TOKENS', default=[])
+# Durée (secondes) au-delà de laquelle une requête est journalisée avec ses requêtes SQL les plus lentes (0 : jamais)
+SLOW_REQUEST_THRESHOLD = env.float('SLOW_REQUEST_THRESHOLD', default=1.0)
+
+# Construction des index de plaques en mémoire (core/plate_index.py) au démarrage des workers
+PLATE_INDEX_WARMUP = env.bool('PLATE_INDEX_WARMUP', default=True)
+
 # Authentication backends
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',  # Default backend
@@ -85,6 +152,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Recherche trigramme (pg_trgm)
     "django_celery_beat",
     'sslserver',
     'crispy_forms',
@@ -100,6 +168,8 @@ INSTALLED_APPS = [
 
 # Middleware settings
 MIDDLEWARE = [
+    'core.middleware.RequestIdMiddleware',  # Identifiant de requête des journaux (X-Request-ID)
+    'core.middleware.RequestMetricsMiddleware',  # En tête : mesure aussi les autres middlewares
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -183,28 +253,64 @@ STATICFILES_DIRS = [
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Logging configuration
+# Les loggers n'écrivent que dans une file (core.logs.QueuedHandler) ; un thread
+# d'écriture formate en JSON et écrit fichier (rotation par taille) et console,
+# hors du temps de réponse. Niveaux et échantillonnage réglables par logger :
+#   LOG_LEVELS=vehicles=DEBUG,django.db.backends=DEBUG
+#   LOG_SAMPLE_RATES=django.db.backends=0.01  (part des lignes <= INFO conservées, par requête)
+LOG_LEVEL = env('LOG_LEVEL', default='INFO')
+LOG_FILE = env('LOG_FILE', default=os.path.join(BASE_DIR, 'django.log'))
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'core.logs.RequestIdFilter'},
+    },
+    'formatters': {
+        'json': {'()': 'core.logs.JsonFormatter'},
+        'console': {'format': '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'},
+    },
     'handlers': {
         'console': {
-            'level': 'DEBUG',
             'class': 'logging.StreamHandler',
+            'formatter': 'console',
         },
         'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'django.log'),  # Make sure the log file directory exists
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': LOG_FILE,
+            'maxBytes': env.int('LOG_MAX_BYTES', default=50 * 1024 * 1024),
+            'backupCount': env.int('LOG_BACKUP_COUNT', default=5),
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'json',
         },
+        'queue': {
+            # Fabrique '()' plutôt que 'class' : pas de traitement spécial des QueueHandler (Python 3.12+)
+            '()': 'core.logs.QueuedHandler',
+            'targets': ['console', 'file'],
+            'queue_size': env.int('LOG_QUEUE_SIZE', default=10000),
+            'filters': ['request_id'],
+        },
+    },
+    'root': {
+        'handlers': ['queue'],
+        'level': 'WARNING',
     },
     'loggers': {
-        'django': {
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
-            'propagate': True,
-        },
+        'django': {'level': LOG_LEVEL},
+        # Requêtes SQL (DEBUG, uniquement si DEBUG=True) : désactivées sauf demande explicite
+        'django.db.backends': {'level': env('LOG_SQL_LEVEL', default='INFO')},
+        'core': {'level': LOG_LEVEL},
+        'users': {'level': LOG_LEVEL},
+        'vehicles': {'level': LOG_LEVEL},
+        'payments': {'level': LOG_LEVEL},
     },
 }
+for _name, _level in env.dict('LOG_LEVELS', default={}).items():
+    LOGGING['loggers'].setdefault(_name, {})['level'] = _level.upper()
+for _name, _rate in env.dict('LOG_SAMPLE_RATES', default={}).items():
+    LOGGING['filters'][f'sample:{_name}'] = {'()': 'core.logs.SamplingFilter', 'rate': float(_rate)}
+    LOGGING['loggers'].setdefault(_name, {}).setdefault('filters', []).append(f'sample:{_name}')
 
 # Axes settings (for brute force protection)
 AXES_FAILURE_LIMIT = 5
@@ -17,7 +17,7 @@ urlpatterns = [
     path('vehicles/', include('vehicles.urls')),
     path('accounts/', include('allauth.urls')),  # Ajout de Allauth
     path('payments/', include("payments.urls")),
-    path('', views.index, name='index'),  # Index personnalisé
+    path('search/', views.search_vehicles, name='search'),
     path('test/', test_view),  # Test view
 ]
 
@@ -1,4 +1,21 @@
+from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
+from vehicles.forms import VehicleSearchForm
+from vehicles.models import Vehicle
+from vehicles.search import search_vehicles as run_search
 
+
+@login_required
 def search_vehicles(request):
-    return render(request, 'search.html')
+    """Recherche de véhicules (plaque, VIN, marque, modèle, couleur) paginée par curseur."""
+    form = VehicleSearchForm(request.GET or None)
+    results, next_cursor = [], None
+    if form.is_valid() and form.cleaned_data['q']:
+        # Les administrateurs cherchent dans toute la flotte, les autres dans leurs véhicules
+        vehicles = Vehicle.objects.all() if request.user.is_staff else Vehicle.objects.filter(user=request.user)
+        results, next_cursor = run_search(vehicles, form.cleaned_data['q'], cursor=request.GET.get('cursor'))
+    return render(request, 'search.html', {
+        'form': form,
+        'results': results,
+        'next_cursor': next_cursor,
+    })
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestion_vehicules.settings')
 
 application = get_wsgi_application()
+
+# Index des plaques construits au démarrage du worker plutôt qu'à la première requête
+from django.conf import settings  # noqa: E402
+from core.plate_index import warm_plate_indexes  # noqa: E402
+
+if settings.PLATE_INDEX_WARMUP:
+    warm_plate_indexes()
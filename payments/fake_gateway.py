@@ -0,0 +1,89 @@
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeCoinPaymentsHandler(BaseHTTPRequestHandler):
+    """
+    Imitation locale de l'API CoinPayments (api.php) pour les tests de charge
+    hors ligne : vérifie la signature HMAC, simule une latence et un taux
+    d'erreurs configurables, et répond comme l'API réelle.
+    """
+
+    protocol_version = "HTTP/1.1"  # Connexions persistantes (keep-alive)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        server = self.server
+        with server.lock:
+            server.requests += 1
+
+        if server.latency:
+            time.sleep(random.uniform(server.latency * 0.5, server.latency * 1.5))
+        if server.error_rate and random.random() < server.error_rate:
+            self._send(503, {"error": "Service temporarily unavailable"})
+            return
+
+        expected = hmac.new(server.api_secret.encode(), body, hashlib.sha512).hexdigest()
+        if not hmac.compare_digest(expected, self.headers.get("HMAC", "")):
+            self._send(200, {"error": "HMAC signature does not match"})
+            return
+
+        params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        if params.get("cmd") == "create_transaction":
+            txn_id = "FAKE" + uuid.uuid4().hex[:20].upper()
+            self._send(200, {"error": "ok", "result": {
+                "amount": params.get("amount"),
+                "txn_id": txn_id,
+                "address": "fake-" + txn_id.lower(),
+                "confirms_needed": "2",
+                "timeout": 9000,
+                "checkout_url": f"http://{self.headers.get('Host')}/checkout/{txn_id}",
+                "status_url": f"http://{self.headers.get('Host')}/status/{txn_id}",
+            }})
+        else:
+            self._send(200, {"error": f"Unknown command: {params.get('cmd')}"})
+
+
+class FakeCoinPaymentsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, api_secret="", latency=0.0, error_rate=0.0, verbose=False):
+        super().__init__(address, FakeCoinPaymentsHandler)
+        self.api_secret = api_secret
+        self.latency = latency
+        self.error_rate = error_rate
+        self.verbose = verbose
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api.php"
+
+
+def start_fake_server(host="127.0.0.1", port=0, **options):
+    """Démarre le faux serveur dans un thread ; port=0 choisit un port libre."""
+    server = FakeCoinPaymentsServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
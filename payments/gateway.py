@@ -0,0 +1,341 @@
+import asyncio
+import hashlib
+import hmac
+import itertools
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from urllib.parse import urlencode
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Codes HTTP pour lesquels la requête n'a pas été traitée par la passerelle : on peut la rejouer
+RETRY_STATUSES = (429, 503)
+# Nombre de mesures de latence conservées pour les percentiles
+LATENCY_WINDOW = 1000
+
+
+class GatewayError(Exception):
+    """Échec d'un appel à CoinPayments (réseau, HTTP ou erreur renvoyée par l'API)."""
+
+
+class CircuitOpen(GatewayError):
+    """Le disjoncteur est ouvert : la passerelle est considérée indisponible."""
+
+
+class ApiError(GatewayError):
+    """Erreur métier renvoyée par l'API (paramètres refusés...) : la passerelle a bien répondu."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur : après failure_threshold échecs consécutifs (erreur réseau,
+    HTTP 5xx ou 429, ou appel plus lent que slow_call_threshold secondes), les appels sont refusés
+    pendant reset_timeout secondes, puis un appel d'essai est autorisé.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, slow_call_threshold=5.0, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == self.OPEN or (state == self.HALF_OPEN and self._trial_running):
+                raise CircuitOpen("Passerelle de paiement indisponible, réessayez plus tard.")
+            if state == self.HALF_OPEN:
+                self._trial_running = True
+
+    def after_call(self, success, elapsed):
+        with self._lock:
+            self._trial_running = False
+            if success and elapsed <= self.slow_call_threshold:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class LatencyStats:
+    """Compteurs et latences des appels à la passerelle (processus courant)."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._durations = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+
+    def record(self, elapsed, success):
+        with self._lock:
+            self.calls += 1
+            self.errors += 0 if success else 1
+            self._durations.append(elapsed)
+
+    def record_rejected(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        with self._lock:
+            durations = sorted(self._durations)
+            calls, errors, rejected = self.calls, self.errors, self.rejected
+
+        def percentile(p):
+            if not durations:
+                return None
+            return round(durations[min(len(durations) - 1, int(len(durations) * p))] * 1000, 1)
+
+        return {
+            "calls": calls,
+            "errors": errors,
+            "rejected_by_breaker": rejected,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+        }
+
+
+class CoinPaymentsClient:
+    """
+    Client de l'API CoinPayments : session HTTP persistante (pool de connexions),
+    délais d'attente, nouvelles tentatives avec backoff exponentiel, disjoncteur
+    et mesures de latence. acall() est la variante asyncio (httpx si installé).
+    """
+
+    def __init__(self, api_url=None, api_key=None, api_secret=None, timeout=None,
+                 retries=None, backoff=None, pool_size=None, breaker=None):
+        self.api_url = api_url or os.getenv("COINPAYMENTS_API_URL", "https://www.coinpayments.net/api.php")
+        self.api_key = api_key if api_key is not None else os.getenv("COINPAYMENTS_API_KEY", "")
+        self.api_secret = api_secret if api_secret is not None else os.getenv("COINPAYMENTS_API_SECRET", "")
+        self.timeout = timeout or (
+            _setting("COINPAYMENTS_CONNECT_TIMEOUT", 3.05),
+            _setting("COINPAYMENTS_READ_TIMEOUT", 10),
+        )
+        self.retries = _setting("COINPAYMENTS_RETRIES", 2) if retries is None else retries
+        self.backoff = _setting("COINPAYMENTS_BACKOFF", 0.3) if backoff is None else backoff
+        self.pool_size = pool_size or _setting("COINPAYMENTS_POOL_SIZE", 10)
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=_setting("COINPAYMENTS_BREAKER_FAILURES", 5),
+            slow_call_threshold=_setting("COINPAYMENTS_BREAKER_SLOW_CALL", 5.0),
+            reset_timeout=_setting("COINPAYMENTS_BREAKER_RESET", 30.0),
+        )
+        self.stats = LatencyStats()
+        self._session = None
+        self._session_lock = threading.Lock()
+        # Nonce strictement croissant, même pour des appels dans la même milliseconde
+        self._nonces = itertools.count(time.time_ns() // 1000)
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    retry = Retry(
+                        total=self.retries,
+                        connect=self.retries,
+                        read=0,  # Une requête déjà reçue n'est jamais rejouée (pas de double paiement)
+                        status=self.retries,
+                        status_forcelist=RETRY_STATUSES,
+                        allowed_methods=frozenset({"POST"}),
+                        backoff_factor=self.backoff,
+                        respect_retry_after_header=True,
+                        raise_on_status=False,
+                    )
+                    adapter = HTTPAdapter(
+                        pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry
+                    )
+                    session = requests.Session()
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def _signed_request(self, cmd, params):
+        payload = {
+            "version": 1,
+            "cmd": cmd,
+            "key": self.api_key,
+            "format": "json",
+            "nonce": str(next(self._nonces)),
+            **params,
+        }
+        body = urlencode(payload)
+        signature = hmac.new(self.api_secret.encode(), body.encode(), hashlib.sha512).hexdigest()
+        headers = {"HMAC": signature, "Content-Type": "application/x-www-form-urlencoded"}
+        return body, headers
+
+    @staticmethod
+    def _result(status_code, data):
+        if status_code != 200:
+            raise GatewayError(f"API request failed with status {status_code}")
+        if data.get("error") != "ok":
+            raise ApiError(data.get("error") or "Réponse CoinPayments invalide")
+        return data.get("result", {})
+
+    @staticmethod
+    def _available(status_code):
+        # Seules les pannes de la passerelle ouvrent le disjoncteur, pas les refus de l'API
+        return status_code < 500 and status_code not in RETRY_STATUSES
+
+    def call(self, cmd, **params):
+        """Appelle une commande de l'API et renvoie son résultat ; lève GatewayError sinon."""
+        try:
+            self.breaker.before_call()
+        except CircuitOpen:
+            self.stats.record_rejected()
+            raise
+        body, headers = self._signed_request(cmd, params)
+        started = time.monotonic()
+        success = available = False
+        try:
+            response = self.session.post(self.api_url, data=body, headers=headers, timeout=self.timeout)
+            available = self._available(response.status_code)
+            result = self._result(response.status_code, response.json() if response.status_code == 200 else {})
+            success = True
+            return result
+        except requests.exceptions.RequestException as e:
+            raise GatewayError(f"API request exception: {e}") from e
+        except ValueError as e:
+            raise GatewayError("Réponse CoinPayments illisible") from e
+        finally:
+            elapsed = time.monotonic() - started
+            self.stats.record(elapsed, success)
+            self.breaker.after_call(available, elapsed)
+
+    async def acall(self, cmd, **params):
+        """Variante asyncio de call() (httpx.AsyncClient, ou call() dans un thread à défaut)."""
+        try:
+            import httpx
+        except ImportError:
+            return await asyncio.to_thread(self.call, cmd, **params)
+
+        try:
+            self.breaker.before_call()
+        except CircuitOpen:
+            self.stats.record_rejected()
+            raise
+        body, headers = self._signed_request(cmd, params)
+        client = await self._async_client(httpx)
+        started = time.monotonic()
+        success = available = False
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    response = await client.post(self.api_url, content=body, headers=headers)
+                except httpx.ConnectError as e:
+                    if attempt == self.retries:
+                        raise GatewayError(f"API request exception: {e}") from e
+                except httpx.HTTPError as e:
+                    raise GatewayError(f"API request exception: {e}") from e
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                        break
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+            available = self._available(response.status_code)
+            try:
+                data = response.json() if response.status_code == 200 else {}
+            except ValueError as e:
+                raise GatewayError("Réponse CoinPayments illisible") from e
+            result = self._result(response.status_code, data)
+            success = True
+            return result
+        finally:
+            elapsed = time.monotonic() - started
+            self.stats.record(elapsed, success)
+            self.breaker.after_call(available, elapsed)
+
+    async def _async_client(self, httpx):
+        # Un client (et son pool) par boucle d'événements
+        loop = asyncio.get_running_loop()
+        clients = self.__dict__.setdefault("_async_clients", weakref.WeakKeyDictionary())
+        entry = clients.get(loop)
+        if entry is None:
+            connect, read = self.timeout
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+            # Fermé à l'arrêt de la boucle (shutdown_asyncgens, appelé par asyncio.run
+            # et async_to_sync) : une boucle par requête ne laisse pas de connexions ouvertes
+            closer = _close_at_loop_shutdown(client)
+            await closer.asend(None)
+            entry = clients[loop] = (client, closer)
+        return entry[0]
+
+    async def aclose(self):
+        """Ferme le client HTTP asynchrone de la boucle courante (et ses connexions)."""
+        clients = self.__dict__.get("_async_clients")
+        entry = clients.pop(asyncio.get_running_loop(), None) if clients is not None else None
+        if entry is not None:
+            await entry[1].aclose()
+
+    def close(self):
+        """Ferme la session HTTP synchrone (et ses connexions)."""
+        with self._session_lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    def create_transaction(self, buyer_email, amount, currency="BTC"):
+        return self.call(
+            "create_transaction", amount=amount, currency1=currency, currency2=currency, buyer_email=buyer_email
+        )
+
+    async def acreate_transaction(self, buyer_email, amount, currency="BTC"):
+        return await self.acall(
+            "create_transaction", amount=amount, currency1=currency, currency2=currency, buyer_email=buyer_email
+        )
+
+
+async def _close_at_loop_shutdown(client):
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Client partagé du processus (une session et un disjoncteur par worker)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = CoinPaymentsClient()
+    return _client
+
+
+def gateway_metrics():
+    client = get_client()
+    return {**client.stats.snapshot(), "circuit": client.breaker.state}
@@ -0,0 +1,136 @@
+import datetime
+import hashlib
+import hmac
+import os
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from payments.models import IPNNotification, TollTransaction
+
+# Secret IPN CoinPayments (variable d'environnement, comme les clés API de utils.py)
+IPN_SECRET = os.getenv("COINPAYMENTS_IPN_SECRET", "")
+
+# Notifications traitées par transaction du consommateur
+IPN_BATCH_SIZE = 500
+# Au plus un déclenchement du consommateur par intervalle (secondes), quel que soit le débit d'IPN
+IPN_TRIGGER_INTERVAL = 1
+_TRIGGER_KEY = "payments:ipn-consumer-triggered"
+# Transaction pas encore visible (IPN plus rapide que l'enregistrement du paiement) :
+# nouvel essai après IPN_RETRY_DELAY, abandon (UNKNOWN) IPN_UNKNOWN_TXN_GRACE après réception
+IPN_RETRY_DELAY = datetime.timedelta(seconds=30)
+IPN_UNKNOWN_TXN_GRACE = datetime.timedelta(hours=1)
+
+
+def verify_signature(body, received_hmac, secret=None):
+    """Vérifie l'en-tête HMAC (SHA-512 du corps brut), en temps constant."""
+    secret = IPN_SECRET if secret is None else secret
+    if not secret or not received_hmac:
+        return False
+    calculated = hmac.new(secret.encode(), body, hashlib.sha512).hexdigest()
+    try:
+        # Octets : compare_digest refuse les str non ASCII (en-tête forgé)
+        received = received_hmac.strip().lower().encode("ascii")
+    except UnicodeEncodeError:
+        return False
+    return hmac.compare_digest(calculated.encode(), received)
+
+
+def target_status(code):
+    """Statut interne correspondant à un code CoinPayments, ou None s'il n'est pas définitif."""
+    if code >= 100 or code == 2:  # 2 : paiement en file d'attente côté CoinPayments (fonds garantis)
+        return TollTransaction.COMPLETED
+    if code < 0:
+        return TollTransaction.FAILED
+    return None
+
+
+def store_notification(txn_id, status, payload):
+    """
+    Enregistre la notification dans la boîte de réception, en une requête
+    INSERT ... ON CONFLICT DO NOTHING : une notification rejouée (même
+    txn_id, même statut) est absorbée sans erreur ni nouvelle ligne.
+    """
+    IPNNotification.objects.bulk_create(
+        [IPNNotification(txn_id=txn_id, status=status, payload=payload)],
+        ignore_conflicts=True,
+    )
+
+
+def trigger_consumer():
+    """Planifie le consommateur, au plus une fois par IPN_TRIGGER_INTERVAL."""
+    if cache.add(_TRIGGER_KEY, 1, IPN_TRIGGER_INTERVAL):
+        from payments.tasks import process_ipn_notifications
+        transaction.on_commit(process_ipn_notifications.delay)
+
+
+def process_batch(batch_size=IPN_BATCH_SIZE):
+    """
+    Traite un lot de notifications en attente. Les lignes sont verrouillées avec
+    SKIP LOCKED : plusieurs consommateurs peuvent tourner sans traiter deux fois
+    la même notification. Les statuts sont appliqués par des UPDATE groupés,
+    conditionnés au statut courant (transitions vers l'avant uniquement).
+    Une notification dont la transaction n'est pas encore visible reste en
+    attente et est reprise plus tard, jusqu'à IPN_UNKNOWN_TXN_GRACE.
+    Renvoie le nombre de notifications traitées.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        notifications = list(
+            IPNNotification.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .order_by("id")
+            .only("id", "txn_id", "status", "received_at")[:batch_size]
+        )
+        if not notifications:
+            return 0
+
+        # Pour chaque transaction, le premier statut définitif reçu l'emporte
+        targets = {}
+        duplicates = {}
+        outcomes = {IPNNotification.APPLIED: [], IPNNotification.IGNORED: [], IPNNotification.UNKNOWN: []}
+        for notification in notifications:
+            status = target_status(notification.status)
+            if status is None:
+                outcomes[IPNNotification.IGNORED].append(notification.id)
+            elif notification.txn_id in targets:
+                duplicates.setdefault(notification.txn_id, []).append(notification.id)
+            else:
+                targets[notification.txn_id] = (status, notification.id, notification.received_at)
+
+        current = dict(
+            TollTransaction.objects.filter(transaction_id__in=targets)
+            .values_list("transaction_id", "status")
+        )
+        updates = {}
+        deferred = []
+        for txn_id, (status, notification_id, received_at) in targets.items():
+            others = duplicates.get(txn_id, [])
+            if txn_id not in current:
+                if received_at > now - IPN_UNKNOWN_TXN_GRACE:
+                    deferred.extend([notification_id, *others])
+                    continue
+                outcomes[IPNNotification.UNKNOWN].extend([notification_id, *others])
+                continue
+            outcomes[IPNNotification.IGNORED].extend(others)
+            if TollTransaction.STATUS_RANK.get(status, 0) > TollTransaction.STATUS_RANK.get(current[txn_id], 0):
+                updates.setdefault(status, []).append(txn_id)
+                outcomes[IPNNotification.APPLIED].append(notification_id)
+            else:
+                outcomes[IPNNotification.IGNORED].append(notification_id)
+
+        for status, txn_ids in updates.items():
+            # La condition sur le statut garantit l'ordre même si une autre écriture est passée entre-temps
+            TollTransaction.objects.filter(
+                transaction_id__in=txn_ids,
+                status__in=[s for s, rank in TollTransaction.STATUS_RANK.items()
+                            if rank < TollTransaction.STATUS_RANK[status]],
+            ).update(status=status)
+
+        for outcome, ids in outcomes.items():
+            if ids:
+                IPNNotification.objects.filter(id__in=ids).update(processed_at=now, outcome=outcome)
+        if deferred:
+            IPNNotification.objects.filter(id__in=deferred).update(next_attempt_at=now + IPN_RETRY_DELAY)
+    return len(notifications)
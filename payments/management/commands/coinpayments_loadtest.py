@@ -0,0 +1,78 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from payments.fake_gateway import start_fake_server
+from payments.gateway import CircuitBreaker, CoinPaymentsClient, GatewayError
+
+
+class Command(BaseCommand):
+    help = "Test de charge du client CoinPayments (contre le faux serveur local par défaut)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="URL de l'API ; sans URL, un faux serveur local est démarré")
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--async", dest="use_async", action="store_true", help="Utiliser la variante asyncio")
+        parser.add_argument("--latency", type=float, default=0.02, help="Latence du faux serveur (secondes)")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Taux de 503 du faux serveur")
+
+    def handle(self, *args, **options):
+        secret = "loadtest-secret"
+        server = None
+        url = options["url"]
+        if not url:
+            server = start_fake_server(api_secret=secret, latency=options["latency"], error_rate=options["error_rate"])
+            url = server.url
+
+        client = CoinPaymentsClient(
+            api_url=url, api_key="loadtest", api_secret=secret,
+            pool_size=options["concurrency"], backoff=0.05,
+            breaker=CircuitBreaker(failure_threshold=max(options["requests"], 1)),
+        )
+        total = options["requests"]
+        started = time.monotonic()
+        if options["use_async"]:
+            failures = asyncio.run(self._run_async(client, total, options["concurrency"]))
+        else:
+            failures = self._run_threads(client, total, options["concurrency"])
+        elapsed = time.monotonic() - started
+
+        report = {
+            "mode": "async" if options["use_async"] else "threads",
+            "requests": total,
+            "failures": failures,
+            "elapsed_seconds": round(elapsed, 3),
+            "requests_per_second": round(total / elapsed, 1) if elapsed else None,
+            **client.stats.snapshot(),
+        }
+        if server is not None:
+            report["server_requests"] = server.requests  # Inclut les nouvelles tentatives
+            server.shutdown()
+        self.stdout.write(json.dumps(report, indent=2))
+
+    @staticmethod
+    def _one(client):
+        try:
+            client.create_transaction("loadtest@example.com", "0.01")
+            return 0
+        except GatewayError:
+            return 1
+
+    def _run_threads(self, client, total, concurrency):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return sum(pool.map(lambda _: self._one(client), range(total)))
+
+    async def _run_async(self, client, total, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                try:
+                    await client.acreate_transaction("loadtest@example.com", "0.01")
+                    return 0
+                except GatewayError:
+                    return 1
+
+        return sum(await asyncio.gather(*(one() for _ in range(total))))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from payments.fake_gateway import FakeCoinPaymentsServer
+
+
+class Command(BaseCommand):
+    help = "Lance un faux serveur CoinPayments local (tests de charge hors ligne)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--secret", default="", help="Secret API attendu pour la signature HMAC")
+        parser.add_argument("--latency", type=float, default=0.05, help="Latence moyenne simulée (secondes)")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Proportion de réponses 503")
+        parser.add_argument("--verbose", action="store_true")
+
+    def handle(self, *args, **options):
+        server = FakeCoinPaymentsServer(
+            (options["host"], options["port"]),
+            api_secret=options["secret"],
+            latency=options["latency"],
+            error_rate=options["error_rate"],
+            verbose=options["verbose"],
+        )
+        self.stdout.write(f"Faux CoinPayments sur {server.url} (Ctrl+C pour arrêter)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"{server.requests} requêtes reçues.")
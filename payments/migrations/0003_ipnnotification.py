@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IPNNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('txn_id', models.CharField(max_length=100)),
+                ('status', models.IntegerField(help_text='Code de statut CoinPayments.')),
+                ('payload', models.TextField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('outcome', models.CharField(blank=True, choices=[('applied', 'Appliquée'), ('ignored', 'Ignorée'), ('unknown', 'Transaction inconnue')], default='', max_length=10)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('txn_id', 'status'), name='payments_ipn_txn_status_unique')],
+                'indexes': [models.Index(condition=models.Q(('processed_at__isnull', True)), fields=['id'], name='payments_ipn_pending_idx')],
+            },
+        ),
+    ]
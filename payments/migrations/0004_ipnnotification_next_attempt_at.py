@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_ipnnotification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ipnnotification',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -27,9 +27,49 @@ class TollTransaction(models.Model):
     transaction_id = models.CharField(max_length=100, unique=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Transitions autorisées : uniquement vers l'avant (pending -> completed / failed)
+    STATUS_RANK = {PENDING: 0, COMPLETED: 1, FAILED: 1}
+
     def __str__(self):
         return f"Transaction {self.transaction_id} - {self.amount} {self.currency}"
 
+
+class IPNNotification(models.Model):
+    """
+    Boîte de réception des notifications IPN CoinPayments : chaque notification
+    vérifiée est enregistrée telle quelle puis traitée en arrière-plan.
+    Le couple (txn_id, status) est unique : une notification rejouée n'est stockée qu'une fois.
+    """
+    APPLIED = "applied"
+    IGNORED = "ignored"
+    UNKNOWN = "unknown"
+    OUTCOME_CHOICES = [
+        (APPLIED, "Appliquée"),
+        (IGNORED, "Ignorée"),
+        (UNKNOWN, "Transaction inconnue"),
+    ]
+
+    txn_id = models.CharField(max_length=100)
+    status = models.IntegerField(help_text="Code de statut CoinPayments.")
+    payload = models.TextField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # Transaction pas encore visible : notification reprise à partir de cette date
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES, blank=True, default="")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["txn_id", "status"], name="payments_ipn_txn_status_unique"),
+        ]
+        indexes = [
+            # Notifications en attente uniquement : l'index reste petit
+            models.Index(fields=["id"], name="payments_ipn_pending_idx", condition=models.Q(processed_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"IPN {self.txn_id} ({self.status})"
+
 def update_status(self, new_status):
     if new_status in [self.PENDING, self.COMPLETED, self.FAILED]:
         self.status = new_status
@@ -0,0 +1,17 @@
+from celery import shared_task
+from .ipn import IPN_BATCH_SIZE, process_batch
+
+# Nombre maximal de lots traités par exécution de la tâche
+IPN_MAX_BATCHES = 50
+
+
+@shared_task
+def process_ipn_notifications(batch_size=IPN_BATCH_SIZE):
+    """Vide la boîte de réception IPN par lots (déclenchée par les IPN et par Celery Beat)."""
+    processed = 0
+    for _ in range(IPN_MAX_BATCHES):
+        count = process_batch(batch_size)
+        processed += count
+        if count < batch_size:
+            break
+    return f"{processed} notifications IPN traitées."
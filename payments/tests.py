@@ -1,3 +1,210 @@
+import asyncio
+import hashlib
+import hmac
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import urlencode
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from vehicles.models import Brand, VehicleModel
+from vehicles.tests import create_vehicle
+from users.models import User
+from . import gateway
+from .fake_gateway import start_fake_server
+from .gateway import ApiError, CircuitBreaker, CircuitOpen, CoinPaymentsClient, GatewayError
+from .ipn import IPN_UNKNOWN_TXN_GRACE, process_batch
+from .models import IPNNotification, TollTransaction
 
-# Create your tests here.
+SECRET = "ipn-test-secret"
+
+
+class CoinPaymentsIPNTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="payer", password="Secret123!")
+        brand = Brand.objects.create(name="Renault")
+        model = VehicleModel.objects.create(brand=brand, name="Clio")
+        cls.vehicle = create_vehicle(cls.user, brand, model, 1)
+
+    def setUp(self):
+        patcher = mock.patch("payments.ipn.IPN_SECRET", SECRET)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        trigger = mock.patch("payments.views.trigger_consumer")
+        self.trigger = trigger.start()
+        self.addCleanup(trigger.stop)
+
+    def create_transaction(self, txn_id, status=TollTransaction.PENDING):
+        return TollTransaction.objects.create(
+            user=self.user, vehicle=self.vehicle, amount=Decimal("0.01"),
+            transaction_id=txn_id, status=status,
+        )
+
+    def post_ipn(self, txn_id, status, secret=SECRET):
+        body = urlencode({"txn_id": txn_id, "status": status})
+        signature = hmac.new(secret.encode(), body.encode(), hashlib.sha512).hexdigest()
+        return self.client.post(
+            reverse("coinpayments_ipn"), body,
+            content_type="application/x-www-form-urlencoded", HTTP_HMAC=signature, secure=True,
+        )
+
+    def test_invalid_signature_is_rejected(self):
+        response = self.post_ipn("TX1", 100, secret="wrong")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IPNNotification.objects.exists())
+
+    def test_retried_ipn_is_stored_once(self):
+        for _ in range(3):
+            self.assertEqual(self.post_ipn("TX1", 100).status_code, 200)
+        self.assertEqual(IPNNotification.objects.count(), 1)
+        self.assertTrue(self.trigger.called)
+
+    def test_consumer_applies_forward_transitions_only(self):
+        self.create_transaction("TX1")
+        self.create_transaction("TX2", status=TollTransaction.COMPLETED)
+        self.post_ipn("TX1", 100)
+        self.post_ipn("TX1", -1)
+        self.post_ipn("TX2", -1)
+        self.post_ipn("TX3", 100)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(process_batch(), 4)
+        statements = [q for q in queries.captured_queries if "SAVEPOINT" not in q["sql"]]
+        # Verrouillage du lot, lecture des statuts, une mise à jour, deux marquages, un report
+        self.assertEqual(len(statements), 6)
+
+        self.assertEqual(TollTransaction.objects.get(transaction_id="TX1").status, TollTransaction.COMPLETED)
+        self.assertEqual(TollTransaction.objects.get(transaction_id="TX2").status, TollTransaction.COMPLETED)
+        # TX3 n'est pas encore visible : la notification reste en attente
+        pending = IPNNotification.objects.get(processed_at__isnull=True)
+        self.assertEqual(pending.txn_id, "TX3")
+        self.assertIsNotNone(pending.next_attempt_at)
+        self.assertEqual(process_batch(), 0)
+
+    def test_invalid_signature_with_non_ascii_header_is_rejected(self):
+        body = urlencode({"txn_id": "TX1", "status": 100})
+        response = self.client.post(
+            reverse("coinpayments_ipn"), body,
+            content_type="application/x-www-form-urlencoded", HTTP_HMAC="é" * 128, secure=True,
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(IPNNotification.objects.exists())
+
+    def test_ipn_received_before_its_transaction_is_applied_later(self):
+        self.post_ipn("TX1", 100)
+        self.assertEqual(process_batch(), 1)
+        self.create_transaction("TX1")
+        # Nouvel essai une fois le délai écoulé : la transaction est maintenant visible
+        IPNNotification.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_batch(), 1)
+        self.assertEqual(TollTransaction.objects.get(transaction_id="TX1").status, TollTransaction.COMPLETED)
+        self.assertEqual(IPNNotification.objects.get().outcome, IPNNotification.APPLIED)
+
+    def test_unknown_transaction_is_given_up_after_grace_period(self):
+        self.post_ipn("TX9", 100)
+        IPNNotification.objects.update(received_at=timezone.now() - IPN_UNKNOWN_TXN_GRACE)
+        self.assertEqual(process_batch(), 1)
+        self.assertEqual(IPNNotification.objects.get().outcome, IPNNotification.UNKNOWN)
+
+
+class CoinPaymentsClientTests(TestCase):
+    def start_server(self, **options):
+        server = start_fake_server(api_secret=SECRET, **options)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_create_transaction_reuses_connections(self):
+        server = self.start_server()
+        client = CoinPaymentsClient(api_url=server.url, api_key="key", api_secret=SECRET)
+        for _ in range(5):
+            result = client.create_transaction("payer@example.com", "0.01")
+            self.assertTrue(result["txn_id"].startswith("FAKE"))
+        self.assertEqual(server.requests, 5)
+        self.assertEqual(client.stats.snapshot()["calls"], 5)
+
+    def test_unavailable_gateway_is_retried_then_opens_circuit(self):
+        server = self.start_server(error_rate=1.0)
+        client = CoinPaymentsClient(
+            api_url=server.url, api_key="key", api_secret=SECRET, retries=2, backoff=0,
+            breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60),
+        )
+        for _ in range(2):
+            with self.assertRaises(GatewayError):
+                client.create_transaction("payer@example.com", "0.01")
+        self.assertEqual(server.requests, 6)  # 2 appels x (1 + 2 nouvelles tentatives)
+        with self.assertRaises(CircuitOpen):
+            client.create_transaction("payer@example.com", "0.01")
+        self.assertEqual(server.requests, 6)
+
+    def test_api_errors_do_not_open_circuit(self):
+        server = self.start_server()
+        client = CoinPaymentsClient(
+            api_url=server.url, api_key="key", api_secret="wrong-secret",
+            breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60),
+        )
+        for _ in range(3):
+            with self.assertRaises(ApiError):
+                client.create_transaction("payer@example.com", "0.01")
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(client.stats.snapshot()["errors"], 3)
+
+    def test_async_client_is_closed(self):
+        try:
+            import httpx
+        except ImportError:
+            self.skipTest("httpx non installé")
+        server = self.start_server()
+        client = CoinPaymentsClient(api_url=server.url, api_key="key", api_secret=SECRET)
+
+        async def pay_then_close():
+            await client.acreate_transaction("payer@example.com", "0.01")
+            http_client = await client._async_client(httpx)
+            await client.aclose()
+            return http_client
+
+        self.assertTrue(asyncio.run(pay_then_close()).is_closed)
+
+        async def pay():
+            await client.acreate_transaction("payer@example.com", "0.01")
+            return await client._async_client(httpx)
+
+        # Sans aclose() explicite, le client est fermé à l'arrêt de la boucle
+        self.assertTrue(asyncio.run(pay()).is_closed)
+
+
+class PayTollViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="payer", email="payer@example.com", password="Secret123!", is_active=True)
+        brand = Brand.objects.create(name="Renault")
+        cls.vehicle = create_vehicle(cls.user, brand, VehicleModel.objects.create(brand=brand, name="Clio"), 1)
+
+    def test_async_payment_initiation_redirects_to_checkout(self):
+        server = start_fake_server(api_secret=SECRET)
+        self.addCleanup(server.shutdown)
+        client = CoinPaymentsClient(api_url=server.url, api_key="key", api_secret=SECRET)
+        url = reverse("pay_toll", args=[self.vehicle.pk])
+
+        self.assertEqual(self.client.get(url, secure=True).status_code, 302)  # Connexion requise
+        self.assertFalse(TollTransaction.objects.exists())
+
+        self.client.force_login(self.user)
+        with mock.patch.object(gateway, "_client", client):
+            response = self.client.get(url, secure=True)
+        transaction = TollTransaction.objects.get()
+        self.assertRedirects(response, f"{server.url.rsplit('/', 1)[0]}/checkout/{transaction.transaction_id}",
+                             fetch_redirect_response=False)
+        self.assertEqual(transaction.status, "pending")
+        self.assertEqual(server.requests, 1)
+
+    def test_payment_for_another_users_vehicle_is_refused(self):
+        intruder = User.objects.create_user(username="intruder", password="Secret123!", is_active=True)
+        self.client.force_login(intruder)
+        with mock.patch("payments.views.acreate_transaction") as create:
+            response = self.client.get(reverse("pay_toll", args=[self.vehicle.pk]), secure=True)
+        self.assertEqual(response.status_code, 404)
+        create.assert_not_called()
+        self.assertFalse(TollTransaction.objects.exists())
@@ -6,10 +6,3 @@ urlpatterns = [
     path("coinpayments/ipn/", coinpayments_ipn, name="coinpayments_ipn"),
     
 ]
-from django.urls import path
-from . import views
-
-urlpatterns = [
-    path('', views.index, name='index'),
-]
-
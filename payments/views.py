@@ -1,29 +1,33 @@
+from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect
 from django.http import JsonResponse
-from payments.utils import create_transaction
+from payments.utils import acreate_transaction
 from payments.models import TollTransaction
 from vehicles.models import Vehicle
 from users.models import User
 from django.core.exceptions import ObjectDoesNotExist
-import hashlib
-import hmac
 from django.views.decorators.csrf import csrf_exempt
+from payments.ipn import store_notification, trigger_consumer, verify_signature
 
-def pay_toll(request, vehicle_id):
-    user = request.user
+@login_required
+async def pay_toll(request, vehicle_id):
+    """
+    Initiation d'un paiement CoinPayments. Vue asynchrone : pendant l'aller-retour
+    vers la passerelle, le worker ASGI continue de servir d'autres requêtes.
+    """
+    user = await request.auser()
 
-    # Vérification de l'existence du véhicule
-    try:
-        vehicle = Vehicle.objects.get(id=vehicle_id)
-    except ObjectDoesNotExist:
+    # Vérification de l'existence du véhicule (seuls ceux de l'utilisateur)
+    vehicle = await Vehicle.objects.filter(id=vehicle_id, user=user).afirst()
+    if vehicle is None:
         return JsonResponse({"error": "Véhicule non trouvé"}, status=404)
 
     amount = 0.01  # Exemple : péage à 0.01 BTC
 
-    transaction_data = create_transaction(user, vehicle, amount, "BTC")
+    transaction_data = await acreate_transaction(user, vehicle, amount, "BTC")
 
     if "error" not in transaction_data:
-        transaction = TollTransaction.objects.create(
+        await TollTransaction.objects.acreate(
             user=user,
             vehicle=vehicle,
             amount=amount,
@@ -35,34 +39,26 @@ def pay_toll(request, vehicle_id):
     else:
         return JsonResponse({"error": transaction_data["error"]}, status=400)
 
-IPN_SECRET = "TON_IPN_SECRET"
-
 @csrf_exempt
 def coinpayments_ipn(request):
-    """ Gère les notifications IPN de CoinPayments """
-    if request.method == "POST":
-        received_hmac = request.headers.get("HMAC")
-        payload = request.body.decode()
-
-        # Calcul du HMAC à partir de la charge utile
-        calculated_hmac = hmac.new(IPN_SECRET.encode(), payload.encode(), hashlib.sha512).hexdigest()
+    """
+    Gère les notifications IPN de CoinPayments : vérification de la signature,
+    enregistrement dans la boîte de réception puis réponse immédiate.
+    Les statuts sont appliqués en arrière-plan (payments.tasks.process_ipn_notifications).
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid IPN"}, status=400)
+    if not verify_signature(request.body, request.headers.get("HMAC")):
+        return JsonResponse({"error": "Invalid IPN"}, status=400)
 
-        if received_hmac == calculated_hmac:
-            # Récupérer les données IPN depuis le corps de la requête
-            data = request.POST
-            txn_id = data.get("txn_id")
-            status = int(data.get("status"))
-
-            try:
-                transaction = TollTransaction.objects.get(transaction_id=txn_id)
-                if status >= 100:  # Paiement réussi
-                    transaction.status = "completed"
-                elif status < 0:  # Paiement échoué
-                    transaction.status = "failed"
-                transaction.save()
-                return JsonResponse({"status": "success"}, status=200)
-
-            except TollTransaction.DoesNotExist:
-                return JsonResponse({"error": "Transaction non trouvée"}, status=404)
+    txn_id = request.POST.get("txn_id", "")
+    try:
+        status = int(request.POST.get("status", ""))
+    except ValueError:
+        return JsonResponse({"error": "Invalid IPN"}, status=400)
+    if not txn_id or len(txn_id) > 100:
+        return JsonResponse({"error": "Invalid IPN"}, status=400)
 
-    return JsonResponse({"error": "Invalid IPN"}, status=400)
+    store_notification(txn_id, status, request.body.decode("utf-8", errors="replace"))
+    trigger_consumer()
+    return JsonResponse({"status": "queued"}, status=200)
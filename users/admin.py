@@ -4,9 +4,11 @@ from .models import CustomUser
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
-    list_display = ["username", "email", "phone_number", "address", "created_at"]
+    list_display = ["username", "email", "phone_number", "address", "kyc_status", "created_at"]
+    list_filter = UserAdmin.list_filter + ("kyc_status",)
+    readonly_fields = ("extracted_text",)
     fieldsets = UserAdmin.fieldsets + (
-        (None, {"fields": ("phone_number", "address", "identity_document", "extracted_text")}),
+        (None, {"fields": ("phone_number", "address", "identity_document", "kyc_status", "is_verified", "extracted_text")}),
     )
     add_fieldsets = UserAdmin.add_fieldsets + (
         (None, {"fields": ("phone_number", "address", "identity_document")}),
@@ -0,0 +1,81 @@
+import datetime
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Max, Min, Q, Sum
+from django.utils import timezone
+from core.cache import DASHBOARD, get_or_set_for_user
+from vehicles.models import VehicleCompliance
+from .partitions import add_months, month_start
+from .rollups import ROLLUP_MONTHS, monthly_totals
+
+# Solde de véhicule en dessous duquel un rechargement est conseillé
+LOW_BALANCE_THRESHOLD = Decimal("10.00")
+
+
+def compliance_summary(user):
+    """Véhicules par tranche de conformité, en une requête d'agrégats conditionnels."""
+    return VehicleCompliance.objects.filter(user=user).aggregate(
+        vehicles=Count("pk"),
+        ok=Count("pk", filter=Q(status=VehicleCompliance.OK)),
+        due_soon=Count("pk", filter=Q(status=VehicleCompliance.DUE_SOON)),
+        expired=Count("pk", filter=Q(status=VehicleCompliance.EXPIRED)),
+        insurance_expired=Count("pk", filter=Q(insurance_days_left__lt=0)),
+        technical_check_overdue=Count("pk", filter=Q(technical_days_left__lt=0)),
+        next_deadline_days=Min("days_left"),
+    )
+
+
+def monthly_spend(user, months=ROLLUP_MONTHS):
+    """Dépenses de péage des derniers mois (cumuls mensuels), mois sans passage compris."""
+    current = month_start(timezone.now())
+    totals = {row["month"]: row for row in monthly_totals(user, months)}
+    spend = []
+    for offset in range(months):
+        month = add_months(current, -offset)
+        row = totals.get(month, {})
+        spend.append({
+            "month": month,
+            "transaction_count": row.get("transaction_count") or 0,
+            "total_amount": row.get("total_amount") or Decimal("0.00"),
+        })
+    return {"months": spend, "total_amount": sum((row["total_amount"] for row in spend), Decimal("0.00"))}
+
+
+def balance_summary(user):
+    """
+    Solde du compte et des véhicules du télépéage, en une requête d'agrégats
+    conditionnels. Ancrée sur la ligne de l'utilisateur (jointures externes) :
+    les véhicules comptent même sans profil, le solde du compte même sans véhicule.
+    """
+    vehicles = "owned_vehicles"
+    summary = get_user_model().objects.filter(pk=user.pk).aggregate(
+        profile_balance=Max("profile__toll_balance"),
+        vehicles=Count(vehicles),
+        vehicles_total=Sum(f"{vehicles}__toll_balance"),
+        low_balance=Count(vehicles, filter=Q(**{f"{vehicles}__toll_balance__lt": LOW_BALANCE_THRESHOLD})),
+    )
+    for field in ("profile_balance", "vehicles_total"):
+        summary[field] = summary[field] or Decimal("0.00")
+    summary["low_balance_threshold"] = LOW_BALANCE_THRESHOLD
+    return summary
+
+
+DASHBOARD_BLOCKS = {
+    "compliance": compliance_summary,
+    "monthly_spend": monthly_spend,
+    "balances": balance_summary,
+}
+
+
+def get_dashboard(user, today=None):
+    """
+    Tableau de bord d'un utilisateur ou d'une flotte. Chaque bloc est mis en
+    cache séparément et invalidé avec les autres données de l'utilisateur
+    (sauvegarde d'un véhicule, débit, crédit). Le jour fait partie de la clé :
+    les tranches de conformité, recalculées chaque nuit, ne restent pas figées.
+    """
+    today = today or datetime.date.today()
+    return {
+        name: get_or_set_for_user(DASHBOARD, user.pk, (name, today.isoformat()), lambda build=build: build(user))
+        for name, build in DASHBOARD_BLOCKS.items()
+    }
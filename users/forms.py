@@ -6,10 +6,9 @@ from django.contrib.auth.forms import UserCreationForm, UserChangeForm
 from django.core.validators import RegexValidator
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth.password_validation import validate_password
-from PIL import Image
-import pytesseract  # Utilisé pour l'OCR
 import phonenumbers
-from .models import CustomUser
+from .kyc import mark_identity_pending, schedule_identity_check
+from .models import CustomUser, validate_identity_document
 
 # Fonction de validation du numéro de téléphone (validation internationale)
 def validate_phone_number(value):
@@ -23,27 +22,6 @@ def validate_phone_number(value):
     except phonenumbers.NumberParseException:
         raise ValidationError("Le numéro de téléphone est invalide.")
 
-# Fonction de validation du document d'identité avec OCR
-def validate_identity_document(value):
-    """
-    Validate identity document by extension, size, and OCR text content.
-    """
-    allowed_extensions = ['pdf', 'jpg', 'jpeg', 'png']
-    extension = value.name.split('.')[-1].lower()
-    if extension not in allowed_extensions:
-        raise ValidationError("Le document d'identité doit être au format PDF, JPG, JPEG ou PNG.")
-    if value.size > 5 * 1024 * 1024:  # Limite de 5 Mo
-        raise ValidationError("Le document d'identité ne doit pas dépasser 5 Mo.")
-    
-    # Tentative de reconnaissance OCR pour vérifier si le fichier contient des informations pertinentes
-    try:
-        img = Image.open(value)
-        text = pytesseract.image_to_string(img)
-        if len(text.strip()) == 0:
-            raise ValidationError("Le fichier d'identité ne contient pas de texte pertinent.")
-    except Exception as e:
-        raise ValidationError(f"Erreur lors de la validation du document d'identité : {str(e)}")
-
 # Définition des chemins de téléchargement pour éviter les collisions de noms
 def identity_document_upload_path(instance, filename):
     extension = filename.split('.')[-1]
@@ -103,10 +81,16 @@ class CustomUserCreationForm(UserCreationForm):
     def save(self, commit=True):
         """
         Sauvegarde personnalisée de l'utilisateur.
+        Le document d'identité est accepté immédiatement et vérifié en tâche de fond.
         """
         user = super().save(commit=False)
+        identity_changed = 'identity_document' in self.changed_data and bool(user.identity_document)
+        if identity_changed:
+            mark_identity_pending(user)
         if commit:
             user.save()
+            if identity_changed:
+                schedule_identity_check(user)
         return user
 
 
@@ -149,8 +133,14 @@ class CustomUserChangeForm(UserChangeForm):
     def save(self, commit=True):
         """
         Sauvegarde personnalisée lors de la mise à jour.
+        Un nouveau document d'identité relance la vérification KYC en tâche de fond.
         """
         user = super().save(commit=False)
+        identity_changed = 'identity_document' in self.changed_data and bool(user.identity_document)
+        if identity_changed:
+            mark_identity_pending(user)
         if commit:
             user.save()
+            if identity_changed:
+                schedule_identity_check(user)
         return user
@@ -0,0 +1,116 @@
+import logging
+import time
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from core.normalization import normalize_plate
+from core.plate_index import get_plate_index
+from .models import TollStation
+from .tolls import DEBIT_OK, DEBIT_UNKNOWN_VEHICLE, Passage, debit_tolls_batch
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximal de lectures de plaques par appel
+GANTRY_MAX_RECORDS = 5000
+GANTRY_PAYMENT_METHOD = "Portique"
+
+# Issues propres à l'ingestion (en plus de celles de users.tolls)
+PASSAGE_INVALID = "invalid"
+PASSAGE_UNKNOWN_STATION = "unknown_station"
+
+
+class GantryReport:
+    def __init__(self, size):
+        self.results = [None] * size
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def set(self, index, status, **extra):
+        self.results[index] = {"index": index, "status": status, **extra}
+
+    def counts(self):
+        counts = {}
+        for result in self.results:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        return counts
+
+    def as_dict(self):
+        return {
+            "received": len(self.results),
+            "counts": self.counts(),
+            "elapsed_seconds": round(self.elapsed, 3),
+            "passages_per_second": round(len(self.results) / self.elapsed, 1) if self.elapsed else None,
+            "results": self.results,
+        }
+
+
+def _parse_record(record):
+    """
+    Renvoie (plaque normalisée, id de station, horodatage) ou None si la lecture
+    est invalide. L'horodatage du portique est obligatoire : il identifie le
+    passage et permet de reconnaître un lot rejoué.
+    """
+    if not isinstance(record, dict):
+        return None
+    plate = normalize_plate(str(record.get("plate") or ""))
+    try:
+        station_id = int(record.get("station"))
+    except (TypeError, ValueError):
+        return None
+    try:
+        timestamp = parse_datetime(record.get("timestamp"))
+    except (TypeError, ValueError):
+        return None
+    if not plate or timestamp is None:
+        return None
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    return plate, station_id, timestamp
+
+
+def ingest_passages(records, payment_method=GANTRY_PAYMENT_METHOD):
+    """
+    Ingestion d'un lot de lectures de portiques {plate, station, timestamp}.
+    Plaques résolues par l'index en mémoire, tarifs en une requête, puis débit et
+    création des transactions par debit_tolls_batch, qui écarte les lectures déjà
+    enregistrées (lot rejoué) ou répétées dans le lot. Renvoie un GantryReport
+    avec une issue par lecture, dans l'ordre reçu.
+    """
+    report = GantryReport(len(records))
+    parsed = {}
+    for index, record in enumerate(records):
+        values = _parse_record(record)
+        if values is None:
+            report.set(index, PASSAGE_INVALID)
+        else:
+            parsed[index] = values
+
+    # Index en mémoire : les plaques inconnues (étrangères, non inscrites) sont écartées
+    # par le filtre de Bloom, sans requête
+    vehicles = get_plate_index("tolls").lookup_many({plate for plate, _, _ in parsed.values()})
+    fees = dict(
+        TollStation.objects.filter(pk__in={station for _, station, _ in parsed.values()}).values_list("pk", "fee")
+    )
+
+    passages, indexes = [], []
+    for index, (plate, station_id, timestamp) in parsed.items():
+        if station_id not in fees:
+            report.set(index, PASSAGE_UNKNOWN_STATION)
+        elif plate not in vehicles:
+            report.set(index, DEBIT_UNKNOWN_VEHICLE)
+        else:
+            passages.append(Passage(vehicles[plate], station_id, fees[station_id], timestamp))
+            indexes.append(index)
+
+    for index, passage, result in zip(indexes, passages, debit_tolls_batch(passages, payment_method)):
+        if result.status == DEBIT_OK:
+            report.set(index, DEBIT_OK, transaction_id=result.transaction.pk, amount=str(passage.amount))
+        else:
+            report.set(index, result.status)
+
+    report.elapsed = time.monotonic() - report.started
+    logger.info(
+        "Portiques : %s lectures en %.3f s (%.0f passages/s)",
+        len(records), report.elapsed, len(records) / report.elapsed if report.elapsed else 0,
+    )
+    return report
+
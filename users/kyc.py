@@ -0,0 +1,106 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.db import transaction
+
+# Pool de processus dédié à l'OCR (créé à la demande dans chaque worker Celery)
+_ocr_pool = None
+
+
+class UnreadableDocument(Exception):
+    """Document illisible quel que soit le nombre d'essais (résultat définitif, mis en cache)."""
+
+
+def get_ocr_pool():
+    global _ocr_pool
+    if _ocr_pool is None:
+        _ocr_pool = ProcessPoolExecutor(max_workers=getattr(settings, "KYC_OCR_WORKERS", 2))
+    return _ocr_pool
+
+
+def reset_ocr_pool():
+    """Abandonne un pool cassé (processus OCR tué) : le prochain essai en recrée un."""
+    global _ocr_pool
+    if _ocr_pool is not None:
+        _ocr_pool.shutdown(wait=False, cancel_futures=True)
+        _ocr_pool = None
+
+
+def file_sha256(field_file, chunk_size=64 * 1024):
+    """Empreinte SHA-256 d'un fichier stocké, lu par blocs."""
+    digest = hashlib.sha256()
+    field_file.open("rb")
+    try:
+        for chunk in field_file.chunks(chunk_size):
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()
+
+
+def local_copy(field_file):
+    """
+    Renvoie (chemin local, temporaire?) : le pool OCR travaille sur un chemin,
+    les stockages distants (S3...) sont copiés dans un fichier temporaire.
+    """
+    try:
+        return field_file.path, False
+    except NotImplementedError:
+        extension = os.path.splitext(field_file.name)[1]
+        with tempfile.NamedTemporaryFile(suffix=extension, delete=False) as tmp:
+            field_file.open("rb")
+            try:
+                shutil.copyfileobj(field_file, tmp)
+            finally:
+                field_file.close()
+        return tmp.name, True
+
+
+def extract_text(path):
+    """
+    OCR d'un document d'identité (exécuté dans le pool de processus).
+    Les PDF sont rastérisés (première page) avant l'OCR. Lève
+    UnreadableDocument si le fichier lui-même est en cause ; toute autre
+    erreur (dépendance absente, tesseract arrêté...) est passagère.
+    """
+    from PIL import Image, UnidentifiedImageError
+    import pytesseract
+
+    if path.lower().endswith(".pdf"):
+        try:
+            from pdf2image import convert_from_path
+            from pdf2image.exceptions import PDFPageCountError, PDFSyntaxError
+        except ImportError as e:
+            raise ImportError("La lecture des PDF nécessite pdf2image.") from e
+        try:
+            pages = convert_from_path(path, first_page=1, last_page=1)
+        except (PDFPageCountError, PDFSyntaxError) as e:
+            raise UnreadableDocument(f"PDF illisible : {e}") from e
+        if not pages:
+            raise UnreadableDocument("Le PDF ne contient aucune page.")
+        image = pages[0]
+    else:
+        try:
+            image = Image.open(path)
+        except (UnidentifiedImageError, Image.DecompressionBombError) as e:
+            raise UnreadableDocument(f"Image illisible : {e}") from e
+    return pytesseract.image_to_string(image)
+
+
+def mark_identity_pending(user):
+    """Nouveau document : l'utilisateur repasse en attente de vérification."""
+    from .models import KYC_PENDING
+
+    user.kyc_status = KYC_PENDING
+    user.is_verified = False
+
+
+def schedule_identity_check(user):
+    """Lance l'OCR en tâche de fond une fois la transaction validée."""
+    from .tasks import process_identity_document
+
+    user_id = str(user.pk)
+    transaction.on_commit(lambda: process_identity_document.delay(user_id))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from users.partitions import PARTITION_MONTHS_AHEAD, ensure_partitions
+from users.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Crée les partitions mensuelles à venir des passages de péage et, sur demande, recalcule les cumuls."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+        parser.add_argument("--rebuild-rollups", action="store_true", help="Recalculer tous les cumuls mensuels")
+
+    def handle(self, *args, **options):
+        names = ensure_partitions(options["months_ahead"])
+        if names:
+            self.stdout.write(f"Partitions vérifiées : {', '.join(names)}")
+        else:
+            self.stdout.write("Table non partitionnée (base autre que PostgreSQL) : aucune partition créée.")
+        if options["rebuild_rollups"]:
+            count = rebuild_rollups()
+            self.stdout.write(self.style.SUCCESS(f"{count} cumuls mensuels recalculés."))
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='kyc_status',
+            field=models.CharField(choices=[('none', 'Aucun document'), ('pending', 'Vérification en cours'), ('verified', 'Vérifié'), ('rejected', 'Refusé')], default='none', help_text="État de la vérification du document d'identité.", max_length=10),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='identity_document_sha256',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='extracted_text',
+            field=models.TextField(blank=True, help_text="Texte extrait du document d'identité (OCR).", null=True),
+        ),
+        migrations.CreateModel(
+            name='IdentityDocumentScan',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('extracted_text', models.TextField(blank=True, default='')),
+                ('is_valid', models.BooleanField(default=False)),
+                ('error', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,171 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:00
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+# Copie figée de users/partitions.py au moment de la migration
+PARTITION_MONTHS_AHEAD = 3
+
+
+def month_start(value):
+    if isinstance(value, datetime.datetime):
+        value = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value.replace(day=1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table]
+    )
+    return cursor.fetchone() is not None
+
+
+def create_month_partition(cursor, quote, month, table):
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {quote(f'{table}_y{month.year}m{month.month:02d}')} "
+        f"PARTITION OF {quote(table)} FOR VALUES FROM (%s) TO (%s)",
+        [month.isoformat(), add_months(month, 1).isoformat()],
+    )
+
+
+def partition_toll_transactions(apps, schema_editor):
+    """
+    Convertit users_tolltransaction en table partitionnée par mois :
+    la table existante est renommée, la table partitionnée est créée avec les
+    mêmes colonnes (clé primaire (id, transaction_date), imposée par
+    PostgreSQL), les lignes sont recopiées, l'ancienne table supprimée, puis
+    les index des clés étrangères recréés sur la table partitionnée.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    TollTransaction = apps.get_model("users", "TollTransaction")
+    conn = schema_editor.connection
+    quote = conn.ops.quote_name
+    table = TollTransaction._meta.db_table
+    old_table = f"{table}_old"
+    sequence = f"{table}_id_part_seq"
+
+    with conn.cursor() as cursor:
+        if is_partitioned(cursor, table):
+            return
+        columns, constraints = [], []
+        for field in TollTransaction._meta.local_fields:
+            columns.append(
+                f"{quote(field.column)} {field.db_type(conn)} {'NULL' if field.null else 'NOT NULL'}"
+            )
+            if field.remote_field and field.db_constraint:
+                target = field.remote_field.model._meta
+                constraints.append(
+                    f"FOREIGN KEY ({quote(field.column)}) REFERENCES {quote(target.db_table)} "
+                    f"({quote(field.target_field.column)}) DEFERRABLE INITIALLY DEFERRED"
+                )
+        column_names = ", ".join(quote(field.column) for field in TollTransaction._meta.local_fields)
+
+        cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old_table)}")
+        cursor.execute(f"CREATE SEQUENCE {quote(sequence)}")
+        cursor.execute(
+            f"CREATE TABLE {quote(table)} ("
+            + ", ".join(columns + constraints + ['PRIMARY KEY ("id", "transaction_date")'])
+            + ") PARTITION BY RANGE (\"transaction_date\")"
+        )
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ALTER COLUMN \"id\" SET DEFAULT nextval(%s)", [sequence]
+        )
+        cursor.execute(f"ALTER SEQUENCE {quote(sequence)} OWNED BY {quote(table)}.\"id\"")
+
+        # Une partition par mois couvert par l'historique, plus une partition par défaut
+        cursor.execute(f"SELECT MIN(\"transaction_date\") FROM {quote(old_table)}")
+        oldest = cursor.fetchone()[0]
+        current = month_start(timezone.now())
+        month = month_start(oldest) if oldest else current
+        while month <= add_months(current, PARTITION_MONTHS_AHEAD):
+            create_month_partition(cursor, quote, month, table)
+            month = add_months(month, 1)
+        cursor.execute(
+            f"CREATE TABLE {quote(table + '_default')} PARTITION OF {quote(table)} DEFAULT"
+        )
+
+        cursor.execute(
+            f"INSERT INTO {quote(table)} ({column_names}) SELECT {column_names} FROM {quote(old_table)}"
+        )
+        cursor.execute(
+            f"SELECT setval(%s, COALESCE((SELECT MAX(\"id\") FROM {quote(old_table)}), 0) + 1, false)",
+            [sequence],
+        )
+        cursor.execute(f"DROP TABLE {quote(old_table)}")
+
+    # Index des clés étrangères (user, vehicle, toll_station), partis avec l'ancienne table
+    # et toujours présents dans l'état des migrations ; mêmes noms qu'à la création
+    for field in TollTransaction._meta.local_fields:
+        if field.db_index and not field.unique:
+            schema_editor.execute(schema_editor._create_index_sql(TollTransaction, fields=[field]))
+
+
+def populate_rollups(apps, schema_editor):
+    TollTransaction = apps.get_model("users", "TollTransaction")
+    TollMonthlyRollup = apps.get_model("users", "TollMonthlyRollup")
+    totals = {}
+    rows = TollTransaction.objects.values_list("user_id", "vehicle_id", "transaction_date", "amount")
+    for user_id, vehicle_id, transaction_date, amount in rows.iterator(chunk_size=2000):
+        key = (user_id, vehicle_id, month_start(transaction_date))
+        count, total = totals.get(key, (0, 0))
+        totals[key] = (count + 1, total + amount)
+    TollMonthlyRollup.objects.bulk_create(
+        [
+            TollMonthlyRollup(user_id=user_id, vehicle_id=vehicle_id, month=month,
+                              transaction_count=count, total_amount=total)
+            for (user_id, vehicle_id, month), (count, total) in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_customuser_kyc'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofiletolltransaction',
+            name='toll_transaction',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='users.tolltransaction'),
+        ),
+        # PostgreSQL uniquement : conversion en table partitionnée par mois
+        migrations.RunPython(partition_toll_transactions, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tolltransaction',
+            index=models.Index(fields=['user', '-transaction_date', '-id'], name='users_toll_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tolltransaction',
+            index=models.Index(fields=['vehicle', '-transaction_date'], name='users_toll_vehicle_date_idx'),
+        ),
+        migrations.CreateModel(
+            name='TollMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Premier jour du mois.')),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='toll_rollups', to=settings.AUTH_USER_MODEL)),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='toll_rollups', to='users.vehicle')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'vehicle', 'month'), name='users_toll_rollup_unique')],
+                'indexes': [models.Index(fields=['user', '-month'], name='users_toll_rollup_month_idx')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+from core.normalization import normalize_plate
+
+
+def populate_plate_keys(apps, schema_editor):
+    Vehicle = apps.get_model("users", "Vehicle")
+    vehicles = list(Vehicle.objects.only("pk", "registration_number"))
+    for vehicle in vehicles:
+        vehicle.plate_key = normalize_plate(vehicle.registration_number)
+    Vehicle.objects.bulk_update(vehicles, ["plate_key"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_toll_partitions_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='plate_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='tolltransaction',
+            name='transaction_date',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(populate_plate_keys, migrations.RunPython.noop),
+    ]
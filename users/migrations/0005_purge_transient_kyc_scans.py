@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:00
+
+from django.db import migrations
+
+
+def purge_transient_scans(apps, schema_editor):
+    """
+    Les erreurs passagères (délai dépassé, pdf2image absent...) étaient mises
+    en cache comme des refus définitifs : ces documents seront réanalysés.
+    """
+    IdentityDocumentScan = apps.get_model('users', 'IdentityDocumentScan')
+    IdentityDocumentScan.objects.filter(is_valid=False, error__startswith='Erreur OCR').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_gantry_ingestion'),
+    ]
+
+    operations = [
+        migrations.RunPython(purge_transient_scans, migrations.RunPython.noop),
+    ]
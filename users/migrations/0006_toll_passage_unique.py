@@ -0,0 +1,67 @@
+# Generated by Django 5.1.6 on 2026-10-18 21:00
+
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+
+def month_start(value):
+    # Copie figée de users.partitions.month_start
+    if isinstance(value, datetime.datetime):
+        value = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value.replace(day=1)
+
+
+def remove_duplicate_passages(apps, schema_editor):
+    """
+    Passages enregistrés plusieurs fois (lots de portiques rejoués) : seul le
+    premier est conservé ; les doublons sont remboursés sur le véhicule et
+    retirés des cumuls mensuels.
+    """
+    TollTransaction = apps.get_model("users", "TollTransaction")
+    TollMonthlyRollup = apps.get_model("users", "TollMonthlyRollup")
+    Vehicle = apps.get_model("users", "Vehicle")
+    duplicated = (
+        TollTransaction.objects.values("vehicle_id", "toll_station_id", "transaction_date")
+        .annotate(count=Count("id"), first_id=Min("id"))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    for group in duplicated.iterator():
+        extra = TollTransaction.objects.filter(
+            vehicle_id=group["vehicle_id"],
+            toll_station_id=group["toll_station_id"],
+            transaction_date=group["transaction_date"],
+        ).exclude(pk=group["first_id"])
+        for toll_transaction in extra:
+            Vehicle.objects.filter(pk=toll_transaction.vehicle_id).update(
+                toll_balance=F("toll_balance") + toll_transaction.amount
+            )
+            TollMonthlyRollup.objects.filter(
+                user_id=toll_transaction.user_id,
+                vehicle_id=toll_transaction.vehicle_id,
+                month=month_start(toll_transaction.transaction_date),
+            ).update(
+                transaction_count=F("transaction_count") - 1,
+                total_amount=F("total_amount") - toll_transaction.amount,
+            )
+            toll_transaction.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_purge_transient_kyc_scans'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_passages, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tolltransaction',
+            constraint=models.UniqueConstraint(
+                fields=('vehicle', 'toll_station', 'transaction_date'), name='users_toll_passage_unique'
+            ),
+        ),
+    ]
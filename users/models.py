@@ -1,17 +1,19 @@
 import uuid
+from decimal import Decimal
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.utils.translation import gettext_lazy as _
 from encrypted_model_fields.fields import EncryptedCharField
 from django.conf import settings
-from PIL import Image
-import pytesseract  # OCR pour validation de document
+from django.utils import timezone
 import phonenumbers
 import re
 import django.apps
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth import get_user_model
+from core.cache import invalidate_user_on_commit
+from core.uploads import DOCUMENT_KINDS, validate_upload
 
 
 
@@ -27,23 +29,11 @@ def validate_phone_number(value):
         raise ValidationError("Le numéro de téléphone est invalide.")
 
 
-# Fonction de validation du fichier d'identité avec OCR
+# Fonction de validation du fichier d'identité.
+# Contrôles légers uniquement : l'OCR est fait en tâche de fond (voir users/tasks.py).
+# Extension, taille et signature (déjà vérifiées pendant la réception, voir core/uploads.py).
 def validate_identity_document(value):
-    allowed_extensions = ['pdf', 'jpg', 'jpeg', 'png']
-    extension = value.name.split('.')[-1].lower()
-    if extension not in allowed_extensions:
-        raise ValidationError("Le document d'identité doit être au format PDF, JPG, JPEG ou PNG.")
-    if value.size > 5 * 1024 * 1024:  # Limite de 5 Mo
-        raise ValidationError("Le document d'identité ne doit pas dépasser 5 Mo.")
-
-    # Vérification OCR
-    try:
-        img = Image.open(value)
-        text = pytesseract.image_to_string(img)
-        if len(text.strip()) == 0:
-            raise ValidationError("Le fichier d'identité ne contient pas de texte pertinent.")
-    except Exception as e:
-        raise ValidationError(f"Erreur OCR : {str(e)}")
+    validate_upload(value, DOCUMENT_KINDS)
 
 
 # Fonction pour renommer les fichiers d'identité
@@ -58,6 +48,19 @@ def avatar_upload_path(instance, filename):
     return f"avatars/{instance.id}_{uuid.uuid4()}.{extension}"
 
 
+# États de la vérification KYC
+KYC_NONE = "none"
+KYC_PENDING = "pending"
+KYC_VERIFIED = "verified"
+KYC_REJECTED = "rejected"
+KYC_STATUS_CHOICES = [
+    (KYC_NONE, "Aucun document"),
+    (KYC_PENDING, "Vérification en cours"),
+    (KYC_VERIFIED, "Vérifié"),
+    (KYC_REJECTED, "Refusé"),
+]
+
+
 # Modèle utilisateur personnalisé
 class CustomUser(AbstractUser):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, unique=True)
@@ -74,6 +77,12 @@ class CustomUser(AbstractUser):
         validators=[validate_identity_document]
     )
     is_verified = models.BooleanField(default=False, help_text="Indique si l'utilisateur a été vérifié via KYC.")
+    kyc_status = models.CharField(
+        max_length=10, choices=KYC_STATUS_CHOICES, default=KYC_NONE,
+        help_text="État de la vérification du document d'identité."
+    )
+    identity_document_sha256 = models.CharField(max_length=64, blank=True, default="", db_index=True, editable=False)
+    extracted_text = models.TextField(blank=True, null=True, help_text="Texte extrait du document d'identité (OCR).")
     is_active = models.BooleanField(default=False, help_text="Compte activé après vérification.")
     role = models.CharField(
         max_length=10, choices=[('admin', 'Administrateur'), ('user', 'Utilisateur')],
@@ -108,6 +117,19 @@ class CustomUser(AbstractUser):
         verbose_name = "Utilisateur"
         verbose_name_plural = "Utilisateurs"
 
+# Résultat OCR mis en cache par empreinte SHA-256 du fichier :
+# un même document n'est jamais analysé deux fois.
+class IdentityDocumentScan(models.Model):
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    extracted_text = models.TextField(blank=True, default="")
+    is_valid = models.BooleanField(default=False)
+    error = models.CharField(max_length=255, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({'valide' if self.is_valid else 'invalide'})"
+
+
 User = get_user_model()  # Utilise la fonction get_user_model() pour récupérer le modèle d'utilisateur personnalisé
 # Modèle de station de péage
 class TollStation(models.Model):
@@ -130,14 +152,24 @@ class Vehicle(models.Model):
     color = models.CharField(max_length=50)
     serial_number = models.CharField(max_length=100, unique=True)
     toll_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Plaque normalisée (core.normalization.normalize_plate), clé de lecture des portiques
+    plate_key = models.CharField(max_length=100, db_index=True, editable=False, default="")
 
     def __str__(self):
         return f"{self.brand} {self.model} ({self.registration_number})"
 
     def update_balance(self, amount):
-        """Met à jour le solde du véhicule pour le péage"""
-        self.toll_balance -= amount
-        self.save()
+        """
+        Débite le solde du véhicule pour le péage.
+        Mise à jour conditionnelle en base : renvoie False si le solde est insuffisant.
+        """
+        updated = Vehicle.objects.filter(pk=self.pk, toll_balance__gte=amount).update(
+            toll_balance=models.F('toll_balance') - amount
+        )
+        if updated:
+            invalidate_user_on_commit(self.owner_id)
+        self.refresh_from_db(fields=['toll_balance'])
+        return bool(updated)
 
 
 # Modèle de transaction de péage
@@ -145,15 +177,56 @@ class TollTransaction(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="toll_transactions")
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name="toll_transactions")
     toll_station = models.ForeignKey(TollStation, on_delete=models.CASCADE)
-    transaction_date = models.DateTimeField(auto_now_add=True)
+    # Horodatage du passage : fourni par le portique, sinon date d'enregistrement
+    transaction_date = models.DateTimeField(default=timezone.now)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     paid = models.BooleanField(default=False)
     payment_method = models.CharField(max_length=255, null=True, blank=True)
 
+    class Meta:
+        # Sous PostgreSQL, la table est partitionnée par mois sur transaction_date
+        # (voir users/partitions.py) : filtrer sur la date limite la lecture aux partitions utiles.
+        indexes = [
+            models.Index(fields=['user', '-transaction_date', '-id'], name='users_toll_user_date_idx'),
+            models.Index(fields=['vehicle', '-transaction_date'], name='users_toll_vehicle_date_idx'),
+        ]
+        # Un passage = un véhicule à une station à un instant : un lot de portique rejoué
+        # n'est jamais enregistré (ni débité) deux fois. Inclut la clé de partitionnement.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['vehicle', 'toll_station', 'transaction_date'], name='users_toll_passage_unique'
+            ),
+        ]
+
     def __str__(self):
         return f"Transaction {self.id} - {self.vehicle} - {self.amount}€"
 
 
+# Cumuls mensuels des péages par utilisateur et par véhicule, mis à jour à chaque débit
+class TollMonthlyRollup(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="toll_rollups")
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name="toll_rollups")
+    month = models.DateField(help_text="Premier jour du mois.")
+    transaction_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'vehicle', 'month'], name='users_toll_rollup_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-month'], name='users_toll_rollup_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle} - {self.month:%m/%Y} : {self.total_amount}€"
+
+
+# Plus grand solde représentable par toll_balance (numeric(10, 2))
+MAX_TOLL_BALANCE = Decimal('99999999.99')
+
+
 # Modèle de profil utilisateur
 class UserProfile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="profile")
@@ -165,20 +238,38 @@ class UserProfile(models.Model):
         return self.user.username
 
     def add_funds(self, amount):
-        """Ajoute des fonds au solde de péage de l'utilisateur."""
-        self.toll_balance += amount
-        self.save()
+        """
+        Ajoute des fonds au solde de péage de l'utilisateur (incrément atomique en base).
+        Mise à jour conditionnelle : renvoie False si le solde dépasserait MAX_TOLL_BALANCE.
+        """
+        updated = UserProfile.objects.filter(pk=self.pk, toll_balance__lte=MAX_TOLL_BALANCE - amount).update(
+            toll_balance=models.F('toll_balance') + amount
+        )
+        if updated:
+            invalidate_user_on_commit(self.user_id)
+        self.refresh_from_db(fields=['toll_balance'])
+        return bool(updated)
 
     def deduct_funds(self, amount):
-        """Déduit des fonds du solde de péage de l'utilisateur."""
-        self.toll_balance -= amount
-        self.save()
+        """
+        Déduit des fonds du solde de péage de l'utilisateur.
+        Mise à jour conditionnelle : renvoie False si le solde est insuffisant.
+        """
+        updated = UserProfile.objects.filter(pk=self.pk, toll_balance__gte=amount).update(
+            toll_balance=models.F('toll_balance') - amount
+        )
+        if updated:
+            invalidate_user_on_commit(self.user_id)
+        self.refresh_from_db(fields=['toll_balance'])
+        return bool(updated)
 
 
 # Modèle intermédiaire pour la relation UserProfile-TollTransaction
 class UserProfileTollTransaction(models.Model):
     user_profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
-    toll_transaction = models.ForeignKey(TollTransaction, on_delete=models.CASCADE)
+    # Pas de contrainte en base : PostgreSQL n'accepte pas de clé étrangère vers
+    # une table partitionnée dont la clé primaire n'est pas (id, transaction_date)
+    toll_transaction = models.ForeignKey(TollTransaction, on_delete=models.CASCADE, db_constraint=False)
 
     def __str__(self):
         return f"Transaction de {self.user_profile} - {self.toll_transaction}"
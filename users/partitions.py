@@ -0,0 +1,61 @@
+import datetime
+from django.db import connection
+from django.utils import timezone
+
+# Table des passages, partitionnée par mois sur transaction_date (PostgreSQL)
+TOLL_TRANSACTION_TABLE = "users_tolltransaction"
+# Partitions créées à l'avance, au-delà du mois courant
+PARTITION_MONTHS_AHEAD = 3
+
+
+def month_start(value):
+    """Premier jour du mois d'une date ou d'un datetime (heure locale)."""
+    if isinstance(value, datetime.datetime):
+        value = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value.replace(day=1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month, table=TOLL_TRANSACTION_TABLE):
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def is_partitioned(cursor, table=TOLL_TRANSACTION_TABLE):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [table]
+    )
+    return cursor.fetchone() is not None
+
+
+def create_month_partition(cursor, month, table=TOLL_TRANSACTION_TABLE):
+    quote = connection.ops.quote_name
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {quote(partition_name(month, table))} "
+        f"PARTITION OF {quote(table)} FOR VALUES FROM (%s) TO (%s)",
+        [month.isoformat(), add_months(month, 1).isoformat()],
+    )
+
+
+def ensure_partitions(months_ahead=PARTITION_MONTHS_AHEAD, start=None):
+    """
+    Crée les partitions mensuelles manquantes, du mois courant jusqu'à
+    months_ahead mois plus tard. Sans effet hors PostgreSQL ou si la table
+    n'est pas partitionnée. Renvoie les noms des partitions vérifiées.
+    """
+    if connection.vendor != "postgresql":
+        return []
+    month = month_start(start or timezone.now())
+    names = []
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            return []
+        for offset in range(months_ahead + 1):
+            current = add_months(month, offset)
+            create_month_partition(cursor, current)
+            names.append(partition_name(current))
+    return names
+
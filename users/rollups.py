@@ -0,0 +1,112 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from core.cache import invalidate_user
+from .models import TollMonthlyRollup, TollTransaction
+from .partitions import add_months, month_start
+
+# Nombre de mois de cumuls affichés dans l'historique
+ROLLUP_MONTHS = 12
+
+
+def _upsert_sql():
+    quote = connection.ops.quote_name
+    table = quote(TollMonthlyRollup._meta.db_table)
+    # Syntaxe ON CONFLICT commune à PostgreSQL et SQLite
+    return (
+        f"INSERT INTO {table} (user_id, vehicle_id, month, transaction_count, total_amount, updated_at) "
+        f"VALUES (%s, %s, %s, %s, %s, %s) "
+        f"ON CONFLICT (user_id, vehicle_id, month) DO UPDATE SET "
+        f"transaction_count = {table}.transaction_count + EXCLUDED.transaction_count, "
+        f"total_amount = {table}.total_amount + EXCLUDED.total_amount, "
+        f"updated_at = EXCLUDED.updated_at"
+    )
+
+
+def record_toll_transactions(toll_transactions):
+    """
+    Ajoute des passages enregistrés aux cumuls mensuels (utilisateur, véhicule, mois).
+    Les passages sont agrégés en mémoire puis appliqués en une seule requête
+    d'upsert ; à appeler dans la transaction qui enregistre les passages.
+    """
+    totals = defaultdict(lambda: [0, Decimal("0")])
+    for toll_transaction in toll_transactions:
+        key = (toll_transaction.user_id, toll_transaction.vehicle_id, month_start(toll_transaction.transaction_date))
+        totals[key][0] += 1
+        totals[key][1] += Decimal(toll_transaction.amount)
+    if not totals:
+        return 0
+
+    ops = connection.ops
+    user_field = TollMonthlyRollup._meta.get_field("user")
+    now = ops.adapt_datetimefield_value(timezone.now())
+    # Ordre stable des clés : verrous pris dans le même ordre par tous les débits.
+    # Valeurs converties au format de la base (UUID en hexadécimal sous SQLite).
+    rows = [
+        (
+            user_field.get_db_prep_value(user_id, connection), vehicle_id, ops.adapt_datefield_value(month),
+            count, ops.adapt_decimalfield_value(amount, 12, 2), now,
+        )
+        for (user_id, vehicle_id, month), (count, amount) in sorted(totals.items())
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(_upsert_sql(), rows)
+    return len(rows)
+
+
+def rebuild_rollups(user=None):
+    """Recalcule les cumuls mensuels depuis les passages (tous, ou ceux d'un utilisateur)."""
+    transactions = TollTransaction.objects.all()
+    rollups = TollMonthlyRollup.objects.all()
+    if user is not None:
+        transactions = transactions.filter(user=user)
+        rollups = rollups.filter(user=user)
+    aggregated = (
+        transactions.annotate(month=TruncMonth("transaction_date"))
+        .values("user_id", "vehicle_id", "month")
+        .annotate(transaction_count=Count("id"), total_amount=Sum("amount"))
+        .order_by()
+    )
+    with transaction.atomic():
+        rollups.delete()
+        created = TollMonthlyRollup.objects.bulk_create(
+            [
+                TollMonthlyRollup(
+                    user_id=row["user_id"],
+                    vehicle_id=row["vehicle_id"],
+                    month=month_start(row["month"]),
+                    transaction_count=row["transaction_count"],
+                    total_amount=row["total_amount"],
+                )
+                for row in aggregated.iterator()
+            ],
+            batch_size=1000,
+        )
+    if user is not None:
+        transaction.on_commit(lambda: invalidate_user(user.pk))
+    return len(created)
+
+
+def monthly_totals(user, months=ROLLUP_MONTHS):
+    """Totaux par mois (tous véhicules confondus) des derniers mois, du plus récent au plus ancien."""
+    since = add_months(month_start(timezone.now()), -(months - 1))
+    return list(
+        TollMonthlyRollup.objects.filter(user=user, month__gte=since)
+        .values("month")
+        .annotate(transaction_count=Sum("transaction_count"), total_amount=Sum("total_amount"))
+        .order_by("-month")
+    )
+
+
+def vehicle_totals(user, months=ROLLUP_MONTHS):
+    """Totaux par véhicule sur la même période."""
+    since = add_months(month_start(timezone.now()), -(months - 1))
+    return list(
+        TollMonthlyRollup.objects.filter(user=user, month__gte=since)
+        .values("vehicle_id", "vehicle__registration_number")
+        .annotate(transaction_count=Sum("transaction_count"), total_amount=Sum("total_amount"))
+        .order_by("vehicle__registration_number")
+    )
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.db import transaction
+from core.cache import invalidate_user_on_commit
+from core.normalization import normalize_plate
+from core.plate_index import get_plate_index
+from .models import UserProfile, Vehicle
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile_cache(sender, instance, **kwargs):
+    invalidate_user_on_commit(instance.user_id)
+
+
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+def invalidate_toll_vehicle_cache(sender, instance, **kwargs):
+    invalidate_user_on_commit(instance.owner_id)
+
+
+@receiver(pre_save, sender=Vehicle)
+def set_plate_key(sender, instance, **kwargs):
+    instance.plate_key = normalize_plate(instance.registration_number)
+
+
+@receiver(post_save, sender=Vehicle)
+def update_plate_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: get_plate_index("tolls").update(instance.pk, instance.plate_key))
+
+
+@receiver(post_delete, sender=Vehicle)
+def remove_from_plate_index(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: get_plate_index("tolls").remove(pk))
@@ -0,0 +1,79 @@
+import logging
+import os
+from concurrent.futures.process import BrokenProcessPool
+from celery import shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from .kyc import UnreadableDocument, extract_text, file_sha256, get_ocr_pool, local_copy, reset_ocr_pool
+from .models import IdentityDocumentScan, KYC_REJECTED, KYC_VERIFIED
+from .partitions import ensure_partitions
+
+logger = logging.getLogger(__name__)
+
+
+def _scan_document(field_file, sha256):
+    """
+    Lance l'OCR dans le pool de processus et enregistre le résultat dans le
+    cache. Seuls les résultats définitifs sont enregistrés : une erreur
+    passagère (délai dépassé, pool cassé, dépendance absente) est propagée
+    pour que la tâche soit relancée.
+    """
+    path, is_temporary = local_copy(field_file)
+    try:
+        future = get_ocr_pool().submit(extract_text, path)
+        text = future.result(timeout=getattr(settings, "KYC_OCR_TIMEOUT", 60))
+        error = "" if text.strip() else "Le fichier d'identité ne contient pas de texte pertinent."
+    except UnreadableDocument as e:
+        logger.info("Document d'identité illisible %s : %s", field_file.name, e)
+        text, error = "", str(e)[:255]
+    except BrokenProcessPool:
+        reset_ocr_pool()
+        raise
+    finally:
+        if is_temporary:
+            os.unlink(path)
+
+    scan, _ = IdentityDocumentScan.objects.get_or_create(
+        sha256=sha256,
+        defaults={"extracted_text": text, "is_valid": not error, "error": error},
+    )
+    return scan
+
+
+@shared_task(
+    autoretry_for=(Exception,), retry_backoff=True, retry_backoff_max=600,
+    max_retries=getattr(settings, "KYC_OCR_MAX_RETRIES", 5),
+)
+def process_identity_document(user_id):
+    """
+    Vérification KYC asynchrone d'un document d'identité.
+    Le résultat OCR est mis en cache par SHA-256 : un document déjà analysé
+    n'est pas retraité. Les erreurs passagères relancent la tâche (délai
+    croissant) sans rien mettre en cache.
+    """
+    User = get_user_model()
+    user = User.objects.only("pk", "identity_document").filter(pk=user_id).first()
+    if user is None or not user.identity_document:
+        return "Aucun document à vérifier."
+
+    document_name = user.identity_document.name
+    sha256 = file_sha256(user.identity_document)
+    scan = IdentityDocumentScan.objects.filter(sha256=sha256).first()
+    if scan is None:
+        scan = _scan_document(user.identity_document, sha256)
+
+    # Le filtre sur le nom ignore un résultat devenu obsolète (document remplacé entre-temps)
+    User.objects.filter(pk=user_id, identity_document=document_name).update(
+        identity_document_sha256=sha256,
+        extracted_text=scan.extracted_text,
+        is_verified=scan.is_valid,
+        kyc_status=KYC_VERIFIED if scan.is_valid else KYC_REJECTED,
+    )
+    return f"Document {sha256[:12]} : {'vérifié' if scan.is_valid else 'refusé'}."
+
+
+@shared_task
+def ensure_toll_partitions():
+    """Crée à l'avance les partitions mensuelles de la table des passages."""
+    names = ensure_partitions()
+    return f"{len(names)} partitions vérifiées."
@@ -1,3 +1,363 @@
-from django.test import TestCase
+import datetime
+import json
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future
+from decimal import Decimal
+from unittest import mock, skipIf
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from core.plate_index import invalidate_plate_indexes
+from vehicles.models import Brand, VehicleModel
+from vehicles.tests import create_vehicle
+from .dashboard import balance_summary, get_dashboard
+from .kyc import UnreadableDocument
+from .models import (
+    KYC_REJECTED, KYC_VERIFIED, IdentityDocumentScan, TollMonthlyRollup, TollStation, TollTransaction,
+    UserProfile, Vehicle,
+)
+from .rollups import monthly_totals, rebuild_rollups
+from .tasks import process_identity_document
+from .tolls import (
+    DEBIT_DUPLICATE, DEBIT_INSUFFICIENT_FUNDS, DEBIT_OK, DEBIT_UNKNOWN_VEHICLE,
+    InsufficientBalance, Passage, debit_toll, debit_tolls_batch,
+)
 
-# Create your tests here.
+
+def create_toll_account(username, balance, registration_number="AB123CD"):
+    user = get_user_model().objects.create_user(username=username, password="Secret123!", is_active=True)
+    vehicle = Vehicle.objects.create(
+        owner=user, registration_number=registration_number, model="Clio", brand="Renault",
+        year=2020, color="Rouge", serial_number=f"SN-{registration_number}", toll_balance=balance,
+    )
+    return user, vehicle
+
+
+class IdentityCheckTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = get_user_model().objects.create_user(username="kyc", password="Secret123!")
+        self.user.identity_document.save("identite.png", ContentFile(b"\x89PNG\r\n\x1a\n carte"))
+
+    def ocr(self, text=None, error=None):
+        future = Future()
+        if error is None:
+            future.set_result(text)
+        else:
+            future.set_exception(error)
+        pool = mock.Mock()
+        pool.submit.return_value = future
+        return mock.patch("users.tasks.get_ocr_pool", return_value=pool)
+
+    def test_result_is_cached_by_sha256(self):
+        with self.ocr("REPUBLIQUE FRANCAISE DUPONT") as pool:
+            process_identity_document(str(self.user.pk))
+            process_identity_document(str(self.user.pk))
+        pool.return_value.submit.assert_called_once()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.kyc_status, KYC_VERIFIED)
+        self.assertTrue(IdentityDocumentScan.objects.get(sha256=self.user.identity_document_sha256).is_valid)
+
+    def test_unreadable_document_is_rejected_for_good(self):
+        with self.ocr(error=UnreadableDocument("Image illisible")):
+            process_identity_document(str(self.user.pk))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.kyc_status, KYC_REJECTED)
+        self.assertEqual(IdentityDocumentScan.objects.get().error, "Image illisible")
+
+    def test_transient_errors_are_retried_not_cached(self):
+        for error in (TimeoutError(), ImportError("La lecture des PDF nécessite pdf2image.")):
+            with self.ocr(error=error), self.assertRaises(type(error)):
+                # Appel direct : Celery relève l'erreur au lieu de replanifier la tâche
+                process_identity_document(str(self.user.pk))
+        self.assertFalse(IdentityDocumentScan.objects.exists())
+        self.user.refresh_from_db()
+        self.assertNotEqual(self.user.kyc_status, KYC_REJECTED)
+
+        with self.ocr("REPUBLIQUE FRANCAISE DUPONT"):
+            process_identity_document(str(self.user.pk))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.kyc_status, KYC_VERIFIED)
+
+
+class TollDebitTests(TestCase):
+    def setUp(self):
+        self.user, self.vehicle = create_toll_account("alice", Decimal("10.00"))
+        self.station = TollStation.objects.create(name="A1 Nord", location="Senlis", fee=Decimal("4.00"), route="A1")
+
+    def test_debit_records_transaction(self):
+        toll_transaction = debit_toll(self.vehicle, self.station)
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.toll_balance, Decimal("6.00"))
+        self.assertEqual(toll_transaction.user, self.user)
+        self.assertTrue(toll_transaction.paid)
+
+    def test_insufficient_balance_leaves_no_trace(self):
+        debit_toll(self.vehicle, self.station)
+        debit_toll(self.vehicle, self.station)
+        with self.assertRaises(InsufficientBalance):
+            debit_toll(self.vehicle, self.station)
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.toll_balance, Decimal("2.00"))
+        self.assertEqual(TollTransaction.objects.count(), 2)
+
+    def test_batch_debit(self):
+        _, other = create_toll_account("bob", Decimal("100.00"), "XY987ZT")
+        now = timezone.now()
+        passages = [
+            Passage(self.vehicle.pk, self.station.pk, self.station.fee, now),
+            Passage(other.pk, self.station.pk, self.station.fee, now),
+            Passage(self.vehicle.pk, self.station.pk, self.station.fee, now + datetime.timedelta(minutes=1)),
+            Passage(self.vehicle.pk, self.station.pk, self.station.fee, now + datetime.timedelta(minutes=1)),
+            Passage(self.vehicle.pk, self.station.pk, self.station.fee, now + datetime.timedelta(minutes=2)),
+            Passage(999999, self.station.pk, self.station.fee, now),
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            results = debit_tolls_batch(passages)
+        statements = [q for q in queries.captured_queries if "SAVEPOINT" not in q["sql"]]
+        # Verrouillage, passages déjà enregistrés, insertion et relecture des transactions,
+        # suppression du passage non couvert, mise à jour des soldes, cumuls mensuels
+        self.assertEqual(len(statements), 7)
+        self.assertEqual(
+            [result.status for result in results],
+            [DEBIT_OK, DEBIT_OK, DEBIT_OK, DEBIT_DUPLICATE, DEBIT_INSUFFICIENT_FUNDS, DEBIT_UNKNOWN_VEHICLE],
+        )
+        self.assertTrue(all(result.transaction.pk for result in results[:3]))
+        self.vehicle.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.vehicle.toll_balance, Decimal("2.00"))
+        self.assertEqual(other.toll_balance, Decimal("96.00"))
+        self.assertEqual(TollTransaction.objects.count(), 3)
+
+    def test_conflicting_passages_are_neither_inserted_nor_debited(self):
+        now = timezone.now()
+        recorded = debit_tolls_batch([Passage(self.vehicle.pk, self.station.pk, self.station.fee, now)])[0]
+        # Passage enregistré mais absent de la lecture préalable (écrit sans verrou sur le véhicule)
+        def filter_without_existing(*args, **kwargs):
+            queryset = TollTransaction.objects.all()
+            return queryset.none() if "transaction_date__gte" in kwargs else queryset.filter(*args, **kwargs)
+
+        with mock.patch.object(TollTransaction.objects, "filter", side_effect=filter_without_existing):
+            results = debit_tolls_batch([
+                Passage(self.vehicle.pk, self.station.pk, self.station.fee, now),
+                Passage(self.vehicle.pk, self.station.pk, self.station.fee, now + datetime.timedelta(minutes=1)),
+            ])
+        self.assertEqual([result.status for result in results], [DEBIT_DUPLICATE, DEBIT_OK])
+        self.assertNotEqual(results[1].transaction.pk, recorded.transaction.pk)
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.toll_balance, Decimal("2.00"))
+        self.assertEqual(TollTransaction.objects.count(), 2)
+
+
+class AddFundsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="credit", password="Secret123!", is_active=True)
+        self.client.force_login(self.user)
+
+    def post(self, amount):
+        return self.client.post(reverse("add_funds"), {"amount": amount}, secure=True)
+
+    def test_invalid_amounts_are_rejected(self):
+        for amount in ("NaN", "sNaN", "Infinity", "-Infinity", "-5", "0", "0.001", "abc", "1e999999"):
+            self.assertEqual(self.post(amount).status_code, 400, amount)
+        self.assertFalse(UserProfile.objects.filter(user=self.user, toll_balance__gt=0).exists())
+
+    def test_amounts_beyond_the_maximum_are_rejected(self):
+        for amount in ("10000.01", "1e12"):
+            response = self.post(amount)
+            self.assertEqual(response.status_code, 400, amount)
+            self.assertIn("Montant maximal", response.json()["error"])
+        UserProfile.objects.create(user=self.user, toll_balance=Decimal("99999999.00"))
+        self.assertEqual(self.post("10").status_code, 400)
+        self.assertEqual(UserProfile.objects.get(user=self.user).toll_balance, Decimal("99999999.00"))
+
+    def test_amount_is_rounded_to_cents(self):
+        response = self.post("12.5")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UserProfile.objects.get(user=self.user).toll_balance, Decimal("12.50"))
+        self.post("0.104")
+        self.assertEqual(UserProfile.objects.get(user=self.user).toll_balance, Decimal("12.60"))
+
+
+class TollRollupTests(TestCase):
+    def setUp(self):
+        self.user, self.vehicle = create_toll_account("dave", Decimal("100.00"))
+        self.station = TollStation.objects.create(name="A4 Est", location="Reims", fee=Decimal("2.50"), route="A4")
+
+    def test_debits_update_monthly_rollup(self):
+        debit_toll(self.vehicle, self.station)
+        now = timezone.now()
+        debit_tolls_batch([
+            Passage(self.vehicle.pk, self.station.pk, self.station.fee, now + datetime.timedelta(minutes=minutes))
+            for minutes in range(3)
+        ])
+        rollup = TollMonthlyRollup.objects.get(user=self.user, vehicle=self.vehicle)
+        self.assertEqual(rollup.transaction_count, 4)
+        self.assertEqual(rollup.total_amount, Decimal("10.00"))
+        self.assertEqual(monthly_totals(self.user)[0]["total_amount"], Decimal("10.00"))
+
+    def test_rebuild_matches_incremental(self):
+        for _ in range(3):
+            debit_toll(self.vehicle, self.station)
+        incremental = list(TollMonthlyRollup.objects.values_list("month", "transaction_count", "total_amount"))
+        rebuild_rollups()
+        rebuilt = list(TollMonthlyRollup.objects.values_list("month", "transaction_count", "total_amount"))
+        self.assertEqual(incremental, rebuilt)
+
+    def test_history_view(self):
+        for _ in range(3):
+            debit_toll(self.vehicle, self.station)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("transaction_history"), secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["transactions"]), 3)
+        self.assertEqual(response.context["monthly_totals"][0]["transaction_count"], 3)
+
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user, self.toll_vehicle = create_toll_account("fleet", Decimal("5.00"))
+        UserProfile.objects.create(user=self.user, toll_balance=Decimal("40.00"))
+        self.station = TollStation.objects.create(name="A6 Sud", location="Lyon", fee=Decimal("3.00"), route="A6")
+        brand = Brand.objects.create(name="Renault")
+        model = VehicleModel.objects.create(brand=brand, name="Trafic")
+        today = datetime.date.today()
+        create_vehicle(self.user, brand, model, 1)
+        create_vehicle(self.user, brand, model, 2, insurance_expiry_date=today + datetime.timedelta(days=10))
+        self.expired = create_vehicle(self.user, brand, model, 3, next_technical_check=today - datetime.timedelta(days=1))
+
+    def test_blocks_are_single_queries_then_cached(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            debit_toll(self.toll_vehicle, self.station)
+        with self.assertNumQueries(3):
+            dashboard = get_dashboard(self.user)
+        compliance = dashboard["compliance"]
+        self.assertEqual((compliance["ok"], compliance["due_soon"], compliance["expired"]), (1, 1, 1))
+        self.assertEqual(compliance["technical_check_overdue"], 1)
+        self.assertEqual(dashboard["monthly_spend"]["months"][0]["total_amount"], Decimal("3.00"))
+        self.assertEqual(dashboard["monthly_spend"]["total_amount"], Decimal("3.00"))
+        balances = dashboard["balances"]
+        self.assertEqual(balances["profile_balance"], Decimal("40.00"))
+        self.assertEqual(balances["vehicles_total"], Decimal("2.00"))
+        self.assertEqual(balances["low_balance"], 1)
+        with self.assertNumQueries(0):
+            get_dashboard(self.user)
+
+    def test_balances_without_profile_or_vehicles(self):
+        UserProfile.objects.filter(user=self.user).delete()
+        balances = balance_summary(self.user)
+        self.assertEqual(balances["profile_balance"], Decimal("0.00"))
+        self.assertEqual((balances["vehicles"], balances["vehicles_total"]), (1, Decimal("5.00")))
+        self.assertEqual(balances["low_balance"], 1)
+
+        owner = get_user_model().objects.create_user(username="sans-vehicule", password="Secret123!")
+        UserProfile.objects.create(user=owner, toll_balance=Decimal("12.00"))
+        with self.assertNumQueries(1):
+            balances = balance_summary(owner)
+        self.assertEqual(balances["profile_balance"], Decimal("12.00"))
+        self.assertEqual((balances["vehicles"], balances["vehicles_total"]), (0, Decimal("0.00")))
+
+    def test_vehicle_save_invalidates_dashboard(self):
+        get_dashboard(self.user)
+        self.expired.next_technical_check = datetime.date.today() + datetime.timedelta(days=200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.expired.save()
+        self.assertEqual(get_dashboard(self.user)["compliance"]["expired"], 0)
+
+    def test_view(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("dashboard"), secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["compliance"]["vehicles"], 3)
+
+
+class GantryIngestionTests(TestCase):
+    def setUp(self):
+        invalidate_plate_indexes()
+        self.user, self.vehicle = create_toll_account("erin", Decimal("5.00"), "AB-123-CD")
+        self.station = TollStation.objects.create(name="A1 Sud", location="Paris", fee=Decimal("2.00"), route="A1")
+
+    def post(self, passages, token="gantry-token"):
+        with self.settings(GANTRY_API_TOKENS=["gantry-token"]):
+            return self.client.post(
+                reverse("gantry_passages"), json.dumps({"passages": passages}),
+                content_type="application/json", HTTP_AUTHORIZATION=f"Token {token}", secure=True,
+            )
+
+    def test_requires_token(self):
+        self.assertEqual(self.post([], token="wrong").status_code, 401)
+        self.assertEqual(self.post([], token="jeton-é").status_code, 401)
+
+    def test_batch_outcomes(self):
+        passages = [
+            {"plate": "ab 123 cd", "station": self.station.pk, "timestamp": "2026-10-18T08:00:00Z"},
+            {"plate": "AB123CD", "station": self.station.pk, "timestamp": "2026-10-18T08:05:00Z"},
+            {"plate": "AB123CD", "station": self.station.pk, "timestamp": "2026-10-18T08:05:00Z"},
+            {"plate": "AB123CD", "station": self.station.pk, "timestamp": "2026-10-18T08:10:00Z"},
+            {"plate": "ZZ999ZZ", "station": self.station.pk, "timestamp": "2026-10-18T08:15:00Z"},
+            {"plate": "AB123CD", "station": 999999, "timestamp": "2026-10-18T08:15:00Z"},
+            {"station": self.station.pk, "timestamp": "2026-10-18T08:15:00Z"},
+            # Sans horodatage, un lot rejoué ne pourrait pas être reconnu
+            {"plate": "AB123CD", "station": self.station.pk},
+        ]
+        response = self.post(passages)
+        self.assertEqual(response.status_code, 200)
+        statuses = [result["status"] for result in response.json()["results"]]
+        self.assertEqual(statuses, [
+            "ok", "ok", "duplicate", "insufficient_funds", "unknown_vehicle", "unknown_station", "invalid", "invalid",
+        ])
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.toll_balance, Decimal("1.00"))
+        dates = sorted(TollTransaction.objects.values_list("transaction_date", flat=True))
+        self.assertEqual([date.minute for date in dates], [0, 5])
+
+        # Lot rejoué par le portique : rien n'est débité deux fois
+        replay = self.post(passages[:2]).json()
+        self.assertEqual([result["status"] for result in replay["results"]], ["duplicate", "duplicate"])
+        self.assertEqual(TollTransaction.objects.count(), 2)
+
+
+@skipIf(connection.vendor == "sqlite", "SQLite sérialise les écritures : test de concurrence sans objet.")
+class TollDebitConcurrencyTests(TransactionTestCase):
+    def test_concurrent_debits_are_not_lost(self):
+        _, vehicle = create_toll_account("carol", Decimal("50.00"))
+        station = TollStation.objects.create(name="A6 Sud", location="Fleury", fee=Decimal("1.00"), route="A6")
+        attempts, workers = 80, 8
+        successes = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                for _ in range(attempts // workers):
+                    try:
+                        debit_toll(vehicle, station)
+                    except InsufficientBalance:
+                        continue
+                    with lock:
+                        successes.append(1)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        vehicle.refresh_from_db()
+        self.assertEqual(len(successes), 50)
+        self.assertEqual(vehicle.toll_balance, Decimal("0.00"))
+        self.assertEqual(TollTransaction.objects.filter(vehicle=vehicle).count(), 50)
@@ -0,0 +1,257 @@
+from collections import namedtuple
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+from core.cache import BALANCE, get_or_set_for_user, invalidate_user
+from .models import TollTransaction, UserProfile, Vehicle
+from .rollups import record_toll_transactions
+
+# Issues possibles d'un débit de péage
+DEBIT_OK = "ok"
+DEBIT_INSUFFICIENT_FUNDS = "insufficient_funds"
+DEBIT_UNKNOWN_VEHICLE = "unknown_vehicle"
+# Passage déjà enregistré (même véhicule, même station, même horodatage)
+DEBIT_DUPLICATE = "duplicate"
+
+# Nombre de véhicules verrouillés / mis à jour (et de passages insérés) par requête en mode lot
+DEBIT_BATCH_SIZE = 500
+
+# Passage à débiter : véhicule, station, montant (tarif de la station), horodatage (optionnel)
+Passage = namedtuple("Passage", ["vehicle_id", "toll_station_id", "amount", "transaction_date"], defaults=(None,))
+DebitResult = namedtuple("DebitResult", ["status", "transaction"])
+
+
+class InsufficientBalance(Exception):
+    """Le solde du véhicule ne couvre pas le montant du péage."""
+
+
+def debit_toll(vehicle, toll_station, payment_method="Solde"):
+    """
+    Débite un passage : le contrôle du solde et la décrémentation se font
+    dans une seule mise à jour conditionnelle, dans la même transaction que
+    l'enregistrement du TollTransaction. Aucune mise à jour n'est perdue
+    en cas de passages simultanés.
+    """
+    fee = toll_station.fee
+    with transaction.atomic():
+        updated = Vehicle.objects.filter(pk=vehicle.pk, toll_balance__gte=fee).update(
+            toll_balance=F("toll_balance") - fee
+        )
+        if not updated:
+            raise InsufficientBalance(f"Solde insuffisant pour le véhicule {vehicle.pk}.")
+        transaction.on_commit(lambda: invalidate_user(vehicle.owner_id))
+        toll_transaction = TollTransaction.objects.create(
+            user_id=vehicle.owner_id,
+            vehicle_id=vehicle.pk,
+            toll_station_id=toll_station.pk,
+            amount=fee,
+            paid=True,
+            payment_method=payment_method,
+        )
+        record_toll_transactions([toll_transaction])
+        return toll_transaction
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _passage_key(toll_transaction):
+    return toll_transaction.vehicle_id, toll_transaction.toll_station_id, toll_transaction.transaction_date
+
+
+def _insert_new_transactions(toll_transactions):
+    """
+    Insère les passages en ignorant ceux déjà enregistrés (contrainte
+    users_toll_passage_unique) et renvoie ceux réellement insérés, clé
+    primaire renseignée. Syntaxe ON CONFLICT commune à PostgreSQL et SQLite.
+    """
+    if not toll_transactions:
+        return []
+    ops = connection.ops
+    quote = ops.quote_name
+    meta = TollTransaction._meta
+    fields = [meta.get_field(name) for name in (
+        "user", "vehicle", "toll_station", "transaction_date", "amount", "paid", "payment_method",
+    )]
+    columns = ", ".join(quote(field.column) for field in fields)
+    conflict = ", ".join(quote(field.column) for field in fields[1:4])
+    placeholders = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    inserted_ids = []
+    with connection.cursor() as cursor:
+        for chunk in _chunks(toll_transactions, DEBIT_BATCH_SIZE):
+            params = [
+                field.get_db_prep_save(getattr(toll_transaction, field.attname), connection)
+                for toll_transaction in chunk for field in fields
+            ]
+            cursor.execute(
+                f"INSERT INTO {quote(meta.db_table)} ({columns}) VALUES "
+                + ", ".join([placeholders] * len(chunk))
+                + f" ON CONFLICT ({conflict}) DO NOTHING"
+                + f" RETURNING {quote(meta.pk.column)}",
+                params,
+            )
+            inserted_ids.extend(row[0] for row in cursor.fetchall())
+
+    # Les lignes renvoyées ne disent pas à quel passage elles correspondent : relecture par clé primaire
+    keys = {
+        (vehicle_id, station_id, date): pk
+        for pk, vehicle_id, station_id, date in TollTransaction.objects.filter(pk__in=inserted_ids)
+        .values_list("pk", "vehicle_id", "toll_station_id", "transaction_date")
+    }
+    inserted = []
+    for toll_transaction in toll_transactions:
+        pk = keys.get(_passage_key(toll_transaction))
+        if pk is not None:
+            toll_transaction.pk = pk
+            toll_transaction._state.adding = False
+            inserted.append(toll_transaction)
+    return inserted
+
+
+def _delete_new_transactions(ids):
+    """
+    Retire des passages insérés dans la transaction courante (solde
+    insuffisant). Aucune liaison UserProfileTollTransaction ne peut encore
+    les référencer : suppression directe, sans passer par le collecteur.
+    """
+    if not ids:
+        return
+    quote = connection.ops.quote_name
+    meta = TollTransaction._meta
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids, DEBIT_BATCH_SIZE):
+            cursor.execute(
+                f"DELETE FROM {quote(meta.db_table)} WHERE {quote(meta.pk.column)} IN ("
+                + ", ".join(["%s"] * len(chunk)) + ")",
+                chunk,
+            )
+
+
+def debit_tolls_batch(passages, payment_method="Solde"):
+    """
+    Débite un lot de passages en quelques requêtes :
+    verrouillage des véhicules concernés (SELECT ... FOR UPDATE, par ordre de pk
+    pour éviter les interblocages), lecture des passages déjà enregistrés,
+    insertion des transactions (ON CONFLICT DO NOTHING), arbitrage des soldes
+    en mémoire dans l'ordre des passages sur les seules lignes insérées
+    (suppression de celles que le solde ne couvre pas), puis une mise à jour
+    CASE par lot de véhicules. Un passage est identifié par
+    (véhicule, station, horodatage) : un lot rejoué n'est jamais débité deux fois.
+    Renvoie un DebitResult par passage, dans l'ordre reçu.
+    """
+    now = timezone.now()
+    passages = [passage._replace(transaction_date=passage.transaction_date or now) for passage in passages]
+    vehicle_ids = sorted({passage.vehicle_id for passage in passages})
+
+    with transaction.atomic():
+        accounts = {}
+        for ids in _chunks(vehicle_ids, DEBIT_BATCH_SIZE):
+            rows = (
+                Vehicle.objects.select_for_update()
+                .filter(pk__in=ids)
+                .order_by("pk")
+                .values_list("pk", "owner_id", "toll_balance")
+            )
+            for pk, owner_id, balance in rows:
+                accounts[pk] = {"owner_id": owner_id, "balance": balance}
+
+        # Véhicules verrouillés : aucun autre débit ne peut enregistrer leurs passages d'ici la fin
+        seen = set()
+        if accounts:
+            dates = [passage.transaction_date for passage in passages]
+            seen = set(
+                TollTransaction.objects.filter(
+                    vehicle_id__in=list(accounts),
+                    transaction_date__gte=min(dates),
+                    transaction_date__lte=max(dates),
+                ).values_list("vehicle_id", "toll_station_id", "transaction_date")
+            )
+
+        # Passages insérés d'abord : seuls ceux réellement enregistrés entrent dans le calcul des soldes
+        pending = []
+        results = []
+        for passage in passages:
+            account = accounts.get(passage.vehicle_id)
+            amount = Decimal(passage.amount)
+            key = (passage.vehicle_id, passage.toll_station_id, passage.transaction_date)
+            if account is None:
+                results.append(DebitResult(DEBIT_UNKNOWN_VEHICLE, None))
+            elif key in seen:
+                results.append(DebitResult(DEBIT_DUPLICATE, None))
+            elif account["balance"] < amount:
+                results.append(DebitResult(DEBIT_INSUFFICIENT_FUNDS, None))
+            else:
+                seen.add(key)
+                toll_transaction = TollTransaction(
+                    user_id=account["owner_id"],
+                    vehicle_id=passage.vehicle_id,
+                    toll_station_id=passage.toll_station_id,
+                    amount=amount,
+                    paid=True,
+                    payment_method=payment_method,
+                    transaction_date=passage.transaction_date,
+                )
+                pending.append(toll_transaction)
+                results.append(DebitResult(DEBIT_OK, toll_transaction))
+
+        kept = {id(toll_transaction) for toll_transaction in _insert_new_transactions(pending)}
+        inserted = []
+        unpaid_ids = []
+        for index, result in enumerate(results):
+            toll_transaction = result.transaction
+            if toll_transaction is None:
+                continue
+            account = accounts[toll_transaction.vehicle_id]
+            if id(toll_transaction) not in kept:
+                results[index] = DebitResult(DEBIT_DUPLICATE, None)
+            elif account["balance"] < toll_transaction.amount:
+                results[index] = DebitResult(DEBIT_INSUFFICIENT_FUNDS, None)
+                unpaid_ids.append(toll_transaction.pk)
+            else:
+                account["balance"] -= toll_transaction.amount
+                inserted.append(toll_transaction)
+        _delete_new_transactions(unpaid_ids)
+
+        debits = {}
+        for toll_transaction in inserted:
+            vehicle_id = toll_transaction.vehicle_id
+            debits[vehicle_id] = debits.get(vehicle_id, Decimal("0")) + toll_transaction.amount
+        for ids in _chunks(sorted(debits), DEBIT_BATCH_SIZE):
+            Vehicle.objects.filter(pk__in=ids).update(
+                toll_balance=Case(
+                    *[When(pk=pk, then=F("toll_balance") - Value(debits[pk])) for pk in ids],
+                    output_field=DecimalField(max_digits=10, decimal_places=2),
+                )
+            )
+        record_toll_transactions(inserted)
+
+        owner_ids = {accounts[pk]["owner_id"] for pk in debits}
+        transaction.on_commit(lambda: [invalidate_user(owner_id) for owner_id in owner_ids])
+
+    return results
+
+
+def get_balances(user):
+    """
+    Soldes de l'utilisateur (compte et véhicules), mis en cache et invalidés
+    à chaque crédit ou débit.
+    """
+    def build():
+        profile_balance = (
+            UserProfile.objects.filter(user=user).values_list("toll_balance", flat=True).first()
+        )
+        vehicles = list(
+            Vehicle.objects.filter(owner=user)
+            .order_by("pk")
+            .values("id", "registration_number", "toll_balance")
+        )
+        return {
+            "profile_balance": profile_balance or Decimal("0.00"),
+            "vehicles": vehicles,
+            "vehicles_total": sum((vehicle["toll_balance"] for vehicle in vehicles), Decimal("0.00")),
+        }
+
+    return get_or_set_for_user(BALANCE, user.pk, (), build)
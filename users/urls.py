@@ -5,33 +5,28 @@ from django.contrib.auth.decorators import login_required
 urlpatterns = [
     # Vue d'inscription
     path('register/', views.SignUpView.as_view(), name='signup'),
-    
-    path('', views.index, name='index'),
-    
+
     # Vue de connexion
     path('login/', views.login_view, name='login'),
-    
+
     # Vue de déconnexion
     path('logout/', views.CustomLogoutView.as_view(), name='logout'),
-    
+
     # Vue pour la mise à jour du profil utilisateur (protégée par login)
     path('profile/update/', login_required(views.UserUpdateView.as_view()), name='profile_update'),
-    
+
     # Vue pour la page d'accueil (protégée par login)
     path('', login_required(views.home), name='home'),
-]
-# urls.py
-from django.urls import path
-from . import views
 
-urlpatterns = [
-    path('pay-toll/<int:vehicle_id>/<int:station_id>/', views.process_toll_payment, name='pay_toll'),
-]
-# urls.py (dans l'app users)
-from django.urls import path
-from . import views
+    # Paiement d'un péage (véhicule, station)
+    path('pay-toll/<int:vehicle_id>/<int:station_id>/', views.process_toll_payment, name='process_toll_payment'),
 
-urlpatterns = [
+    # Historique, solde et rechargement du compte péage
     path('transaction-history/', views.transaction_history, name='transaction_history'),
     path('add-funds/', views.add_funds, name='add_funds'),
-]
\ No newline at end of file
+    path('balance/', views.balance, name='balance'),
+    path('dashboard/', views.dashboard, name='dashboard'),
+
+    # Ingestion en masse des passages aux portiques
+    path('gantry/passages/', views.gantry_passages, name='gantry_passages'),
+]
@@ -10,6 +10,8 @@ from django.http import HttpResponseForbidden
 from .forms import CustomUserCreationForm, CustomUserChangeForm
 from django.core.exceptions import PermissionDenied
 from django.contrib.auth import get_user_model
+from vehicles.views import vehicle_list_context
+from core.uploads import UploadErrorsMixin
 
 User = get_user_model()  # ✅ Solution propre
 
@@ -22,7 +24,7 @@ def check_user_activation(user):
         return False
     return True
 
-class SignUpView(CreateView):
+class SignUpView(UploadErrorsMixin, CreateView):
     """
     Vue pour l'inscription d'un nouvel utilisateur avec activation par email.
     """
@@ -57,7 +59,7 @@ def login_view(request):
         form = AuthenticationForm()
     return render(request, 'users/login.html', {'form': form})
 
-class UserUpdateView(UpdateView):
+class UserUpdateView(UploadErrorsMixin, UpdateView):
     """
     Vue pour la mise à jour des informations utilisateur.
     """
@@ -79,8 +81,10 @@ class UserUpdateView(UpdateView):
         """
         Validation du formulaire avec un message de succès.
         """
-        form.save()
+        user = form.save()
         messages.success(self.request, "Vos informations ont été mises à jour avec succès.")
+        if 'identity_document' in form.changed_data and user.identity_document:
+            messages.info(self.request, "Votre document d'identité est en cours de vérification.")
         return redirect(self.success_url)
 
 class CustomLogoutView(LogoutView):
@@ -101,11 +105,11 @@ def home(request):
     """
     Vue pour la page d'accueil sécurisée.
     """
-    # Optimisation : vérifier que l'utilisateur a des véhicules associés à son compte.
-    user_vehicles = request.user.vehicles.all()
-    if not user_vehicles.exists():
+    # Une seule requête : première page des véhicules avec marque et modèle
+    context = vehicle_list_context(request)
+    if not context['vehicles']:
         messages.warning(request, "Vous n'avez pas encore ajouté de véhicule.")
-    return render(request, 'home.html', {'vehicles': user_vehicles})
+    return render(request, 'home.html', context)
 # views.py
 from django.core.mail import send_mail
 
@@ -121,44 +125,35 @@ def send_payment_notification(user_email, transaction):
 from django.shortcuts import get_object_or_404
 from django.http import JsonResponse
 from .models import TollStation, Vehicle, TollTransaction
+from .tolls import InsufficientBalance, debit_toll
 import stripe
 
 # Assurez-vous de configurer Stripe dans votre settings.py
 stripe.api_key = 'votre_cle_secrète'
 
 def process_toll_payment(request, vehicle_id, station_id):
-    vehicle = get_object_or_404(Vehicle, id=vehicle_id)
+    vehicle = get_object_or_404(Vehicle.objects.only('pk', 'owner_id', 'registration_number'), id=vehicle_id)
     toll_station = get_object_or_404(TollStation, id=station_id)
     
-    # Vérification si le véhicule a assez de fonds pour payer
-    if vehicle.toll_balance >= toll_station.fee:
-        # Déduire le montant du solde du véhicule
-        vehicle.update_balance(toll_station.fee)
-        
-        # Enregistrer la transaction
-        transaction = TollTransaction.objects.create(
-            vehicle=vehicle,
-            toll_station=toll_station,
-            amount=toll_station.fee,
-            paid=True,
-            payment_method="Carte"
-        )
-
-        # Simuler un paiement via Stripe
-        try:
-            stripe.Charge.create(
-                amount=int(toll_station.fee * 100),  # Convertir en centimes
-                currency="eur",
-                description=f"Péage {toll_station.name} pour {vehicle.registration_number}",
-                source=request.POST['stripeToken'],  # Utilise un token Stripe généré côté client
-            )
-        except stripe.error.StripeError as e:
-            # En cas d'erreur de paiement
-            return JsonResponse({'error': str(e)}, status=400)
-        
-        return JsonResponse({'message': 'Péage payé avec succès', 'transaction_id': transaction.id})
-    else:
+    # Contrôle du solde et débit atomiques (voir users/tolls.py)
+    try:
+        transaction = debit_toll(vehicle, toll_station, payment_method="Carte")
+    except InsufficientBalance:
         return JsonResponse({'error': 'Solde insuffisant pour ce péage'}, status=400)
+
+    # Simuler un paiement via Stripe
+    try:
+        stripe.Charge.create(
+            amount=int(toll_station.fee * 100),  # Convertir en centimes
+            currency="eur",
+            description=f"Péage {toll_station.name} pour {vehicle.registration_number}",
+            source=request.POST['stripeToken'],  # Utilise un token Stripe généré côté client
+        )
+    except stripe.error.StripeError as e:
+        # En cas d'erreur de paiement
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({'message': 'Péage payé avec succès', 'transaction_id': transaction.id})
         # views.py
 from django.core.mail import send_mail
 
@@ -178,28 +173,125 @@ def transaction_history(request):
     
     return render(request, 'transactions_history.html', {'transactions': transactions})
     # views.py (dans l'app users)
+from datetime import timedelta
 from django.shortcuts import render
+from django.utils import timezone
+from core.pagination import keyset_paginate
 from .models import UserProfile
-from vehicles.models import TollTransaction
+from .rollups import monthly_totals, vehicle_totals
 
+# Fenêtre de l'historique détaillé (jours) et taille de page
+HISTORY_WINDOW_DAYS = 90
+HISTORY_PAGE_SIZE = 50
+
+@login_required
 def transaction_history(request):
-    user_profile = request.user.userprofile  # Récupérer le profil utilisateur
-    transactions = TollTransaction.objects.filter(vehicle__owner=request.user)
-    
-    return render(request, 'users/transaction_history.html', {'transactions': transactions})
+    """
+    Historique des péages : passages récents (fenêtre glissante, pagination par
+    curseur, seules les partitions récentes sont lues) et cumuls mensuels.
+    """
+    since = timezone.now() - timedelta(days=HISTORY_WINDOW_DAYS)
+    transactions = (
+        TollTransaction.objects.filter(user=request.user, transaction_date__gte=since)
+        .select_related('toll_station', 'vehicle')
+    )
+    page = keyset_paginate(transactions, request.GET.get('cursor'), HISTORY_PAGE_SIZE, ('-transaction_date',))
+    return render(request, 'users/transaction_history.html', {
+        'transactions': page.object_list,
+        'page': page,
+        'window_days': HISTORY_WINDOW_DAYS,
+        'monthly_totals': monthly_totals(request.user),
+        'vehicle_totals': vehicle_totals(request.user),
+    })
     # views.py (dans l'app users)
 from django.shortcuts import render
 from .models import UserProfile
 from django.http import JsonResponse
+from decimal import Decimal, InvalidOperation
+
+# Montant maximal d'un rechargement
+MAX_TOP_UP_AMOUNT = Decimal('10000.00')
 
 def add_funds(request):
     if request.method == 'POST':
-        amount = request.POST.get('amount', 0)
-        if amount:
-            user_profile = request.user.userprofile
-            user_profile.add_funds(float(amount))
+        try:
+            amount = Decimal(request.POST.get('amount', '0'))
+            # NaN et Infinity refusés avant toute comparaison ; montant arrondi au centime
+            amount = amount.quantize(Decimal('0.01')) if amount.is_finite() else Decimal('0')
+        except InvalidOperation:
+            amount = Decimal('0')
+        if amount > MAX_TOP_UP_AMOUNT:
+            return JsonResponse({'error': f'Montant maximal : {MAX_TOP_UP_AMOUNT} €'}, status=400)
+        if amount > 0:
+            user_profile, _ = UserProfile.objects.get_or_create(user=request.user)
+            if not user_profile.add_funds(amount):
+                return JsonResponse({'error': 'Solde maximal atteint'}, status=400)
             return JsonResponse({'message': 'Fonds ajoutés avec succès', 'new_balance': user_profile.toll_balance})
         else:
             return JsonResponse({'error': 'Montant invalide'}, status=400)
     return render(request, 'users/add_funds.html')
-    
\ No newline at end of file
+    
+
+from .tolls import get_balances
+
+@login_required
+def balance(request):
+    """Soldes de péage de l'utilisateur (servis depuis le cache partagé)."""
+    return JsonResponse(get_balances(request.user))
+
+
+from django.core.exceptions import ValidationError
+from .dashboard import get_dashboard
+
+@login_required
+def dashboard(request):
+    """
+    Synthèse de la flotte : véhicules par tranche de conformité, dépenses de
+    péage par mois et soldes (un agrégat par bloc, servis depuis le cache).
+    Le staff peut consulter la flotte d'un autre utilisateur (?user=<id>).
+    """
+    user = request.user
+    if request.GET.get('user') and request.user.is_staff:
+        try:
+            user = User.objects.filter(pk=request.GET['user']).first()
+        except ValidationError:
+            user = None
+        if user is None:
+            return JsonResponse({'error': 'Utilisateur inconnu'}, status=404)
+    return JsonResponse({'user': str(user.pk), **get_dashboard(user)})
+
+
+import hmac
+import json
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from .gantry import GANTRY_MAX_RECORDS, ingest_passages
+
+def _gantry_authorized(request):
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme != 'Token' or not token:
+        return False
+    # Comparaison d'octets : compare_digest refuse les chaînes non ASCII
+    token = token.encode()
+    return any(hmac.compare_digest(token, expected.encode()) for expected in settings.GANTRY_API_TOKENS)
+
+@csrf_exempt
+@require_POST
+def gantry_passages(request):
+    """
+    Ingestion en masse des lectures de plaques des portiques :
+    {"passages": [{"plate": "AB-123-CD", "station": 3, "timestamp": "2026-10-18T08:15:00Z"}, ...]}
+    Réponse : une issue par lecture, dans l'ordre reçu, et le débit en passages/s.
+    """
+    if not _gantry_authorized(request):
+        return JsonResponse({'error': 'Jeton de portique invalide'}, status=401)
+    try:
+        records = json.loads(request.body)['passages']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Corps JSON invalide : clé "passages" attendue'}, status=400)
+    if not isinstance(records, list):
+        return JsonResponse({'error': '"passages" doit être une liste'}, status=400)
+    if len(records) > GANTRY_MAX_RECORDS:
+        return JsonResponse({'error': f'{GANTRY_MAX_RECORDS} lectures au maximum par appel'}, status=413)
+    return JsonResponse(ingest_passages(records).as_dict())
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from django.core.cache import cache
+from django.db import transaction
+from .models import Brand, VehicleModel
+
+logger = logging.getLogger(__name__)
+
+# Intervalle (secondes) entre deux vérifications du compteur de modifications partagé
+VERSION_CHECK_INTERVAL = 5
+# Modèles créés par requête lors d'un import de catalogue constructeur
+CATALOG_BATCH_SIZE = 5000
+CATALOG_VERSION_KEY = "vehicle-catalog-version"
+
+
+class Catalog:
+    """
+    Arbre marques -> modèles en mémoire (par processus), construit en deux
+    requêtes et sérialisé une fois en JSON compact pour l'endpoint du
+    catalogue. Un compteur partagé dans le cache, incrémenté à chaque
+    modification, indique aux autres processus qu'il faut reconstruire
+    (vérifié au plus toutes les VERSION_CHECK_INTERVAL secondes).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._brands = None  # [(id, nom)] triés par nom
+        self._models = None  # id de marque -> [(id, nom)] triés par nom
+        self._payload = None
+        self._etag = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def _shared_version(self):
+        version = cache.get(CATALOG_VERSION_KEY)
+        if version is None:
+            # Horodatage : une clé évincée puis recréée ne reprend pas une ancienne valeur
+            version = int(time.time() * 1000)
+            if not cache.add(CATALOG_VERSION_KEY, version, None):
+                version = cache.get(CATALOG_VERSION_KEY, version)
+        return version
+
+    def build(self):
+        started = time.monotonic()
+        version = self._shared_version()
+        brands = list(Brand.objects.order_by("name", "pk").values_list("pk", "name"))
+        models = {brand_id: [] for brand_id, _ in brands}
+        rows = VehicleModel.objects.order_by("name", "pk").values_list("brand_id", "pk", "name")
+        for brand_id, pk, name in rows.iterator(chunk_size=CATALOG_BATCH_SIZE):
+            models.setdefault(brand_id, []).append((pk, name))
+        # [[id, nom, [[id, nom], ...]], ...] : sans clés répétées, quelques octets par modèle
+        payload = json.dumps(
+            {"brands": [[pk, name, models[pk]] for pk, name in brands]},
+            ensure_ascii=False, separators=(",", ":"),
+        ).encode()
+        etag = f'"{hashlib.blake2b(payload, digest_size=12).hexdigest()}"'
+        with self._lock:
+            self._brands, self._models = brands, models
+            self._payload, self._etag = payload, etag
+            self._version = version
+            self._checked_at = time.monotonic()
+        logger.info("Catalogue : %s marques, %s modèles en %.2f s",
+                    len(brands), sum(map(len, models.values())), time.monotonic() - started)
+
+    def _ensure_current(self):
+        if self._payload is None:
+            self.build()
+            return
+        now = time.monotonic()
+        if now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        if self._shared_version() != self._version:
+            self.build()
+
+    def payload(self):
+        """(JSON compact, ETag) ; l'ETag ne dépend que du contenu, identique dans tous les processus."""
+        self._ensure_current()
+        return self._payload, self._etag
+
+    def brand_choices(self):
+        self._ensure_current()
+        return list(self._brands)
+
+    def model_choices(self, brand_id):
+        self._ensure_current()
+        try:
+            return list(self._models.get(int(brand_id), ()))
+        except (TypeError, ValueError):
+            return []
+
+    def invalidate(self):
+        """Marque le catalogue comme modifié, pour ce processus et les autres."""
+        try:
+            cache.incr(CATALOG_VERSION_KEY)
+        except ValueError:
+            self._shared_version()
+        with self._lock:
+            self._payload = None
+
+
+_catalog = Catalog()
+
+
+def get_catalog():
+    return _catalog
+
+
+def upsert_catalog(rows, batch_size=CATALOG_BATCH_SIZE):
+    """
+    Import en masse d'un catalogue constructeur : rows donne des couples
+    (marque, modèle). Les marques et modèles déjà connus (noms comparés sans
+    tenir compte de la casse) sont conservés, les autres créés par lots ;
+    une seule invalidation du catalogue à la fin. Renvoie
+    (marques créées, modèles créés).
+    """
+    wanted = {}
+    for brand_name, model_name in rows:
+        brand_name, model_name = str(brand_name).strip(), str(model_name).strip()
+        if brand_name and model_name:
+            models = wanted.setdefault(brand_name.lower(), (brand_name, {}))[1]
+            models.setdefault(model_name.lower(), model_name)
+
+    with transaction.atomic():
+        brands = {name.lower(): pk for pk, name in Brand.objects.values_list("pk", "name")}
+        new_brands = [Brand(name=name) for key, (name, _) in wanted.items() if key not in brands]
+        Brand.objects.bulk_create(new_brands, batch_size=batch_size, ignore_conflicts=True)
+        if new_brands:
+            brands = {name.lower(): pk for pk, name in Brand.objects.values_list("pk", "name")}
+
+        existing = {
+            (brand_id, name.lower())
+            for brand_id, name in VehicleModel.objects.filter(brand_id__in=[brands[key] for key in wanted])
+            .values_list("brand_id", "name").iterator(chunk_size=batch_size)
+        }
+        new_models = [
+            VehicleModel(brand_id=brands[brand_key], name=name)
+            for brand_key, (_, models) in wanted.items()
+            for model_key, name in models.items()
+            if (brands[brand_key], model_key) not in existing
+        ]
+        # ignore_conflicts : un import concurrent a pu créer le même modèle entre-temps
+        VehicleModel.objects.bulk_create(new_models, batch_size=batch_size, ignore_conflicts=True)
+        transaction.on_commit(get_catalog().invalidate)
+    return len(new_brands), len(new_models)
@@ -0,0 +1,117 @@
+import datetime
+from django.db.models import F
+from .models import Vehicle, VehicleCompliance, COMPLIANCE_WINDOW_DAYS
+
+# Nombre de lignes créées par requête lors de l'initialisation des statuts manquants
+COMPLIANCE_BATCH_SIZE = 5000
+
+
+def get_status(days_left):
+    """Classe un nombre de jours restants dans une tranche de conformité."""
+    if days_left < 0:
+        return VehicleCompliance.EXPIRED
+    if days_left <= COMPLIANCE_WINDOW_DAYS:
+        return VehicleCompliance.DUE_SOON
+    return VehicleCompliance.OK
+
+
+def compute_compliance(vehicle, today=None):
+    """Calcule l'état de conformité d'un véhicule sans l'enregistrer."""
+    today = today or datetime.date.today()
+    insurance_days_left = (vehicle.insurance_expiry_date - today).days
+    technical_days_left = (vehicle.next_technical_check - today).days
+    days_left = min(insurance_days_left, technical_days_left)
+    return VehicleCompliance(
+        vehicle_id=vehicle.pk,
+        user_id=vehicle.user_id,
+        insurance_days_left=insurance_days_left,
+        technical_days_left=technical_days_left,
+        days_left=days_left,
+        status=get_status(days_left),
+        computed_on=today,
+    )
+
+
+def refresh_vehicle_compliance(vehicle, today=None):
+    """Met à jour (ou crée) la ligne de conformité d'un véhicule."""
+    compliance = compute_compliance(vehicle, today)
+    VehicleCompliance.objects.update_or_create(
+        vehicle_id=vehicle.pk,
+        defaults={
+            field: getattr(compliance, field)
+            for field in ("user_id", "insurance_days_left", "technical_days_left",
+                          "days_left", "status", "computed_on")
+        },
+    )
+    return compliance
+
+
+def refresh_all_compliance(today=None):
+    """
+    Recalcul nocturne de la conformité de toute la flotte.
+    Les compteurs ne dépendent que de la date du jour : on les décale en une
+    requête par date de calcul (en pratique une seule), puis on ne réécrit le
+    statut que des lignes qui changent de tranche.
+    """
+    today = today or datetime.date.today()
+
+    shifted = 0
+    stale_dates = (
+        VehicleCompliance.objects.exclude(computed_on=today)
+        .order_by()
+        .values_list("computed_on", flat=True)
+        .distinct()
+    )
+    for computed_on in list(stale_dates):
+        delta = (today - computed_on).days
+        shifted += VehicleCompliance.objects.filter(computed_on=computed_on).update(
+            insurance_days_left=F("insurance_days_left") - delta,
+            technical_days_left=F("technical_days_left") - delta,
+            days_left=F("days_left") - delta,
+            computed_on=today,
+        )
+
+    window = COMPLIANCE_WINDOW_DAYS
+    VehicleCompliance.objects.filter(days_left__lt=0).exclude(
+        status=VehicleCompliance.EXPIRED
+    ).update(status=VehicleCompliance.EXPIRED)
+    VehicleCompliance.objects.filter(days_left__gte=0, days_left__lte=window).exclude(
+        status=VehicleCompliance.DUE_SOON
+    ).update(status=VehicleCompliance.DUE_SOON)
+    VehicleCompliance.objects.filter(days_left__gt=window).exclude(
+        status=VehicleCompliance.OK
+    ).update(status=VehicleCompliance.OK)
+
+    created = create_missing_compliance(today)
+    return {"shifted": shifted, "created": created}
+
+
+def create_missing_compliance(today=None, batch_size=COMPLIANCE_BATCH_SIZE):
+    """Crée par lots les lignes de conformité des véhicules qui n'en ont pas encore."""
+    today = today or datetime.date.today()
+    vehicles = (
+        Vehicle.objects.filter(compliance__isnull=True)
+        .only("pk", "user", "insurance_expiry_date", "next_technical_check")
+        .order_by("pk")
+    )
+    created = 0
+    batch = []
+    for vehicle in vehicles.iterator(chunk_size=batch_size):
+        batch.append(compute_compliance(vehicle, today))
+        if len(batch) >= batch_size:
+            VehicleCompliance.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+            batch = []
+    if batch:
+        VehicleCompliance.objects.bulk_create(batch, ignore_conflicts=True)
+        created += len(batch)
+    return created
+
+
+def vehicles_due_within(user, days=COMPLIANCE_WINDOW_DAYS):
+    """Véhicules de l'utilisateur arrivant à échéance dans `days` jours (requête indexée)."""
+    return (
+        Vehicle.objects.filter(compliance__user=user, compliance__days_left__lte=days)
+        .select_related("compliance")
+        .order_by("compliance__days_left", "pk")
+    )
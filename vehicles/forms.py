@@ -1,11 +1,29 @@
 from django import forms
 from .models import Vehicle, Document, Brand, VehicleModel
 from django.core.exceptions import ValidationError
+from core.uploads import DOCUMENT_KINDS, validate_upload
+from .catalog import get_catalog
 import datetime
 import re
 
+def set_catalog_choices(form, brand_id):
+    """
+    Listes marque / modèle servies par le catalogue en mémoire : seuls les
+    modèles de la marque choisie sont proposés (les autres sont chargés côté
+    navigateur depuis l'endpoint du catalogue). La validation reste faite
+    par les querysets des champs.
+    """
+    catalog = get_catalog()
+    empty = [('', '---------')]
+    form.fields['brand'].choices = empty + catalog.brand_choices()
+    form.fields['model'].choices = empty + catalog.model_choices(brand_id)
+
+
 # Formulaire pour ajouter ou modifier un véhicule
 class VehicleForm(forms.ModelForm):
+    # Les imports en masse contrôlent l'unicité par lot (voir vehicles/importer.py)
+    check_uniqueness = True
+
     class Meta:
         model = Vehicle
         fields = [
@@ -22,10 +40,15 @@ class VehicleForm(forms.ModelForm):
             'purchase_date': forms.DateInput(attrs={'type': 'date'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'brand' in self.fields:
+            set_catalog_choices(self, self.data.get('brand') or self.instance.brand_id)
+
     def clean_license_plate(self):
         license_plate = self.cleaned_data.get('license_plate')
         # Validation: Vérifier que la plaque d'immatriculation est unique et respecter un format
-        if Vehicle.objects.filter(license_plate=license_plate).exists():
+        if self.check_uniqueness and Vehicle.objects.filter(license_plate=license_plate).exists():
             raise ValidationError("Cette plaque d'immatriculation est déjà enregistrée.")
         
         # Validation : vérifier un format standard de plaque d'immatriculation
@@ -38,7 +61,7 @@ class VehicleForm(forms.ModelForm):
     def clean_vin_number(self):
         vin_number = self.cleaned_data.get('vin_number')
         # Validation : Vérifier que le numéro VIN est unique
-        if Vehicle.objects.filter(vin_number=vin_number).exists():
+        if self.check_uniqueness and Vehicle.objects.filter(vin_number=vin_number).exists():
             raise ValidationError("Ce numéro de série est déjà enregistré.")
         
         # Validation : vérifier un format standard du VIN (17 caractères alphanumériques)
@@ -68,6 +91,24 @@ class VehicleForm(forms.ModelForm):
             raise ValidationError("La date d'achat ne peut pas être dans le futur.")
         return purchase_date
 
+class VehicleImportForm(VehicleForm):
+    """
+    Validation d'une ligne d'import : mêmes règles que VehicleForm, sans
+    requête par ligne. Marque et modèle sont résolus par nom, l'unicité des
+    plaques et VIN est vérifiée pour tout le lot en une requête.
+    """
+    check_uniqueness = False
+
+    class Meta(VehicleForm.Meta):
+        fields = [
+            'year', 'license_plate', 'color', 'vin_number', 'purchase_date', 'mileage',
+            'fuel_type', 'insurance_company', 'insurance_policy_number',
+            'insurance_expiry_date', 'last_technical_check', 'next_technical_check',
+        ]
+
+    def validate_unique(self):
+        pass
+
 class DocumentForm(forms.ModelForm):
     class Meta:
         model = Document
@@ -75,28 +116,20 @@ class DocumentForm(forms.ModelForm):
 
     def clean_file(self):
         file = self.cleaned_data.get('file')
-        # Validation : Vérifier les extensions du fichier
+        # Extension, taille et signature (déjà vérifiées pendant la réception, voir core/uploads.py)
         if file:
-            allowed_extensions = ['pdf', 'jpg', 'jpeg', 'png']
-            extension = file.name.split('.')[-1].lower()
-            if extension not in allowed_extensions:
-                raise ValidationError("Les formats autorisés sont PDF, JPG, JPEG, PNG.")
-            
-            # Limite de taille du fichier (5 Mo)
-            if file.size > 5 * 1024 * 1024:
-                raise ValidationError("Le fichier ne doit pas dépasser 5 Mo.")
-        
+            validate_upload(file, DOCUMENT_KINDS)
         return file
 
 class VehicleSelectionForm(forms.Form):
     brand = forms.ModelChoiceField(queryset=Brand.objects.all(), required=True)
-    model = forms.ModelChoiceField(queryset=VehicleModel.objects.none(), required=True)
+    model = forms.ModelChoiceField(queryset=VehicleModel.objects.all(), required=True)
 
     def __init__(self, *args, **kwargs):
-        brand = kwargs.get('brand')
+        brand = kwargs.pop('brand', None)
         super().__init__(*args, **kwargs)
-        if brand:
-            self.fields['model'].queryset = VehicleModel.objects.filter(brand=brand)
+        brand_id = brand.pk if isinstance(brand, Brand) else brand
+        set_catalog_choices(self, self.data.get('brand') or brand_id)
 
     def clean(self):
         cleaned_data = super().clean()
@@ -108,3 +141,10 @@ class VehicleSelectionForm(forms.Form):
             raise ValidationError("Le modèle sélectionné n'appartient pas à la marque choisie.")
 
         return cleaned_data
+
+
+class VehicleSearchForm(forms.Form):
+    q = forms.CharField(
+        label="Rechercher", max_length=100, required=False,
+        widget=forms.TextInput(attrs={'placeholder': "Plaque, VIN, marque, modèle, couleur"}),
+    )
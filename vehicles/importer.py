@@ -0,0 +1,196 @@
+import csv
+import io
+import time
+from django.db import transaction
+from django.db.models import Q
+from core.cache import invalidate_user_on_commit
+from core.normalization import normalize_plate, normalize_vin
+from .compliance import compute_compliance
+from .forms import VehicleImportForm
+from .models import Brand, Vehicle, VehicleCompliance, VehicleModel
+from .search import build_search_fields
+
+# Nombre de lignes validées puis insérées ensemble
+IMPORT_BATCH_SIZE = 1000
+# Nombre maximal de rejets détaillés conservés dans le rapport
+MAX_REPORTED_REJECTIONS = 1000
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.rejected = 0
+        self.rejections = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def reject(self, line, errors):
+        self.rejected += 1
+        if len(self.rejections) < MAX_REPORTED_REJECTIONS:
+            self.rejections.append({"line": line, "errors": errors})
+
+    @property
+    def rows(self):
+        return self.created + self.rejected
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "rejected": self.rejected,
+            "rejections": self.rejections,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+def read_rows(file, filename):
+    """Lit un fichier CSV ou XLSX ligne par ligne, sous forme de dictionnaires."""
+    if filename.lower().endswith(".xlsx"):
+        yield from _read_xlsx(file)
+    else:
+        yield from _read_csv(file)
+
+
+def _read_csv(file):
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    for row in csv.DictReader(text, dialect=dialect):
+        yield {(key or "").strip().lower(): (value or "").strip() for key, value in row.items()}
+
+
+def _read_xlsx(file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("L'import de fichiers XLSX nécessite openpyxl.")
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [str(header or "").strip().lower() for header in next(rows, [])]
+        for values in rows:
+            yield {
+                header: ("" if value is None else value)
+                for header, value in zip(headers, values)
+            }
+    finally:
+        workbook.close()
+
+
+class VehicleImporter:
+    """
+    Import en masse de véhicules pour un propriétaire.
+    Les lignes sont validées avec les règles de VehicleForm, l'unicité des
+    plaques/VIN est vérifiée par lot en une requête, marques et modèles sont
+    résolus depuis un dictionnaire en mémoire et l'insertion se fait par bulk_create.
+    """
+
+    def __init__(self, user, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+        self.user = user
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.report = ImportReport()
+        self.brands = {brand.name.lower(): brand for brand in Brand.objects.all()}
+        self.models = {
+            (model.brand_id, model.name.lower()): model
+            for model in VehicleModel.objects.all()
+        }
+        # Plaques et VIN déjà acceptés pendant cet import (doublons internes au fichier)
+        self.seen_plates = set()
+        self.seen_vins = set()
+
+    def run(self, rows):
+        batch = []
+        for line, row in enumerate(rows, start=2):  # Ligne 1 : en-têtes
+            batch.append((line, row))
+            if len(batch) >= self.batch_size:
+                self._process_batch(batch)
+                batch = []
+        if batch:
+            self._process_batch(batch)
+        self.report.elapsed = time.monotonic() - self.report.started
+        return self.report
+
+    def _validate(self, line, row):
+        """Valide une ligne ; renvoie un Vehicle non enregistré ou None (ligne rejetée)."""
+        data = dict(row)
+        data["license_plate"] = normalize_plate(str(data.get("license_plate", "")))
+        data["vin_number"] = normalize_vin(str(data.get("vin_number", "")))
+
+        errors = {}
+        brand = self.brands.get(str(data.get("brand", "")).strip().lower())
+        model = None
+        if brand is None:
+            errors["brand"] = ["Marque inconnue."]
+        else:
+            model = self.models.get((brand.pk, str(data.get("model", "")).strip().lower()))
+            if model is None:
+                errors["model"] = ["Modèle inconnu pour cette marque."]
+
+        form = VehicleImportForm(data=data)
+        if not form.is_valid():
+            errors.update({field: list(messages) for field, messages in form.errors.items()})
+        if errors:
+            self.report.reject(line, errors)
+            return None
+
+        vehicle = form.save(commit=False)
+        vehicle.user = self.user
+        vehicle.brand = brand
+        vehicle.model = model
+        return vehicle
+
+    def _process_batch(self, batch):
+        candidates = []
+        for line, row in batch:
+            vehicle = self._validate(line, row)
+            if vehicle is not None:
+                candidates.append((line, vehicle))
+        if not candidates:
+            return
+
+        # Unicité : une seule requête pour tout le lot
+        plates = [vehicle.license_plate for _, vehicle in candidates]
+        vins = [vehicle.vin_number for _, vehicle in candidates]
+        existing_plates, existing_vins = set(), set()
+        for plate, vin in Vehicle.objects.filter(
+            Q(license_plate__in=plates) | Q(vin_number__in=vins)
+        ).values_list("license_plate", "vin_number"):
+            existing_plates.add(plate)
+            existing_vins.add(vin)
+
+        accepted = []
+        for line, vehicle in candidates:
+            errors = {}
+            if vehicle.license_plate in existing_plates or vehicle.license_plate in self.seen_plates:
+                errors["license_plate"] = ["Cette plaque d'immatriculation est déjà enregistrée."]
+            if vehicle.vin_number in existing_vins or vehicle.vin_number in self.seen_vins:
+                errors["vin_number"] = ["Ce numéro de série est déjà enregistré."]
+            if errors:
+                self.report.reject(line, errors)
+                continue
+            self.seen_plates.add(vehicle.license_plate)
+            self.seen_vins.add(vehicle.vin_number)
+            build_search_fields(vehicle)
+            accepted.append(vehicle)
+
+        if accepted and not self.dry_run:
+            with transaction.atomic():
+                Vehicle.objects.bulk_create(accepted, batch_size=self.batch_size)
+                # bulk_create ne déclenche pas les signaux : statuts de conformité créés ici
+                VehicleCompliance.objects.bulk_create(
+                    [compute_compliance(vehicle) for vehicle in accepted],
+                    batch_size=self.batch_size,
+                )
+                # Pas de signaux : cache du propriétaire (liste, tableau de bord) invalidé ici
+                invalidate_user_on_commit(self.user.pk)
+        self.report.created += len(accepted)
@@ -0,0 +1,30 @@
+import csv
+import time
+from django.core.management.base import BaseCommand, CommandError
+from vehicles.catalog import CATALOG_BATCH_SIZE, upsert_catalog
+
+
+class Command(BaseCommand):
+    help = "Importe (ou complète) le catalogue marques / modèles depuis un fichier CSV constructeur."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fichier CSV (en-têtes : brand, model)")
+        parser.add_argument("--delimiter", default=",")
+        parser.add_argument("--batch-size", type=int, default=CATALOG_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as file:
+                reader = csv.DictReader(file, delimiter=options["delimiter"])
+                if not {"brand", "model"} <= set(reader.fieldnames or ()):
+                    raise CommandError("Colonnes 'brand' et 'model' attendues.")
+                brands, models = upsert_catalog(
+                    ((row["brand"] or "", row["model"] or "") for row in reader), batch_size=options["batch_size"],
+                )
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Catalogue importé en {time.monotonic() - started:.1f}s : "
+            f"{brands} marques et {models} modèles créés."
+        ))
@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from vehicles.importer import IMPORT_BATCH_SIZE, VehicleImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = "Importe une flotte de véhicules depuis un fichier CSV ou XLSX."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fichier CSV ou XLSX (en-têtes : brand, model, year, license_plate, ...)")
+        parser.add_argument("--user", required=True, help="Nom d'utilisateur ou email du propriétaire")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Valider sans rien enregistrer")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        identifier = options["user"]
+        user = User.objects.filter(username=identifier).first() or User.objects.filter(email=identifier).first()
+        if user is None:
+            raise CommandError(f"Utilisateur introuvable : {identifier}")
+
+        importer = VehicleImporter(user, batch_size=options["batch_size"], dry_run=options["dry_run"])
+        try:
+            with open(options["path"], "rb") as file:
+                report = importer.run(read_rows(file, options["path"]))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for rejection in report.rejections:
+            reasons = "; ".join(
+                f"{field}: {' '.join(messages)}" for field, messages in rejection["errors"].items()
+            )
+            self.stderr.write(f"Ligne {rejection['line']} rejetée — {reasons}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.created} véhicules importés, {report.rejected} rejetés "
+            f"en {report.elapsed:.1f}s ({report.rows_per_second:.0f} lignes/s)."
+        ))
@@ -0,0 +1,73 @@
+# Generated by Django 5.1.6 on 2026-10-18 09:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_compliance(apps, schema_editor):
+    """Initialise la table de conformité pour les véhicules existants."""
+    import datetime
+
+    Vehicle = apps.get_model('vehicles', 'Vehicle')
+    VehicleCompliance = apps.get_model('vehicles', 'VehicleCompliance')
+    today = datetime.date.today()
+    batch = []
+    for vehicle in Vehicle.objects.only('pk', 'user', 'insurance_expiry_date', 'next_technical_check').iterator(chunk_size=5000):
+        insurance_days_left = (vehicle.insurance_expiry_date - today).days
+        technical_days_left = (vehicle.next_technical_check - today).days
+        days_left = min(insurance_days_left, technical_days_left)
+        if days_left < 0:
+            status = 'expired'
+        elif days_left <= 30:
+            status = 'due_soon'
+        else:
+            status = 'ok'
+        batch.append(VehicleCompliance(
+            vehicle_id=vehicle.pk,
+            user_id=vehicle.user_id,
+            insurance_days_left=insurance_days_left,
+            technical_days_left=technical_days_left,
+            days_left=days_left,
+            status=status,
+            computed_on=today,
+        ))
+        if len(batch) >= 5000:
+            VehicleCompliance.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        VehicleCompliance.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleCompliance',
+            fields=[
+                ('vehicle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='compliance', serialize=False, to='vehicles.vehicle')),
+                ('insurance_days_left', models.IntegerField()),
+                ('technical_days_left', models.IntegerField()),
+                ('days_left', models.IntegerField()),
+                ('status', models.CharField(choices=[('ok', 'À jour'), ('due_soon', 'Échéance proche'), ('expired', 'Expiré')], default='ok', max_length=10)),
+                ('computed_on', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vehicle_compliances', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Conformité du véhicule',
+                'verbose_name_plural': 'Conformité des véhicules',
+                'indexes': [
+                    models.Index(fields=['user', 'days_left'], name='compliance_user_days_idx'),
+                    models.Index(fields=['user', 'status'], name='compliance_user_status_idx'),
+                    models.Index(fields=['status', 'days_left'], name='compliance_status_days_idx'),
+                    models.Index(fields=['computed_on'], name='compliance_computed_on_idx'),
+                ],
+            },
+        ),
+        migrations.RunPython(populate_compliance, migrations.RunPython.noop),
+    ]
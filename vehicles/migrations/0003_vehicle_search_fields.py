@@ -0,0 +1,77 @@
+# Generated by Django 5.1.6 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+def populate_search_fields(apps, schema_editor):
+    from core.normalization import normalize_plate, normalize_text, normalize_vin
+
+    Vehicle = apps.get_model('vehicles', 'Vehicle')
+    batch = []
+    for vehicle in Vehicle.objects.select_related('brand', 'model').order_by('pk').iterator(chunk_size=2000):
+        vehicle.search_plate = normalize_plate(vehicle.license_plate)
+        vehicle.search_vin = normalize_vin(vehicle.vin_number)
+        vehicle.search_text = normalize_text(f"{vehicle.brand.name} {vehicle.model.name} {vehicle.color}")[:255]
+        batch.append(vehicle)
+        if len(batch) >= 2000:
+            Vehicle.objects.bulk_update(batch, ['search_plate', 'search_vin', 'search_text'])
+            batch = []
+    if batch:
+        Vehicle.objects.bulk_update(batch, ['search_plate', 'search_vin', 'search_text'])
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Index GIN pg_trgm pour la recherche approximative (PostgreSQL uniquement)."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS vehicle_search_plate_trgm_idx '
+        'ON vehicles_vehicle USING gin (search_plate gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS vehicle_search_text_trgm_idx '
+        'ON vehicles_vehicle USING gin (search_text gin_trgm_ops)'
+    )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS vehicle_search_plate_trgm_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS vehicle_search_text_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0002_vehiclecompliance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='search_plate',
+            field=models.CharField(blank=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='search_vin',
+            field=models.CharField(blank=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='search_text',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_search_fields, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['search_plate'], name='vehicle_search_plate_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(fields=['search_vin'], name='vehicle_search_vin_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:00
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0003_vehicle_search_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=models.FileField(storage=core.storage.get_blob_storage, upload_to='documents/'),
+        ),
+        migrations.AlterField(
+            model_name='vehicle',
+            name='purchase_document',
+            field=models.FileField(blank=True, null=True, storage=core.storage.get_blob_storage, upload_to='vehicle_documents/purchase/'),
+        ),
+        migrations.AlterField(
+            model_name='vehicle',
+            name='vignette_document',
+            field=models.FileField(blank=True, null=True, storage=core.storage.get_blob_storage, upload_to='vehicle_documents/vignette/'),
+        ),
+        migrations.AlterField(
+            model_name='vehicle',
+            name='registration_document',
+            field=models.FileField(blank=True, null=True, storage=core.storage.get_blob_storage, upload_to='vehicle_documents/registration/'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+def merge_duplicate_models(apps, schema_editor):
+    """Avant la contrainte d'unicité : un seul modèle par (marque, nom), véhicules rattachés au plus ancien."""
+    VehicleModel = apps.get_model('vehicles', 'VehicleModel')
+    Vehicle = apps.get_model('vehicles', 'Vehicle')
+    kept = {}
+    for model_id, brand_id, name in VehicleModel.objects.order_by('pk').values_list('pk', 'brand_id', 'name').iterator():
+        keeper = kept.setdefault((brand_id, name), model_id)
+        if keeper != model_id:
+            Vehicle.objects.filter(model_id=model_id).update(model_id=keeper)
+            VehicleModel.objects.filter(pk=model_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0005_documentupload'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_models, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='vehiclemodel',
+            constraint=models.UniqueConstraint(fields=('brand', 'name'), name='vehicles_model_brand_name_unique'),
+        ),
+    ]
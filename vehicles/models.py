@@ -1,6 +1,11 @@
 from django.conf import settings
 from django.db import models
 import datetime
+import uuid
+from core.storage import get_blob_storage
+
+# Fenêtre (en jours) avant échéance à partir de laquelle un véhicule doit être signalé
+COMPLIANCE_WINDOW_DAYS = 30
 
 # Modèle pour la marque du véhicule
 class Brand(models.Model):
@@ -18,11 +23,17 @@ class VehicleModel(models.Model):
     def __str__(self):
         return f"{self.brand.name} {self.name}"
 
+    class Meta:
+        constraints = [
+            # Clé d'import des catalogues constructeurs (vehicles/catalog.py)
+            models.UniqueConstraint(fields=["brand", "name"], name="vehicles_model_brand_name_unique"),
+        ]
+
 
 # Modèle pour les documents associés à un véhicule
 class Document(models.Model):
     document_type = models.CharField(max_length=100)  # Type de document (ex : "purchase", "registration", etc.)
-    file = models.FileField(upload_to='documents/')
+    file = models.FileField(upload_to='documents/', storage=get_blob_storage)
 
     def __str__(self):
         return f'{self.document_type} document'
@@ -43,10 +54,10 @@ class Vehicle(models.Model):
     purchase_date = models.DateField()
     mileage = models.PositiveIntegerField()
 
-    # Documents associés au véhicule (achat, vignette, immatriculation)
-    purchase_document = models.FileField(upload_to='vehicle_documents/purchase/', null=True, blank=True)
-    vignette_document = models.FileField(upload_to='vehicle_documents/vignette/', null=True, blank=True)
-    registration_document = models.FileField(upload_to='vehicle_documents/registration/', null=True, blank=True)
+    # Documents associés au véhicule (achat, vignette, immatriculation), stockés par empreinte
+    purchase_document = models.FileField(upload_to='vehicle_documents/purchase/', storage=get_blob_storage, null=True, blank=True)
+    vignette_document = models.FileField(upload_to='vehicle_documents/vignette/', storage=get_blob_storage, null=True, blank=True)
+    registration_document = models.FileField(upload_to='vehicle_documents/registration/', storage=get_blob_storage, null=True, blank=True)
     documents = models.ManyToManyField(Document, related_name="vehicles")
 
     # Informations sur l'assurance
@@ -66,15 +77,20 @@ class Vehicle(models.Model):
     last_technical_check = models.DateField()
     next_technical_check = models.DateField()
 
+    # Clés de recherche normalisées (voir vehicles/search.py), maintenues à chaque sauvegarde
+    search_plate = models.CharField(max_length=20, blank=True, default="", editable=False)
+    search_vin = models.CharField(max_length=50, blank=True, default="", editable=False)
+    search_text = models.CharField(max_length=255, blank=True, default="", editable=False)
+
     # Méthodes pour vérifier l'état des documents
     def is_insurance_expiring_soon(self):
         if self.insurance_expiry_date:
-            return (self.insurance_expiry_date - datetime.date.today()).days <= 30  # Moins de 30 jours
+            return (self.insurance_expiry_date - datetime.date.today()).days <= COMPLIANCE_WINDOW_DAYS
         return False
 
     def is_technical_control_due(self):
         if self.next_technical_check:
-            return (self.next_technical_check - datetime.date.today()).days <= 30  # Moins de 30 jours
+            return (self.next_technical_check - datetime.date.today()).days <= COMPLIANCE_WINDOW_DAYS
         return False
 
     def get_full_name(self):
@@ -97,10 +113,47 @@ class Vehicle(models.Model):
     class Meta:
         verbose_name = "Véhicule"
         verbose_name_plural = "Véhicules"
-# models.py/vehicules
-from django.db import models
-from users.models import User  # Assurez-vous que l'import est correct
-from vehicles.models import Vehicle  # Vérifie si le modèle Vehicle existe
+        indexes = [
+            # varchar_pattern_ops : recherche par préfixe (LIKE 'AB12%') indexée sous PostgreSQL
+            models.Index(fields=["search_plate"], name="vehicle_search_plate_idx", opclasses=["varchar_pattern_ops"]),
+            models.Index(fields=["search_vin"], name="vehicle_search_vin_idx", opclasses=["varchar_pattern_ops"]),
+        ]
+
+
+# État de conformité précalculé (assurance / contrôle technique) pour chaque véhicule.
+# Recalculé chaque nuit par des mises à jour ensemblistes et à chaque sauvegarde du véhicule.
+class VehicleCompliance(models.Model):
+    OK = "ok"
+    DUE_SOON = "due_soon"
+    EXPIRED = "expired"
+    STATUS_CHOICES = [
+        (OK, "À jour"),
+        (DUE_SOON, "Échéance proche"),
+        (EXPIRED, "Expiré"),
+    ]
+
+    vehicle = models.OneToOneField(Vehicle, on_delete=models.CASCADE, primary_key=True, related_name="compliance")
+    # Copie de vehicle.user pour servir "mes véhicules" sans jointure
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="vehicle_compliances")
+    insurance_days_left = models.IntegerField()
+    technical_days_left = models.IntegerField()
+    days_left = models.IntegerField()  # Plus proche des deux échéances
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=OK)
+    computed_on = models.DateField()
+
+    def __str__(self):
+        return f"{self.vehicle_id} - {self.get_status_display()} ({self.days_left} j)"
+
+    class Meta:
+        verbose_name = "Conformité du véhicule"
+        verbose_name_plural = "Conformité des véhicules"
+        indexes = [
+            models.Index(fields=["user", "days_left"], name="compliance_user_days_idx"),
+            models.Index(fields=["user", "status"], name="compliance_user_status_idx"),
+            models.Index(fields=["status", "days_left"], name="compliance_status_days_idx"),
+            models.Index(fields=["computed_on"], name="compliance_computed_on_idx"),
+        ]
+
 
 class TollTransaction(models.Model):
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name="vehicle_tolltransaction_set")
@@ -119,11 +172,19 @@ def check_expired_vehicles():
     expired_vehicles = Vehicle.objects.filter(insurance_expiration__lt=now().date())
     for vehicle in expired_vehicles:
         send_mail("Renouvellement de Carte Grise", f"Votre carte grise pour {vehicle.model} a expire. Veuillez effectuer un paiement.", "noreply@gestionvehicules.com", [vehicle.owner.email])
-        
-class Vehicle(models.Model):
-    ...
-    toll_balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
-    def update_balance(self, amount):
-        self.toll_balance -= amount
-        self.save()
+
+# Envoi fractionné et reprenable d'un document (voir core/uploads.py et les vues document_upload_*)
+class DocumentUpload(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name="document_uploads")
+    document_type = models.CharField(max_length=100)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()  # Taille annoncée
+    offset = models.PositiveBigIntegerField(default=0)  # Octets reçus et confirmés
+    document = models.ForeignKey(Document, null=True, blank=True, on_delete=models.SET_NULL, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
@@ -0,0 +1,128 @@
+import base64
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from core.normalization import normalize_plate, normalize_text, normalize_vin
+from .models import Vehicle
+
+# Nombre de résultats par page
+SEARCH_PAGE_SIZE = 20
+# Taille des lots lors de la réindexation
+REINDEX_BATCH_SIZE = 2000
+
+
+def build_search_fields(vehicle, brand_name=None, model_name=None):
+    """
+    Calcule les clés de recherche normalisées d'un véhicule. Les noms de
+    marque et de modèle peuvent être fournis pour éviter de les charger.
+    """
+    brand_name = brand_name if brand_name is not None else vehicle.brand.name
+    model_name = model_name if model_name is not None else vehicle.model.name
+    vehicle.search_plate = normalize_plate(vehicle.license_plate)
+    vehicle.search_vin = normalize_vin(vehicle.vin_number)
+    vehicle.search_text = normalize_text(f"{brand_name} {model_name} {vehicle.color}")[:255]
+
+
+def reindex_vehicles(queryset, batch_size=REINDEX_BATCH_SIZE):
+    """Recalcule les clés de recherche (ex. après le renommage d'une marque)."""
+    vehicles = queryset.select_related("brand", "model").order_by("pk")
+    batch = []
+    for vehicle in vehicles.iterator(chunk_size=batch_size):
+        build_search_fields(vehicle)
+        batch.append(vehicle)
+        if len(batch) >= batch_size:
+            Vehicle.objects.bulk_update(batch, ["search_plate", "search_vin", "search_text"])
+            batch = []
+    if batch:
+        Vehicle.objects.bulk_update(batch, ["search_plate", "search_vin", "search_text"])
+
+
+def encode_cursor(rank, pk):
+    return base64.urlsafe_b64encode(f"{rank!r}:{pk}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Renvoie (rang, pk) ou None si le curseur est absent ou invalide."""
+    if not cursor:
+        return None
+    try:
+        rank, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return float(rank), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _exact_and_prefix_rank(key):
+    """Score des correspondances exactes / par préfixe sur plaque et VIN."""
+    if not key:
+        return Value(0.0, output_field=FloatField())
+    return Case(
+        When(Q(search_plate=key) | Q(search_vin=key), then=Value(3.0)),
+        When(Q(search_plate__startswith=key) | Q(search_vin__startswith=key), then=Value(2.0)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def _postgres_search(queryset, key, text):
+    """Préfixes (index varchar_pattern_ops) + similarité trigramme (index GIN pg_trgm)."""
+    from django.contrib.postgres.search import TrigramSimilarity, TrigramWordSimilarity
+
+    condition = Q(search_text__trigram_word_similar=text)
+    similarity = TrigramWordSimilarity(Value(text), "search_text")
+    if key:
+        condition |= (
+            Q(search_plate__startswith=key)
+            | Q(search_vin__startswith=key)
+            | Q(search_plate__trigram_similar=key)
+        )
+        similarity = similarity + TrigramSimilarity("search_plate", Value(key))
+    return queryset.filter(condition).annotate(rank=_exact_and_prefix_rank(key) + similarity)
+
+
+def _fallback_search(queryset, key, text):
+    """Repli portable (SQLite) : préfixes indexés + recherche de chaque mot dans le texte."""
+    rank = _exact_and_prefix_rank(key)
+    condition = Q(pk__in=[])
+    if key:
+        condition |= Q(search_plate__startswith=key) | Q(search_vin__startswith=key)
+    if text:
+        text_match = Q()
+        for term in text.split():
+            text_match &= Q(search_text__contains=term)
+        condition |= text_match
+        rank = rank + Case(When(text_match, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
+    return queryset.filter(condition).annotate(rank=rank)
+
+
+def search_vehicles(queryset, query, cursor=None, limit=SEARCH_PAGE_SIZE):
+    """
+    Recherche sur plaque, VIN, marque, modèle et couleur.
+    Les résultats sont classés par pertinence puis par identifiant, et paginés
+    par curseur (rang, pk) : pas d'OFFSET, chaque page coûte le même prix.
+    Renvoie (véhicules, curseur_suivant).
+    """
+    key = normalize_plate(query)
+    text = normalize_text(query)
+    if not key and not text:
+        return [], None
+
+    if connection.vendor == "postgresql":
+        results = _postgres_search(queryset, key, text)
+    else:
+        results = _fallback_search(queryset, key, text)
+
+    position = decode_cursor(cursor)
+    if position:
+        rank, pk = position
+        results = results.filter(Q(rank__lt=rank) | Q(rank=rank, pk__gt=pk))
+
+    vehicles = list(
+        results.select_related("brand", "model")
+        .order_by(F("rank").desc(), "pk")[:limit + 1]
+    )
+    next_cursor = None
+    if len(vehicles) > limit:
+        vehicles = vehicles[:limit]
+        last = vehicles[-1]
+        next_cursor = encode_cursor(last.rank, last.pk)
+    return vehicles, next_cursor
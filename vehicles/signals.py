@@ -0,0 +1,104 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.db import transaction
+from core.cache import invalidate_user_on_commit
+from .models import Brand, Document, Vehicle, VehicleModel
+from .catalog import get_catalog
+from .compliance import refresh_vehicle_compliance
+from .search import build_search_fields, reindex_vehicles
+
+
+@receiver(pre_save, sender=Vehicle)
+def prepare_vehicle_save(sender, instance, raw=False, **kwargs):
+    """
+    Une seule lecture de la ligne enregistrée (jointe à la marque et au
+    modèle) sert aux clés de recherche normalisées et à l'ancien
+    propriétaire, dont le cache est aussi invalidé en cas de transfert.
+    """
+    instance._previous_user_id = None
+    if raw:
+        return
+    names = {}
+    if instance.pk is not None:
+        row = (
+            Vehicle.objects.filter(pk=instance.pk)
+            .values("user_id", "brand_id", "model_id", "brand__name", "model__name")
+            .first()
+        )
+        if row is not None:
+            instance._previous_user_id = row["user_id"]
+            if row["brand_id"] == instance.brand_id:
+                names["brand_name"] = row["brand__name"]
+            if row["model_id"] == instance.model_id:
+                names["model_name"] = row["model__name"]
+    build_search_fields(instance, **names)
+
+
+@receiver(post_save, sender=Vehicle)
+def update_vehicle_compliance(sender, instance, raw=False, **kwargs):
+    """Recalcule l'état de conformité à chaque sauvegarde du véhicule."""
+    if raw:
+        return
+    refresh_vehicle_compliance(instance)
+
+
+@receiver(pre_save, sender=Brand)
+@receiver(pre_save, sender=VehicleModel)
+def detect_name_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Repère un renommage : seul le nom fait partie du texte indexé des véhicules."""
+    instance._name_changed = False
+    if raw or instance.pk is None or (update_fields is not None and "name" not in update_fields):
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list("name", flat=True).first()
+    instance._name_changed = previous is not None and previous != instance.name
+
+
+@receiver(post_save, sender=Brand)
+def reindex_brand_vehicles(sender, instance, created, raw=False, **kwargs):
+    """Le nom de la marque fait partie du texte indexé : réindexer ses véhicules s'il change."""
+    if raw or created or not getattr(instance, "_name_changed", False):
+        return
+    reindex_vehicles(Vehicle.objects.filter(brand=instance))
+
+
+@receiver(post_save, sender=VehicleModel)
+def reindex_model_vehicles(sender, instance, created, raw=False, **kwargs):
+    if raw or created or not getattr(instance, "_name_changed", False):
+        return
+    reindex_vehicles(Vehicle.objects.filter(model=instance))
+
+
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+def invalidate_vehicle_cache(sender, instance, **kwargs):
+    invalidate_user_on_commit(instance.user_id, getattr(instance, "_previous_user_id", None))
+
+
+@receiver(post_save, sender=Document)
+@receiver(pre_delete, sender=Document)
+def invalidate_document_cache(sender, instance, **kwargs):
+    """Un document peut être rattaché aux véhicules de plusieurs utilisateurs."""
+    if instance.pk is None:
+        return
+    user_ids = Vehicle.objects.filter(documents=instance).values_list("user_id", flat=True).distinct()
+    invalidate_user_on_commit(*user_ids)
+
+
+@receiver(m2m_changed, sender=Vehicle.documents.through)
+def invalidate_vehicle_documents_cache(sender, instance, action, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if isinstance(instance, Vehicle):
+        invalidate_user_on_commit(instance.user_id)
+    else:
+        invalidate_document_cache(Document, instance)
+
+
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=VehicleModel)
+@receiver(post_delete, sender=VehicleModel)
+def invalidate_catalog(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(get_catalog().invalidate)
@@ -1,13 +1,19 @@
-from celery import shared_task
-from django.core.mail import send_mail
+import logging
+import time
+from celery import chord, shared_task
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.db.models import Q
 from datetime import date, timedelta
-from .models import Vehicle
+from .models import DocumentUpload, Vehicle, COMPLIANCE_WINDOW_DAYS
+from .compliance import refresh_all_compliance
 from django.conf import settings
 from django.utils import timezone
 from django.template.loader import render_to_string
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode
 
+logger = logging.getLogger(__name__)
+
 
 def send_activation_email(user):
     token = default_token_generator.make_token(user)
@@ -33,38 +39,158 @@ def send_confirmation_email(user_email):
     send_mail(subject, message, from_email, recipient_list)
 
 
-@shared_task
-def send_vehicle_reminders():
-    today = timezone.now().date()
-    reminder_days = 30  # Nombre de jours avant expiration pour envoyer un rappel
-
-    # Optimisation des requêtes en utilisant un seul filtre
-    vehicles = Vehicle.objects.filter(
-        insurance_expiry_date__lte=today + timedelta(days=reminder_days)
-    ) | Vehicle.objects.filter(
-        technical_control_date__lte=today + timedelta(days=reminder_days)
-    )
+# Paramètres du pipeline de rappels
+REMINDER_DAYS = COMPLIANCE_WINDOW_DAYS  # Nombre de jours avant expiration pour envoyer un rappel
+REMINDER_FROM_EMAIL = "noreply@gestion-vehicules.com"
+REMINDER_SUBJECT = "🔔 Rappel de maintenance de votre véhicule"
+REMINDER_MESSAGE = """
+        Bonjour {username},
 
-    for vehicle in vehicles:
-        user_email = vehicle.user.email
-        subject = "🔔 Rappel de maintenance de votre véhicule"
-        message = f"""
-        Bonjour {vehicle.user.username},
-
-        Nous vous rappelons que votre véhicule {vehicle.brand} {vehicle.model} (Plaque : {vehicle.license_plate})
+        Nous vous rappelons que votre véhicule {brand} {model} (Plaque : {license_plate})
         nécessite une mise à jour : 
 
-        - Assurance expirant le {vehicle.insurance_expiry_date} 🚗
-        - Contrôle technique prévu le {vehicle.technical_control_date} 🔧
+        - Assurance expirant le {insurance_expiry_date} 🚗
+        - Contrôle technique prévu le {next_technical_check} 🔧
 
         Merci de prendre les mesures nécessaires.
 
         L'équipe Gestion Véhicules.
         """
 
-        send_mail(subject, message, "noreply@gestion-vehicules.com", [user_email])
-    
-    return f"{len(vehicles)} notifications envoyées."
+
+def _reminder_queryset(today):
+    """Véhicules dont l'assurance ou le contrôle technique arrive à échéance."""
+    limit = today + timedelta(days=REMINDER_DAYS)
+    return Vehicle.objects.filter(
+        Q(insurance_expiry_date__lte=limit) | Q(next_technical_check__lte=limit)
+    )
+
+
+def _iter_reminder_chunks(queryset, chunk_size):
+    """
+    Parcourt les clés primaires par ordre croissant (pagination par curseur)
+    et renvoie les bornes (premier_pk, dernier_pk) de chaque lot de chunk_size véhicules.
+    """
+    last_pk = None
+    while True:
+        page = queryset.order_by("pk")
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        pks = list(page.values_list("pk", flat=True)[:chunk_size])
+        if not pks:
+            return
+        yield pks[0], pks[-1]
+        last_pk = pks[-1]
+
+
+def _build_reminder(vehicle):
+    message = REMINDER_MESSAGE.format(
+        username=vehicle.user.username,
+        brand=vehicle.brand.name,
+        model=vehicle.model.name,
+        license_plate=vehicle.license_plate,
+        insurance_expiry_date=vehicle.insurance_expiry_date,
+        next_technical_check=vehicle.next_technical_check,
+    )
+    return EmailMessage(REMINDER_SUBJECT, message, REMINDER_FROM_EMAIL, [vehicle.user.email])
+
+
+@shared_task
+def send_vehicle_reminder_chunk(first_pk, last_pk, today_iso):
+    """
+    Envoie les rappels d'un lot de véhicules (bornes de clé primaire incluses).
+    Une seule requête charge véhicules, utilisateurs, marques et modèles,
+    et tous les emails du lot partent sur une seule connexion SMTP.
+    """
+    started = time.monotonic()
+    today = date.fromisoformat(today_iso)
+    vehicles = (
+        _reminder_queryset(today)
+        .filter(pk__gte=first_pk, pk__lte=last_pk)
+        .select_related("user", "brand", "model")
+        .only(
+            "license_plate", "insurance_expiry_date", "next_technical_check",
+            "user", "brand", "model", "user__username", "user__email", "brand__name", "model__name",
+        )
+        .order_by("pk")
+    )
+    emails = [_build_reminder(vehicle) for vehicle in vehicles if vehicle.user.email]
+
+    sent = 0
+    if emails:
+        connection = get_connection(fail_silently=True)
+        sent = connection.send_messages(emails) or 0
+
+    return {
+        "vehicles": len(emails),
+        "sent": sent,
+        "elapsed": time.monotonic() - started,
+    }
+
+
+@shared_task
+def summarize_vehicle_reminders(results, started_at):
+    """Agrège les résultats des lots et calcule le débit de la campagne."""
+    vehicles = sum(result["vehicles"] for result in results)
+    sent = sum(result["sent"] for result in results)
+    elapsed = max(time.time() - started_at, 1e-6)
+    summary = {
+        "chunks": len(results),
+        "vehicles": vehicles,
+        "sent": sent,
+        "failed": vehicles - sent,
+        "elapsed_seconds": round(elapsed, 3),
+        "emails_per_second": round(sent / elapsed, 1),
+    }
+    logger.info(
+        "Rappels véhicules : %(sent)s/%(vehicles)s envoyés en %(elapsed_seconds)ss "
+        "(%(emails_per_second)s emails/s, %(chunks)s lots)", summary
+    )
+    return summary
+
+
+@shared_task
+def send_vehicle_reminders(chunk_size=None):
+    """
+    Planifie les rappels : découpe les véhicules concernés en lots
+    ordonnés par clé primaire et les traite en parallèle via un chord.
+    """
+    chunk_size = chunk_size or getattr(settings, "VEHICLE_REMINDER_CHUNK_SIZE", 1000)
+    today = timezone.now().date()
+
+    chunks = [
+        send_vehicle_reminder_chunk.s(first_pk, last_pk, today.isoformat())
+        for first_pk, last_pk in _iter_reminder_chunks(_reminder_queryset(today), chunk_size)
+    ]
+    if not chunks:
+        return "0 notifications envoyées."
+
+    chord(chunks)(summarize_vehicle_reminders.s(time.time()))
+    return f"{len(chunks)} lots de rappels planifiés."
+
+
+@shared_task
+def refresh_vehicle_compliance():
+    """Recalcul nocturne de la table de conformité des véhicules."""
+    result = refresh_all_compliance()
+    return f"{result['shifted']} statuts recalculés, {result['created']} créés."
+
+
+@shared_task
+def purge_stale_document_uploads():
+    """Abandonne les envois fractionnés inactifs (fichiers partiels compris)."""
+    from core.uploads import discard_part
+
+    cutoff = timezone.now() - timedelta(hours=getattr(settings, "CHUNKED_UPLOAD_EXPIRY_HOURS", 24))
+    stale = DocumentUpload.objects.filter(updated_at__lt=cutoff)
+    count = 0
+    for upload_id, document_id in stale.values_list("id", "document_id").iterator():
+        if document_id is None:
+            discard_part(upload_id)
+        count += 1
+    stale.delete()
+    logger.info("%s envois fractionnés expirés supprimés", count)
+    return count
 
 
 @shared_task
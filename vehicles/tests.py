@@ -1,3 +1,648 @@
-from django.test import TestCase
+import datetime
+import io
+import shutil
+import tempfile
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core import mail
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import get_connection
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from core.cache import cache_stats
+from core.models import Blob
+from core.thumbnails import (
+    THUMBNAIL_FORMATS, THUMBNAIL_SIZES, ThumbnailError, generate_thumbnails, thumbnail_name, thumbnails_exist,
+)
+from core.uploads import apply_upload_errors, part_path, receive_chunk
+from .catalog import get_catalog, upsert_catalog
+from .compliance import compute_compliance, create_missing_compliance, get_status, refresh_all_compliance
+from .forms import DocumentForm, VehicleSelectionForm
+from .importer import VehicleImporter, read_rows
+from .models import (
+    COMPLIANCE_WINDOW_DAYS, Brand, Document, DocumentUpload, Vehicle, VehicleCompliance, VehicleModel,
+)
+from .search import search_vehicles
+from .task import _iter_reminder_chunks, _reminder_queryset, send_vehicle_reminder_chunk, send_vehicle_reminders
+from .views import get_cached_vehicle, get_vehicle_page, vehicle_list_context
 
-# Create your tests here.
+
+def create_vehicle(user, brand, model, index, **kwargs):
+    today = datetime.date.today()
+    fields = {
+        'user': user,
+        'brand': brand,
+        'model': model,
+        'year': 2020,
+        'license_plate': f"AB{index:03d}CD",
+        'color': "Rouge",
+        'vin_number': f"VF1{index:014d}",
+        'purchase_date': today - datetime.timedelta(days=365),
+        'mileage': 10000,
+        'fuel_type': 'Essence',
+        'insurance_company': "Assur",
+        'insurance_policy_number': f"POL{index}",
+        'insurance_expiry_date': today + datetime.timedelta(days=200),
+        'last_technical_check': today - datetime.timedelta(days=100),
+        'next_technical_check': today + datetime.timedelta(days=265),
+    }
+    fields.update(kwargs)
+    return Vehicle.objects.create(**fields)
+
+
+class VehicleSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="alice", password="Secret123!")
+        renault = Brand.objects.create(name="Renault")
+        peugeot = Brand.objects.create(name="Peugeot")
+        clio = VehicleModel.objects.create(brand=renault, name="Clio")
+        partner = VehicleModel.objects.create(brand=peugeot, name="Partner")
+        for index in range(5):
+            create_vehicle(cls.user, renault, clio, index)
+        create_vehicle(cls.user, peugeot, partner, 99, color="Bleu")
+
+    def test_plate_prefix_is_normalized(self):
+        results, _ = search_vehicles(Vehicle.objects.all(), "ab-001 c")
+        self.assertEqual([vehicle.license_plate for vehicle in results], ["AB001CD"])
+
+    def test_exact_plate_ranks_first(self):
+        results, _ = search_vehicles(Vehicle.objects.all(), "AB 00")
+        self.assertEqual(len(results), 5)
+        results, _ = search_vehicles(Vehicle.objects.all(), "ab002cd")
+        self.assertEqual(results[0].license_plate, "AB002CD")
+
+    def test_brand_model_and_color(self):
+        results, _ = search_vehicles(Vehicle.objects.all(), "peugeot bleu")
+        self.assertEqual([vehicle.license_plate for vehicle in results], ["AB099CD"])
+
+    def test_keyset_pagination(self):
+        first, cursor = search_vehicles(Vehicle.objects.all(), "renault", limit=3)
+        second, last_cursor = search_vehicles(Vehicle.objects.all(), "renault", cursor=cursor, limit=3)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertIsNone(last_cursor)
+        self.assertFalse({v.pk for v in first} & {v.pk for v in second})
+
+    def test_only_renaming_reindexes_vehicles(self):
+        brand = Brand.objects.get(name="Peugeot")
+        with mock.patch("vehicles.signals.reindex_vehicles") as reindex:
+            brand.save()
+            brand.save(update_fields=["name"])
+            reindex.assert_not_called()
+        brand.name = "Citroën"
+        brand.save()
+        results, _ = search_vehicles(Vehicle.objects.all(), "citroen")
+        self.assertEqual([vehicle.license_plate for vehicle in results], ["AB099CD"])
+
+
+class VehicleListQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="fleet", password="Secret123!")
+        brand = Brand.objects.create(name="Renault")
+        model = VehicleModel.objects.create(brand=brand, name="Kangoo")
+        for index in range(120):
+            create_vehicle(cls.user, brand, model, index, year=2000 + index % 7)
+
+    def render_rows(self, page):
+        # Ce que le gabarit vehicle_list.html affiche pour chaque ligne
+        return [(str(vehicle), vehicle.year, vehicle.license_plate, vehicle.mileage) for vehicle in page]
+
+    def test_each_page_costs_one_query(self):
+        for sort in ("id", "plate", "year"):
+            cursor, seen = None, []
+            while True:
+                with self.assertNumQueries(1):
+                    page = get_vehicle_page(self.user, cursor, sort, per_page=50)
+                    rows = self.render_rows(page)
+                seen.extend(vehicle.pk for vehicle in page)
+                self.assertEqual(len(rows), len(page))
+                if not page.has_next:
+                    break
+                cursor = page.next_cursor
+            self.assertEqual(len(seen), 120)
+            self.assertEqual(len(set(seen)), 120)
+
+    def test_year_sort_is_descending(self):
+        page = get_vehicle_page(self.user, sort="year", per_page=120)
+        years = [vehicle.year for vehicle in page]
+        self.assertEqual(years, sorted(years, reverse=True))
+
+
+class VehicleCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="cached", password="Secret123!", is_active=True)
+        cls.brand = Brand.objects.create(name="Renault")
+        cls.model = VehicleModel.objects.create(brand=cls.brand, name="Zoe")
+        cls.vehicle = create_vehicle(cls.user, cls.brand, cls.model, 1)
+
+    def setUp(self):
+        cache.clear()
+        request = RequestFactory().get("/vehicles/")
+        request.user = self.user
+        self.request = request
+
+    def test_list_is_served_from_cache(self):
+        vehicle_list_context(self.request)
+        with self.assertNumQueries(0):
+            context = vehicle_list_context(self.request)
+        self.assertEqual([vehicle.pk for vehicle in context["vehicles"]], [self.vehicle.pk])
+        self.assertGreaterEqual(cache_stats()["vehicle_list"]["hits"], 1)
+
+    def test_save_invalidates_list_and_detail(self):
+        vehicle_list_context(self.request)
+        get_cached_vehicle(self.user, self.vehicle.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_vehicle(self.user, self.brand, self.model, 2)
+            self.vehicle.color = "Bleu"
+            self.vehicle.save()
+            # Invalidation après validation : un lecteur ne remet pas en cache l'état d'avant
+            self.assertEqual(len(vehicle_list_context(self.request)["vehicles"]), 1)
+
+        context = vehicle_list_context(self.request)
+        self.assertEqual(len(context["vehicles"]), 2)
+        self.assertEqual(get_cached_vehicle(self.user, self.vehicle.pk).color, "Bleu")
+
+    def test_save_reads_brand_and_model_with_the_stored_row(self):
+        vehicle = Vehicle.objects.get(pk=self.vehicle.pk)
+        vehicle.color = "Vert"
+        with CaptureQueriesContext(connection) as queries:
+            vehicle.save()
+        lookups = [
+            query["sql"] for query in queries.captured_queries
+            if 'FROM "vehicles_brand"' in query["sql"] or 'FROM "vehicles_vehiclemodel"' in query["sql"]
+        ]
+        self.assertEqual(lookups, [])
+        self.assertEqual(vehicle.search_text, "renault zoe vert")
+
+    def test_async_views_share_the_cache(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("vehicle_list"), secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([vehicle.pk for vehicle in response.context["vehicles"]], [self.vehicle.pk])
+        vehicle_list_context(self.request)  # Même clé que la vue asynchrone : servie depuis le cache
+        self.assertGreaterEqual(cache_stats()["vehicle_list"]["hits"], 1)
+
+        response = self.client.get(reverse("vehicle_detail", args=[self.vehicle.pk]), secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["vehicle"].vin_number, self.vehicle.vin_number)
+        other = get_user_model().objects.create_user(username="other", password="Secret123!", is_active=True)
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse("vehicle_detail", args=[self.vehicle.pk]), secure=True).status_code, 404)
+
+
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root, PROTECTED_MEDIA_SERVER="")
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        from PIL import Image
+
+        self.user = get_user_model().objects.create_user(username="thumbs", password="Secret123!", is_active=True)
+        brand = Brand.objects.create(name="Renault")
+        vehicle = create_vehicle(self.user, brand, VehicleModel.objects.create(brand=brand, name="Clio"), 1)
+        buffer = io.BytesIO()
+        Image.new("RGB", (1600, 1200), "red").save(buffer, "PNG")
+        self.document = Document(document_type="registration")
+        self.document.file.save("carte_grise.png", ContentFile(buffer.getvalue()))
+        vehicle.documents.add(self.document)
+
+    def test_all_sizes_and_formats_are_written_next_to_the_original(self):
+        from PIL import Image
+
+        names = generate_thumbnails(self.document.file)
+        self.assertEqual(len(names), len(THUMBNAIL_SIZES) * len(THUMBNAIL_FORMATS))
+        storage = self.document.file.storage
+        with storage.open(thumbnail_name(self.document.file.name, "small", "jpeg")) as thumb:
+            self.assertEqual(max(Image.open(thumb).size), THUMBNAIL_SIZES["small"])
+
+    def test_missing_thumbnail_is_built_on_request_and_cached_long(self):
+        self.client.force_login(self.user)
+        url = reverse("thumbnail", args=["document", self.document.pk, "file", "medium"])
+        response = self.client.get(url, HTTP_ACCEPT="image/webp,*/*", secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("Accept", response["Vary"])
+        response = self.client.get(url, HTTP_ACCEPT="image/png", secure=True)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+
+        other = get_user_model().objects.create_user(username="intrus", password="Secret123!", is_active=True)
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url, secure=True).status_code, 404)
+
+    def test_legacy_document_thumbnails_keep_their_derived_name(self):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (640, 480), "navy").save(buffer, "PNG")
+        storage = self.document.file.storage
+        # Document enregistré avant le stockage par empreinte : nom d'origine hors de blobs/
+        legacy = FileSystemStorage.save(storage, "documents/ancienne_carte.png", ContentFile(buffer.getvalue()))
+        document = Document.objects.create(document_type="registration", file=legacy)
+        blobs = Blob.objects.count()
+
+        names = generate_thumbnails(document.file)
+        self.assertEqual(
+            sorted(names),
+            sorted(thumbnail_name(legacy, size, fmt) for size in THUMBNAIL_SIZES for fmt in THUMBNAIL_FORMATS),
+        )
+        self.assertTrue(thumbnails_exist(document.file))
+        self.assertEqual(Blob.objects.count(), blobs)
+
+        self.document.vehicles.get().documents.add(document)
+        self.client.force_login(self.user)
+        url = reverse("thumbnail", args=["document", document.pk, "file", "small"])
+        with mock.patch("core.thumbnails.generate_thumbnails") as regenerate:
+            response = self.client.get(url, HTTP_ACCEPT="image/webp", secure=True)
+        self.assertEqual(response.status_code, 200)
+        regenerate.assert_not_called()
+
+    def test_unreadable_pdf_raises_thumbnail_error(self):
+        document = Document(document_type="insurance")
+        document.file.save("illisible.pdf", ContentFile(b"%PDF-1.4 tronque"))
+        with self.assertRaises(ThumbnailError):
+            generate_thumbnails(document.file)
+
+
+class UploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(
+            MEDIA_ROOT=media_root, CHUNKED_UPLOAD_DIR=f"{media_root}/parts", CHUNKED_UPLOAD_CHUNK_SIZE=8,
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = get_user_model().objects.create_user(username="mobile", password="Secret123!", is_active=True)
+        brand = Brand.objects.create(name="Renault")
+        self.vehicle = create_vehicle(self.user, brand, VehicleModel.objects.create(brand=brand, name="Master"), 1)
+        self.client.force_login(self.user)
+
+    def post_document(self, content, filename="scan.pdf"):
+        url = reverse("add_document_to_vehicle", args=[self.vehicle.pk])
+        request = RequestFactory().post(
+            url, {"document_type": "assurance", "file": SimpleUploadedFile(filename, content)}, secure=True,
+        )
+        request.resolver_match = resolve(url)
+        return request
+
+    def test_bad_signature_is_dropped_while_streaming(self):
+        request = self.post_document(b"MZ\x90\x00 pas un PDF")
+        self.assertNotIn("file", request.FILES)
+        form = apply_upload_errors(DocumentForm(request.POST, request.FILES), request)
+        self.assertEqual(form.errors["file"], ["Le contenu du fichier ne correspond pas à son format."])
+
+        self.assertIn("file", self.post_document(b"%PDF-1.4 attestation").FILES)
+
+    @override_settings(UPLOAD_MAX_SIZE=1024)
+    def test_oversized_file_is_dropped_while_streaming(self):
+        request = self.post_document(b"%PDF-1.4" + b"0" * 2048)
+        self.assertNotIn("file", request.FILES)
+        self.assertIn("file", request.upload_errors)
+
+    def send_chunk(self, url, data, offset):
+        return self.client.generic(
+            "PATCH", url, data, content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset), secure=True,
+        )
+
+    def test_chunked_upload_resumes_and_creates_document(self):
+        content = b"%PDF-1.4 carte grise scannee"
+        response = self.client.post(
+            reverse("document_upload_start", args=[self.vehicle.pk]),
+            {"filename": "carte_grise.pdf", "size": len(content), "document_type": "registration"}, secure=True,
+        )
+        self.assertEqual(response.status_code, 201)
+        url = response["Location"]
+
+        self.assertEqual(self.send_chunk(url, content[:8], 0).json()["offset"], 8)
+        # Morceau rejoué après une coupure : position attendue renvoyée
+        response = self.send_chunk(url, content[:8], 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Upload-Offset"], "8")
+        self.assertEqual(self.client.get(url, secure=True).json()["offset"], 8)
+
+        offset = 8
+        while offset < len(content):
+            response = self.send_chunk(url, content[offset:offset + 8], offset)
+            offset = response.json()["offset"]
+        self.assertEqual(response.status_code, 201)
+        document = self.vehicle.documents.get()
+        self.assertEqual(document.pk, response.json()["document_id"])
+        with document.file.open("rb") as stored:
+            self.assertEqual(stored.read(), content)
+
+    def test_chunked_upload_checks_signature_of_first_chunk(self):
+        upload = DocumentUpload.objects.create(
+            vehicle=self.vehicle, document_type="assurance", filename="scan.pdf", size=8,
+        )
+        response = self.send_chunk(reverse("document_upload", args=[upload.id]), b"GIF89a..", 0)
+        self.assertEqual(response.status_code, 415)
+        other = get_user_model().objects.create_user(username="autre", password="Secret123!", is_active=True)
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse("document_upload", args=[upload.id]), secure=True).status_code, 404)
+
+    def test_chunk_is_received_before_locking_and_offset_rechecked(self):
+        upload = DocumentUpload.objects.create(
+            vehicle=self.vehicle, document_type="assurance", filename="scan.pdf", size=16,
+        )
+        url = reverse("document_upload", args=[upload.id])
+
+        retried = []
+
+        def concurrent_retry(*args, **kwargs):
+            chunk = receive_chunk(*args, **kwargs)
+            if not retried:
+                # Pendant la réception (sans verrou), un nouvel essai du même morceau aboutit
+                retried.append(True)
+                self.assertEqual(self.send_chunk(url, b"%PDF-1.4", 0).status_code, 200)
+            return chunk
+
+        with mock.patch("vehicles.views.receive_chunk", side_effect=concurrent_retry):
+            response = self.send_chunk(url, b"%PDF-1.4", 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Upload-Offset"], "8")
+        self.assertEqual(part_path(upload.id).read_bytes(), b"%PDF-1.4")
+
+
+class CatalogTests(TestCase):
+    def setUp(self):
+        get_catalog().invalidate()
+        self.addCleanup(get_catalog().invalidate)
+
+    def test_bulk_upsert_is_idempotent_and_case_insensitive(self):
+        Brand.objects.create(name="Renault")
+        rows = [("renault", "Clio"), ("Renault", "clio"), ("Renault", "Megane"), ("Peugeot", "208"), ("", "X")]
+        self.assertEqual(upsert_catalog(rows, batch_size=2), (1, 3))
+        self.assertEqual(upsert_catalog(rows), (0, 0))
+        self.assertEqual(Brand.objects.count(), 2)
+        self.assertEqual(VehicleModel.objects.filter(brand__name="Renault").count(), 2)
+
+    def test_endpoint_uses_etag_and_follows_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            upsert_catalog([("Renault", "Clio"), ("Renault", "Zoe"), ("Dacia", "Duster")])
+        response = self.client.get(reverse("vehicle_catalog"), secure=True)
+        self.assertEqual(response.status_code, 200)
+        brands = response.json()["brands"]
+        self.assertEqual([brand[1] for brand in brands], ["Dacia", "Renault"])
+        self.assertEqual([model[1] for model in brands[1][2]], ["Clio", "Zoe"])
+        etag = response["ETag"]
+        response = self.client.get(reverse("vehicle_catalog"), HTTP_IF_NONE_MATCH=etag, secure=True)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Brand.objects.create(name="Alpine")
+        response = self.client.get(reverse("vehicle_catalog"), HTTP_IF_NONE_MATCH=etag, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_selection_form_renders_from_memory(self):
+        upsert_catalog([("Renault", "Clio"), ("Renault", "Zoe"), ("Dacia", "Duster")])
+        renault = Brand.objects.get(name="Renault")
+        get_catalog().payload()
+        with self.assertNumQueries(0):
+            html = str(VehicleSelectionForm(brand=renault))
+        self.assertIn("Zoe", html)
+        self.assertNotIn("Duster</option>", html.split('name="model"')[1])
+        form = VehicleSelectionForm({"brand": renault.pk, "model": VehicleModel.objects.get(name="Duster").pk})
+        self.assertFalse(form.is_valid())
+
+
+class ReminderPipelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="rappels", email="rappels@example.com", password="Secret123!",
+        )
+        brand = Brand.objects.create(name="Renault")
+        model = VehicleModel.objects.create(brand=brand, name="Trafic")
+        soon = datetime.date.today() + datetime.timedelta(days=10)
+        cls.due = [create_vehicle(cls.user, brand, model, index, insurance_expiry_date=soon) for index in range(5)]
+        create_vehicle(cls.user, brand, model, 99)
+
+    def test_chunks_cover_due_vehicles_in_pk_order(self):
+        chunks = list(_iter_reminder_chunks(_reminder_queryset(datetime.date.today()), 2))
+        pks = [vehicle.pk for vehicle in self.due]
+        self.assertEqual(chunks, [(pks[0], pks[1]), (pks[2], pks[3]), (pks[4], pks[4])])
+
+    def test_campaign_schedules_one_task_per_chunk(self):
+        with mock.patch("vehicles.task.chord") as chord:
+            self.assertEqual(send_vehicle_reminders(chunk_size=2), "3 lots de rappels planifiés.")
+        self.assertEqual(len(chord.call_args.args[0]), 3)
+
+    def test_chunk_sends_on_one_connection(self):
+        first, last = self.due[0].pk, self.due[-1].pk
+        with mock.patch("vehicles.task.get_connection", wraps=get_connection) as connection:
+            with self.assertNumQueries(1):
+                result = send_vehicle_reminder_chunk(first, last, datetime.date.today().isoformat())
+        connection.assert_called_once()
+        self.assertEqual((result["vehicles"], result["sent"]), (5, 5))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn(self.due[0].license_plate, mail.outbox[0].body)
+
+
+class ComplianceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="conformite", password="Secret123!")
+        brand = Brand.objects.create(name="Peugeot")
+        model = VehicleModel.objects.create(brand=brand, name="Expert")
+        today = datetime.date.today()
+        cls.vehicles = [
+            create_vehicle(cls.user, brand, model, index, insurance_expiry_date=today + datetime.timedelta(days=days))
+            for index, days in enumerate((5, 40, 200))
+        ]
+
+    def test_status_buckets(self):
+        self.assertEqual(get_status(-1), VehicleCompliance.EXPIRED)
+        self.assertEqual(get_status(0), VehicleCompliance.DUE_SOON)
+        self.assertEqual(get_status(COMPLIANCE_WINDOW_DAYS), VehicleCompliance.DUE_SOON)
+        self.assertEqual(get_status(COMPLIANCE_WINDOW_DAYS + 1), VehicleCompliance.OK)
+
+    def test_nightly_refresh_shifts_counters_and_buckets(self):
+        later = datetime.date.today() + datetime.timedelta(days=15)
+        self.assertEqual(refresh_all_compliance(later), {"shifted": 3, "created": 0})
+        rows = VehicleCompliance.objects.order_by("vehicle_id")
+        self.assertEqual(
+            [(row.days_left, row.status, row.computed_on) for row in rows],
+            [
+                (-10, VehicleCompliance.EXPIRED, later),
+                (25, VehicleCompliance.DUE_SOON, later),
+                (185, VehicleCompliance.OK, later),
+            ],
+        )
+        # Même résultat qu'un calcul complet
+        for vehicle, row in zip(self.vehicles, rows):
+            self.assertEqual(compute_compliance(vehicle, later).days_left, row.days_left)
+        self.assertEqual(refresh_all_compliance(later)["shifted"], 0)
+
+    def test_missing_rows_are_created_in_batches(self):
+        VehicleCompliance.objects.all().delete()
+        self.assertEqual(create_missing_compliance(batch_size=2), 3)
+        self.assertEqual(VehicleCompliance.objects.filter(status=VehicleCompliance.DUE_SOON).count(), 1)
+        self.assertEqual(create_missing_compliance(batch_size=2), 0)
+
+
+@override_settings(PROTECTED_MEDIA_SERVER="")
+class DocumentDownloadTests(TestCase):
+    content = b"%PDF-1.4 " + bytes(range(256)) * 4
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = get_user_model().objects.create_user(username="telechargement", password="Secret123!", is_active=True)
+        brand = Brand.objects.create(name="Renault")
+        vehicle = create_vehicle(self.user, brand, VehicleModel.objects.create(brand=brand, name="Clio"), 1)
+        document = Document(document_type="insurance")
+        document.file.save("assurance.pdf", ContentFile(self.content))
+        vehicle.documents.add(document)
+        self.url = reverse("download_document", args=[document.pk])
+        self.client.force_login(self.user)
+
+    def get(self, **headers):
+        return self.client.get(self.url, secure=True, **headers)
+
+    def test_full_download_then_not_modified(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        etag = response["ETag"]
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=f"W/{etag}").status_code, 304)
+
+    def test_partial_content(self):
+        response = self.get(HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.content)}")
+        self.assertEqual(b"".join(response.streaming_content), self.content[10:20])
+        response = self.get(HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(response.streaming_content), self.content[-5:])
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE=f"bytes={len(self.content)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.content)}")
+        # If-Range périmé : fichier complet plutôt que 416
+        response = self.get(HTTP_RANGE=f"bytes={len(self.content)}-", HTTP_IF_RANGE='"0-0"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+
+    def test_if_range_requires_a_strong_match(self):
+        response = self.get()
+        etag, modified = response["ETag"], response["Last-Modified"]
+        for validator in (etag, modified):
+            self.assertEqual(self.get(HTTP_RANGE="bytes=0-3", HTTP_IF_RANGE=validator).status_code, 206)
+        # ETag faible, ETag ou date périmés : fichier complet
+        for validator in (f"W/{etag}", '"0-0"', "Thu, 01 Jan 1998 00:00:00 GMT"):
+            response = self.get(HTTP_RANGE="bytes=0-3", HTTP_IF_RANGE=validator)
+            self.assertEqual(response.status_code, 200, validator)
+            self.assertEqual(b"".join(response.streaming_content), self.content)
+
+
+class VehicleImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="import", password="Secret123!", is_active=True)
+        brand = Brand.objects.create(name="Renault")
+        cls.model = VehicleModel.objects.create(brand=brand, name="Kangoo")
+        create_vehicle(cls.user, brand, cls.model, 1)  # AB001CD / VF100000000000001
+
+    def setUp(self):
+        cache.clear()
+
+    def csv_content(self):
+        today = datetime.date.today()
+        insurance, technical = today + datetime.timedelta(days=200), today + datetime.timedelta(days=300)
+        header = (
+            "brand;model;year;license_plate;color;vin_number;purchase_date;mileage;fuel_type;"
+            "insurance_company;insurance_policy_number;insurance_expiry_date;last_technical_check;"
+            "next_technical_check"
+        )
+        rows = [
+            # Valides (plaque et VIN normalisés)
+            ("renault", "kangoo", "ef-100-gh", "vf1aaaaaaaaaaa100"),
+            ("Renault", "Kangoo", "EF101GH", "VF1AAAAAAAAAAA101"),
+            # Doublons dans le fichier : plaque, puis VIN
+            ("Renault", "Kangoo", "EF 100 GH", "VF1AAAAAAAAAAA102"),
+            ("Renault", "Kangoo", "EF103GH", "VF1AAAAAAAAAAA101"),
+            # Déjà en base
+            ("Renault", "Kangoo", "AB001CD", "VF1AAAAAAAAAAA104"),
+            # Marque inconnue, VIN invalide
+            ("Tesla", "Model 3", "EF105GH", "COURT"),
+        ]
+        lines = [header] + [
+            f"{brand};{model};2021;{plate};Blanc;{vin};2021-01-15;12000;Diesel;Assur;POL1;"
+            f"{insurance};2024-01-01;{technical}"
+            for brand, model, plate, vin in rows
+        ]
+        return "\n".join(lines).encode()
+
+    def test_importer_validates_rows_and_invalidates_the_owner_cache(self):
+        request = RequestFactory().get("/vehicles/")
+        request.user = self.user
+        self.assertEqual(len(vehicle_list_context(request)["vehicles"]), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            report = VehicleImporter(self.user, batch_size=2).run(read_rows(io.BytesIO(self.csv_content()), "flotte.csv"))
+        self.assertEqual((report.created, report.rejected), (2, 4))
+        self.assertEqual(
+            {rejection["line"]: sorted(rejection["errors"]) for rejection in report.rejections},
+            {4: ["license_plate"], 5: ["vin_number"], 6: ["license_plate"], 7: ["brand", "vin_number"]},
+        )
+        imported = Vehicle.objects.filter(license_plate__in=["EF100GH", "EF101GH"])
+        self.assertEqual(imported.count(), 2)
+        self.assertEqual(VehicleCompliance.objects.filter(vehicle__in=imported).count(), 2)
+        self.assertEqual(imported.get(license_plate="EF100GH").vin_number, "VF1AAAAAAAAAAA100")
+        self.assertEqual(len(vehicle_list_context(request)["vehicles"]), 3)
+
+    def test_dry_run_saves_nothing(self):
+        report = VehicleImporter(self.user, dry_run=True).run(read_rows(io.BytesIO(self.csv_content()), "flotte.csv"))
+        self.assertEqual(report.created, 2)
+        self.assertEqual(Vehicle.objects.count(), 1)
+
+    def test_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = f"{directory}/flotte.csv"
+        with open(path, "wb") as file:
+            file.write(self.csv_content())
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command("import_vehicles", path, user="import", stdout=stdout, stderr=stderr)
+        self.assertIn("2 véhicules importés, 4 rejetés", stdout.getvalue())
+        self.assertIn("Ligne 7 rejetée", stderr.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("import_vehicles", path, user="inconnu", stdout=stdout, stderr=stderr)
+
+    def test_view(self):
+        self.client.force_login(self.user)
+        url = reverse("import_vehicles")
+        self.assertEqual(self.client.post(url, secure=True).status_code, 400)
+        response = self.client.post(
+            url, {"file": SimpleUploadedFile("flotte.csv", self.csv_content())}, secure=True,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["created"], response.json()["rejected"]), (2, 4))
+        self.assertEqual(Vehicle.objects.filter(user=self.user).count(), 3)
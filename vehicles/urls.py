@@ -4,22 +4,26 @@ from django.contrib.auth.decorators import login_required
 
 urlpatterns = [
     # Route pour afficher la liste des véhicules d'un utilisateur
-    path('my-vehicles/', login_required(views.VehicleListView.as_view()), name='vehicle_list'),
-    
-    path('', views.index, name='index'),
+    path('my-vehicles/', views.vehicle_list, name='vehicle_list'),  # Vue asynchrone
     
     # Inclure les URLs de l'app "users" pour la gestion des utilisateurs
     path('users/', include('users.urls')),  
 
     # Route pour afficher le détail d'un véhicule spécifique
-    path('vehicle/<int:pk>/', login_required(views.VehicleDetailView.as_view()), name='vehicle_detail'),
+    path('vehicle/<int:pk>/', views.vehicle_detail, name='vehicle_detail'),  # Vue asynchrone
 
     # Route pour ajouter un nouveau véhicule
     path('add-vehicle/', login_required(views.VehicleCreateView.as_view()), name='vehicle_create'),
 
+    # Route pour importer une flotte de véhicules (CSV/XLSX)
+    path('import-vehicles/', login_required(views.import_vehicles), name='import_vehicles'),
+
     # Route pour modifier un véhicule existant
     path('edit-vehicle/<int:pk>/', login_required(views.VehicleUpdateView.as_view()), name='vehicle_update'),
 
+    # Route pour supprimer un véhicule
+    path('delete-vehicle/<int:vehicle_id>/', views.vehicle_delete, name='vehicle_delete'),
+
     # Route pour supprimer (transférer) un véhicule à un autre utilisateur
     path('transfer-vehicle/<int:pk>/', login_required(views.VehicleTransferView.as_view()), name='vehicle_transfer'),
 
@@ -29,6 +33,13 @@ urlpatterns = [
     # Route pour télécharger un document associé à un véhicule
     path('download-document/<int:document_id>/', login_required(views.download_document), name='download_document'),
 
+    # Envoi fractionné et reprenable d'un document (connexions mobiles instables)
+    path('upload-document/<int:vehicle_id>/', views.document_upload_start, name='document_upload_start'),
+    path('uploads/<uuid:upload_id>/', views.document_upload, name='document_upload'),
+
+    # Catalogue marques / modèles des formulaires (JSON avec ETag)
+    path('catalog/', views.vehicle_catalog, name='vehicle_catalog'),
+
     # Route pour gérer les documents associés à un véhicule
     path('documents/<int:vehicle_id>/', login_required(views.VehicleDocumentsView.as_view()), name='vehicle_documents'),
 ]
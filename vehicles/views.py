@@ -1,13 +1,26 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import Http404, FileResponse
+from django.http import Http404, HttpResponse, JsonResponse
+from django.core.files import File
+from django.db import transaction
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
 from django.contrib import messages
 from django.utils import timezone
-from django.urls import reverse_lazy
-from .models import Vehicle, Document
+from django.urls import reverse, reverse_lazy
+from .models import Vehicle, Document, DocumentUpload
 from .forms import VehicleForm, DocumentForm
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, View
+from .catalog import get_catalog
+from .importer import VehicleImporter, read_rows
+from django.views.generic import DetailView, CreateView, UpdateView, View
 from django.contrib.auth.models import User
+from asgiref.sync import sync_to_async
+from core.cache import VEHICLE_DETAIL, VEHICLE_LIST, aget_or_set_for_user, get_or_set_for_user
+from core.files import etag_matches, serve_file
+from core.pagination import akeyset_paginate, keyset_paginate
+from core.uploads import (
+    DOCUMENT_KINDS, ChunkError, UploadErrorsMixin, append_chunk, apply_upload_errors, check_extension,
+    chunk_size_limit, chunked_upload_max_size, discard_part, part_path, receive_chunk,
+)
 
 class VehicleDocumentsView(DetailView):
     model = Vehicle
@@ -27,14 +40,26 @@ class VehicleDocumentsView(DetailView):
 @login_required
 def download_document(request, document_id):
     """Permet à un utilisateur de télécharger un document"""
-    document = get_object_or_404(Document, id=document_id)
-
-    # Vérification si l'utilisateur est autorisé à télécharger ce document
-    if document.vehicle.user != request.user:
+    # Contrôle d'accès et chargement du document en une seule requête
+    document = Document.objects.filter(id=document_id, vehicles__user=request.user).first()
+    if document is None:
         raise Http404("Vous n'êtes pas autorisé à télécharger ce document.")
 
-    response = FileResponse(document.file, as_attachment=True, filename=document.file.name)
-    return response
+    return serve_file(request, document.file)
+
+@login_required
+def import_vehicles(request):
+    """Import en masse d'une flotte (CSV/XLSX) pour l'utilisateur connecté ; renvoie un rapport JSON."""
+    if request.method != 'POST' or 'file' not in request.FILES:
+        return JsonResponse({'error': "Envoyez un fichier CSV ou XLSX dans le champ 'file'."}, status=400)
+
+    upload = request.FILES['file']
+    importer = VehicleImporter(request.user, dry_run=request.POST.get('dry_run') == '1')
+    try:
+        report = importer.run(read_rows(upload.file, upload.name))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(report.as_dict())
 
 @login_required
 def add_document_to_vehicle(request, vehicle_id):
@@ -42,7 +67,7 @@ def add_document_to_vehicle(request, vehicle_id):
     vehicle = get_object_or_404(Vehicle, id=vehicle_id, user=request.user)
 
     if request.method == 'POST':
-        form = DocumentForm(request.POST, request.FILES)
+        form = apply_upload_errors(DocumentForm(request.POST, request.FILES), request)
         if form.is_valid():
             document = form.save()
             vehicle.documents.add(document)
@@ -78,7 +103,7 @@ class VehicleTransferView(View):
         messages.success(request, f"Le véhicule {vehicle} a été transféré à {new_user}.")
         return redirect('vehicle_list')
 
-class VehicleUpdateView(UpdateView):
+class VehicleUpdateView(UploadErrorsMixin, UpdateView):
     model = Vehicle
     form_class = VehicleForm
     template_name = 'vehicles/vehicle_form.html'
@@ -88,7 +113,7 @@ class VehicleUpdateView(UpdateView):
         """Assurez-vous que l'utilisateur ne peut modifier que ses propres véhicules"""
         return Vehicle.objects.filter(user=self.request.user)
 
-class VehicleCreateView(CreateView):
+class VehicleCreateView(UploadErrorsMixin, CreateView):
     model = Vehicle
     form_class = VehicleForm
     template_name = 'vehicles/vehicle_form.html'
@@ -98,38 +123,99 @@ class VehicleCreateView(CreateView):
         form.instance.user = self.request.user  # Associe le véhicule à l'utilisateur connecté
         return super().form_valid(form)
 
-class VehicleDetailView(DetailView):
-    model = Vehicle
-    template_name = 'vehicles/vehicle_detail.html'
-    context_object_name = 'vehicle'
-
-    def get_queryset(self):
-        """Filtre les véhicules pour que l'utilisateur ne puisse voir que les siens"""
-        return Vehicle.objects.filter(user=self.request.user)
-
-class VehicleListView(ListView):
-    model = Vehicle
-    template_name = 'vehicles/vehicle_list.html'
-    context_object_name = 'vehicles'
-
-    def get_queryset(self):
-        """Récupère tous les véhicules de l'utilisateur connecté"""
-        return Vehicle.objects.filter(user=self.request.user)
-
+# Tris proposés pour la liste des véhicules (clés de pagination par curseur)
+VEHICLE_LIST_SORTS = {
+    'id': ('pk',),
+    'plate': ('license_plate',),
+    'year': ('-year', '-pk'),
+}
+# Colonnes réellement affichées par la liste
+VEHICLE_LIST_FIELDS = ('year', 'license_plate', 'mileage', 'brand', 'model', 'brand__name', 'model__name')
+VEHICLE_LIST_PAGE_SIZE = 50
+
+
+def _vehicle_list_queryset(user):
+    return (
+        Vehicle.objects.filter(user=user)
+        .select_related('brand', 'model')
+        .only(*VEHICLE_LIST_FIELDS)
+    )
+
+
+def get_vehicle_page(user, cursor=None, sort='id', per_page=VEHICLE_LIST_PAGE_SIZE):
+    """
+    Page de véhicules d'un utilisateur : marque et modèle chargés dans la
+    même requête, colonnes limitées à l'affichage, pagination par curseur.
+    """
+    ordering = VEHICLE_LIST_SORTS.get(sort, VEHICLE_LIST_SORTS['id'])
+    return keyset_paginate(_vehicle_list_queryset(user), cursor, per_page, ordering)
+
+
+async def aget_vehicle_page(user, cursor=None, sort='id', per_page=VEHICLE_LIST_PAGE_SIZE):
+    ordering = VEHICLE_LIST_SORTS.get(sort, VEHICLE_LIST_SORTS['id'])
+    return await akeyset_paginate(_vehicle_list_queryset(user), cursor, per_page, ordering)
+
+
+def vehicle_list_context(request):
+    sort = request.GET.get('sort', 'id')
+    cursor = request.GET.get('cursor') or ''
+    # Cache partagé, invalidé à chaque modification d'un véhicule ou document de l'utilisateur
+    page = get_or_set_for_user(
+        VEHICLE_LIST, request.user.pk, (sort, cursor),
+        lambda: get_vehicle_page(request.user, cursor, sort),
+    )
+    return {'vehicles': page.object_list, 'page': page, 'sort': sort}
+
+
+async def avehicle_list_context(request, user):
+    sort = request.GET.get('sort', 'id')
+    cursor = request.GET.get('cursor') or ''
+    page = await aget_or_set_for_user(
+        VEHICLE_LIST, user.pk, (sort, cursor),
+        lambda: aget_vehicle_page(user, cursor, sort),
+    )
+    return {'vehicles': page.object_list, 'page': page, 'sort': sort}
+
+
+def _vehicle_detail_queryset(user, vehicle_id):
+    return Vehicle.objects.filter(id=vehicle_id, user=user).select_related('brand', 'model')
+
+
+def get_cached_vehicle(user, vehicle_id):
+    """Véhicule de l'utilisateur (marque et modèle inclus), mis en cache ; Http404 sinon."""
+    vehicle = get_or_set_for_user(
+        VEHICLE_DETAIL, user.pk, (vehicle_id,),
+        lambda: _vehicle_detail_queryset(user, vehicle_id).first(),
+    )
+    if vehicle is None:
+        raise Http404("Véhicule introuvable.")
+    return vehicle
+
+
+async def aget_cached_vehicle(user, vehicle_id):
+    vehicle = await aget_or_set_for_user(
+        VEHICLE_DETAIL, user.pk, (vehicle_id,),
+        lambda: _vehicle_detail_queryset(user, vehicle_id).afirst(),
+    )
+    if vehicle is None:
+        raise Http404("Véhicule introuvable.")
+    return vehicle
+
+
+# Vues asynchrones (ASGI) : cache et ORM en asyncio ; seul le rendu du gabarit
+# (qui peut lire la session pour les messages) passe par un thread.
 @login_required
-def vehicle_list(request):
-    vehicles = Vehicle.objects.filter(user=request.user)
-    return render(request, 'vehicles/vehicle_list.html', {'vehicles': vehicles})
+async def vehicle_list(request):
+    context = await avehicle_list_context(request, await request.auser())
+    return await sync_to_async(render)(request, 'vehicles/vehicle_list.html', context)
 
 @login_required
-def vehicle_detail(request, vehicle_id):
-    vehicle = get_object_or_404(Vehicle, id=vehicle_id, user=request.user)
-    insurance_expiring_soon = vehicle.is_insurance_expiring_soon()
-    technical_check_due = vehicle.is_technical_control_due()
-    return render(request, 'vehicles/vehicle_detail.html', {
+async def vehicle_detail(request, pk):
+    vehicle = await aget_cached_vehicle(await request.auser(), pk)
+    return await sync_to_async(render)(request, 'vehicles/vehicle_detail.html', {
         'vehicle': vehicle,
-        'insurance_expiring_soon': insurance_expiring_soon,
-        'technical_check_due': technical_check_due,
+        'insurance_expiring_soon': vehicle.is_insurance_expiring_soon(),
+        'technical_check_due': vehicle.is_technical_control_due(),
     })
 
 @login_required
@@ -158,7 +244,7 @@ def vehicle_edit(request, vehicle_id):
         if form.is_valid():
             form.save()
             messages.success(request, 'Véhicule mis à jour avec succès.')
-            return redirect('vehicle_detail', vehicle_id=vehicle.id)
+            return redirect('vehicle_detail', pk=vehicle.id)
         else:
             messages.error(request, 'Veuillez corriger les erreurs ci-dessus.')
     else:
@@ -181,14 +267,14 @@ def document_add(request, vehicle_id):
     vehicle = get_object_or_404(Vehicle, id=vehicle_id, user=request.user)
 
     if request.method == 'POST':
-        form = DocumentForm(request.POST, request.FILES)
+        form = apply_upload_errors(DocumentForm(request.POST, request.FILES), request)
         if form.is_valid():
             document = form.save(commit=False)
             document.save()
             vehicle.documents.add(document)
             vehicle.save()
             messages.success(request, 'Document ajouté avec succès.')
-            return redirect('vehicle_detail', vehicle_id=vehicle.id)
+            return redirect('vehicle_detail', pk=vehicle.id)
         else:
             messages.error(request, 'Veuillez corriger les erreurs ci-dessus.')
     else:
@@ -205,3 +291,128 @@ def vehicle_documents(request, vehicle_id):
 def document_detail(request, document_id):
     document = get_object_or_404(Document, id=document_id)
     return render(request, 'vehicles/document_detail.html', {'document': document})
+
+
+def _upload_state(upload):
+    state = {'id': str(upload.id), 'offset': upload.offset, 'size': upload.size, 'chunk_size': chunk_size_limit()}
+    if upload.document_id:
+        state['document_id'] = upload.document_id
+    return state
+
+
+@login_required
+@require_POST
+def document_upload_start(request, vehicle_id):
+    """
+    Ouvre un envoi fractionné (champs filename, size, document_type) pour les
+    connexions lentes ou instables : le fichier est ensuite envoyé morceau par
+    morceau sur document_upload, et peut reprendre après une coupure.
+    """
+    vehicle = get_object_or_404(Vehicle, id=vehicle_id, user=request.user)
+    filename = request.POST.get('filename', '')[:255]
+    document_type = request.POST.get('document_type', '')[:100]
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': "Taille du fichier (size) attendue."}, status=400)
+    error = check_extension(filename, DOCUMENT_KINDS)
+    if error or not document_type:
+        return JsonResponse({'error': error or "Type de document (document_type) attendu."}, status=400)
+    if not 0 < size <= chunked_upload_max_size():
+        return JsonResponse({'error': f"La taille doit être comprise entre 1 et {chunked_upload_max_size()} octets."}, status=413)
+
+    upload = DocumentUpload.objects.create(vehicle=vehicle, document_type=document_type, filename=filename, size=size)
+    response = JsonResponse(_upload_state(upload), status=201)
+    response['Location'] = reverse('document_upload', args=[upload.id])
+    return response
+
+
+def _complete_upload(upload):
+    """Dernier morceau reçu : création du document (stockage par empreinte) et rattachement au véhicule."""
+    path = part_path(upload.id)
+    document = Document(document_type=upload.document_type)
+    with open(path, 'rb') as part:
+        document.file.save(upload.filename, File(part, name=upload.filename))
+    upload.vehicle.documents.add(document)
+    upload.document = document
+    upload.save(update_fields=['document', 'updated_at'])
+    transaction.on_commit(lambda: discard_part(upload.id))
+
+
+def _offset_conflict(upload):
+    response = JsonResponse({'error': "Position inattendue.", **_upload_state(upload)}, status=409)
+    response['Upload-Offset'] = str(upload.offset)
+    return response
+
+
+@login_required
+@require_http_methods(['GET', 'HEAD', 'PATCH', 'DELETE'])
+def document_upload(request, upload_id):
+    """
+    GET/HEAD : position atteinte (à reprendre après une coupure).
+    PATCH : un morceau brut, à la position donnée par l'en-tête Upload-Offset
+    (409 et position attendue sinon) ; le dernier morceau crée le document.
+    DELETE : abandon de l'envoi.
+    """
+    uploads = DocumentUpload.objects.filter(vehicle__user=request.user).select_related('vehicle')
+    if request.method in ('GET', 'HEAD'):
+        upload = get_object_or_404(uploads, id=upload_id)
+        response = JsonResponse(_upload_state(upload))
+        response['Upload-Offset'] = str(upload.offset)
+        return response
+    if request.method == 'DELETE':
+        upload = get_object_or_404(uploads, id=upload_id, document__isnull=True)
+        upload.delete()
+        discard_part(upload_id)
+        return HttpResponse(status=204)
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.headers.get('Content-Length', ''))
+    except ValueError:
+        return JsonResponse({'error': "En-têtes Upload-Offset et Content-Length attendus."}, status=400)
+    upload = get_object_or_404(uploads, id=upload_id)
+    if upload.document_id or offset != upload.offset:
+        return _offset_conflict(upload)
+    # Morceau reçu hors transaction : le verrou n'est pris que le temps de l'ajouter au fichier partiel
+    try:
+        chunk = receive_chunk(request, offset, length, upload.filename, DOCUMENT_KINDS, upload.size)
+    except ChunkError as e:
+        return JsonResponse({'error': str(e), **_upload_state(upload)}, status=e.status)
+    # Le verrou sérialise les morceaux d'un même envoi (nouvel essai du client reçu entre-temps)
+    with chunk, transaction.atomic():
+        upload = get_object_or_404(uploads.select_for_update(of=('self',)), id=upload_id)
+        if upload.document_id or offset != upload.offset:
+            return _offset_conflict(upload)
+        try:
+            upload.offset = append_chunk(
+                part_path(upload.id), offset, chunk, length, upload.filename, DOCUMENT_KINDS, upload.size,
+            )
+        except ChunkError as e:
+            if e.status == 409:  # Fichier partiel perdu : tout renvoyer
+                upload.offset = 0
+                upload.save(update_fields=['offset', 'updated_at'])
+            return JsonResponse({'error': str(e), **_upload_state(upload)}, status=e.status)
+        upload.save(update_fields=['offset', 'updated_at'])
+        if upload.offset == upload.size:
+            _complete_upload(upload)
+    response = JsonResponse(_upload_state(upload), status=201 if upload.document_id else 200)
+    response['Upload-Offset'] = str(upload.offset)
+    return response
+
+
+# Le navigateur garde le catalogue quelques minutes puis le revalide (304 tant que l'ETag ne change pas)
+CATALOG_CACHE_CONTROL = "public, max-age=300"
+
+
+@require_GET
+def vehicle_catalog(request):
+    """Catalogue marques / modèles en JSON compact : {"brands": [[id, nom, [[id, nom], ...]], ...]}."""
+    payload, etag = get_catalog().payload()
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(payload, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = CATALOG_CACHE_CONTROL
+    return response